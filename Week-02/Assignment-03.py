@@ -8,6 +8,7 @@ Type 'quit' to exit. Stores only the last 5 messages (user + assistant combined)
 Set GROQ_API_KEY in a .env file or environment for security. Falls back to placeholder.
 """
 import os, sys
+from collections import deque
 
 try:
     from dotenv import load_dotenv; load_dotenv()
@@ -23,7 +24,7 @@ except ImportError:
 api_key = os.getenv("GROQ_API_KEY")
 
 client = Groq(api_key=api_key)
-memory = []  # list of {role, content}
+memory = deque(maxlen=5)  # last 5 {role, content}; older ones drop off
 
 print("Chatbot ready. Type 'quit' to exit.\n")
 while True:
@@ -41,12 +42,11 @@ while True:
 
     # Add new user message
     memory.append({"role": "user", "content": user_input})
-    memory = memory[-5:]  # keep only last 5 items (user/assistant mixed)
 
     try:
         response = client.chat.completions.create(
             model="llama-3.1-8b-instant",
-            messages=memory,
+            messages=list(memory),
         )
         reply = response.choices[0].message.content.strip()
     except Exception as e:
@@ -55,4 +55,3 @@ while True:
 
     print("Bot:", reply)
     memory.append({"role": "assistant", "content": reply})
-    memory = memory[-5:]
@@ -6,21 +6,113 @@
   * Remove punctuation.
   * Strip extra spaces.
 
+Usage:
+  python .\\Week-02\\Assignment-04.py "  HELLo!!!  How ARE you?? "
+  python .\\Week-02\\Assignment-04.py --file transcripts.txt --out clean.txt --workers 4
+
+File mode cleans line by line (one output line per input line) in bounded
+memory: the file is read in newline-aligned chunks, each chunk is cleaned with
+a precompiled translation table and regexes, and results are written as they
+complete, in input order. Throughput (MB/s) is reported on stderr.
 """
+import argparse
 import re
 import string
 import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+PUNCT_TABLE = str.maketrans('', '', string.punctuation)
+SPACES = re.compile(r"\s+")
+INLINE_SPACES = re.compile(r"[^\S\n]+")   # whitespace runs that are not newlines
+LINE_EDGES = re.compile(r" ?\n ?")        # single spaces left at line starts/ends
+CHUNK_BYTES = 8 * 1024 * 1024
 
 def clean_text(text):
     text = text or ""
     text = text.lower()
-    text = text.translate(str.maketrans('', '', string.punctuation))
-    text = re.sub(r"\s+", " ", text).strip()
+    text = text.translate(PUNCT_TABLE)
+    text = SPACES.sub(" ", text).strip()
     return text
 
-if len(sys.argv) > 1:
-    raw = " ".join(sys.argv[1:])
-else:
-    raw = input("Enter text: ")
+def clean_chunk(data: bytes) -> bytes:
+    """clean_text() applied to every line of a newline-aligned chunk, in one pass."""
+    text = data.decode("utf-8", errors="replace").lower().translate(PUNCT_TABLE)
+    text = INLINE_SPACES.sub(" ", text)
+    text = LINE_EDGES.sub("\n", text)
+    return text.strip(" ").encode("utf-8")
+
+def iter_chunks(f, size: int = CHUNK_BYTES):
+    """Yield blocks of about ``size`` bytes that end on a line boundary."""
+    rest = b""
+    while True:
+        block = f.read(size)
+        if not block:
+            if rest:
+                yield rest
+            return
+        block = rest + block
+        cut = block.rfind(b"\n")
+        if cut < 0:
+            rest = block
+            continue
+        yield block[:cut + 1]
+        rest = block[cut + 1:]
+
+def clean_file(src, dst, workers: int = 1, chunk_bytes: int = CHUNK_BYTES):
+    """Clean binary stream ``src`` into ``dst``; returns (bytes read, seconds)."""
+    start = time.perf_counter()
+    total = 0
+    if workers <= 1:
+        for chunk in iter_chunks(src, chunk_bytes):
+            total += len(chunk)
+            dst.write(clean_chunk(chunk))
+        return total, time.perf_counter() - start
+    # At most 2 chunks per worker in flight keeps memory bounded; results are written in order
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk in iter_chunks(src, chunk_bytes):
+            total += len(chunk)
+            pending.append(pool.submit(clean_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                dst.write(pending.popleft().result())
+        while pending:
+            dst.write(pending.popleft().result())
+    return total, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Lowercase, strip punctuation and collapse spaces")
+    parser.add_argument("text", nargs="*", help="text to clean (prompted for if omitted)")
+    parser.add_argument("--file", help="clean this file line by line ('-' for stdin)")
+    parser.add_argument("--out", default="-", help="output file for --file mode (default stdout)")
+    parser.add_argument("--workers", type=int, default=1, help="processes for --file mode")
+    parser.add_argument("--chunk-mb", type=float, default=CHUNK_BYTES / (1024 * 1024))
+    args = parser.parse_args()
+
+    if args.file:
+        src = sys.stdin.buffer if args.file == "-" else open(args.file, "rb")
+        dst = sys.stdout.buffer if args.out == "-" else open(args.out, "wb")
+        try:
+            total, secs = clean_file(src, dst, workers=args.workers,
+                                     chunk_bytes=max(1, int(args.chunk_mb * 1024 * 1024)))
+        finally:
+            if src is not sys.stdin.buffer:
+                src.close()
+            if dst is not sys.stdout.buffer:
+                dst.close()
+            else:
+                dst.flush()
+        mb = total / (1024 * 1024)
+        print(f"Cleaned {mb:.1f} MB in {secs:.2f}s ({mb / secs if secs else 0:.1f} MB/s)", file=sys.stderr)
+        return
+
+    if args.text:
+        raw = " ".join(args.text)
+    else:
+        raw = input("Enter text: ")
+
+    print("Cleaned:", clean_text(raw))
 
-print("Cleaned:", clean_text(raw))
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -10,11 +10,13 @@
     * Keeps only nouns, verbs, and adjectives (using POS tagging).
 """
 import re, string
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Sequence
 
 try:
     import nltk
-    from nltk import word_tokenize, pos_tag
+    from nltk import word_tokenize, pos_tag, pos_tag_sents
     from nltk.corpus import stopwords
     from nltk.stem import WordNetLemmatizer, PorterStemmer
 except ImportError as e:
@@ -34,29 +36,49 @@ stemmer = PorterStemmer()
 
 PUNCT_NUM = re.compile(rf"[\d{re.escape(string.punctuation)}]+")
 
-def preprocess(text: str, use_stem: bool = False) -> List[str]:
+LEMMA_CACHE_SIZE = 200_000   # distinct (word, pos) pairs kept memoized
+PARALLEL_MIN = 5_000         # below this many texts a process pool costs more than it saves
+BATCH_CHUNK = 2_000          # texts per worker task
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def _lemma(word: str, pos: str) -> str:
+    return lemmatizer.lemmatize(word, pos)
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def _stem(word: str) -> str:
+    return stemmer.stem(word)
+
+def _tokens(text: str) -> List[str]:
+    """Lowercase, drop punctuation/numbers, tokenize, drop non-alpha and stopwords."""
     if not text:
         return []
-    text = text.lower()
-    text = PUNCT_NUM.sub(" ", text)
-    tokens = [t for t in word_tokenize(text) if t.isalpha()]
-    tokens = [t for t in tokens if t not in STOP]
-    if not tokens:
-        return []
-    tagged = pos_tag(tokens)
+    text = PUNCT_NUM.sub(" ", text.lower())
+    return [t for t in word_tokenize(text) if t.isalpha() and t not in STOP]
+
+def _filter_tagged(tagged, use_stem: bool, with_pos: bool) -> List[str]:
+    """Shared tail of the pipeline: POS filter -> lemma/stem -> length/stopword filter."""
     out: List[str] = []
     for word, tag in tagged:
         if not any(tag.startswith(pref) for pref in KEEP):
             continue
         pos = 'n'
-        if tag.startswith('V'): pos = 'v'
-        elif tag.startswith('J'): pos = 'a'
-        base = stemmer.stem(word) if use_stem else lemmatizer.lemmatize(word, pos)
+        label = 'noun'
+        if tag.startswith('V'):
+            pos = 'v'; label = 'verb'
+        elif tag.startswith('J'):
+            pos = 'a'; label = 'adj'
+        base = _stem(word) if use_stem else _lemma(word, pos)
         if len(base) < 3 or base in STOP:
             continue
-        out.append(base)
+        out.append(f"{base}->{label}" if with_pos else base)
     return out
 
+def preprocess(text: str, use_stem: bool = False) -> List[str]:
+    tokens = _tokens(text)
+    if not tokens:
+        return []
+    return _filter_tagged(pos_tag(tokens), use_stem, with_pos=False)
+
 def preprocess_string(text: str) -> str:
     return " ".join(preprocess(text))
 
@@ -65,29 +87,35 @@ def preprocess_with_pos(text: str, use_stem: bool = False) -> List[str]:
 
     Keeps same filtering rules as preprocess().
     """
-    if not text:
-        return []
-    text = text.lower()
-    text = PUNCT_NUM.sub(" ", text)
-    tokens = [t for t in word_tokenize(text) if t.isalpha() and t not in STOP]
+    tokens = _tokens(text)
     if not tokens:
         return []
-    tagged = pos_tag(tokens)
-    annotated: List[str] = []
-    for word, tag in tagged:
-        if not any(tag.startswith(pref) for pref in KEEP):
-            continue
-        pos = 'n'
-        label = 'noun'
-        if tag.startswith('V'):
-            pos = 'v'; label = 'verb'
-        elif tag.startswith('J'):
-            pos = 'a'; label = 'adj'
-        base = stemmer.stem(word) if use_stem else lemmatizer.lemmatize(word, pos)
-        if len(base) < 3 or base in STOP:
-            continue
-        annotated.append(f"{base}->{label}")
-    return annotated
+    return _filter_tagged(pos_tag(tokens), use_stem, with_pos=True)
+
+def _preprocess_serial(texts: Sequence[str], use_stem: bool, with_pos: bool) -> List[List[str]]:
+    token_lists = [_tokens(t) for t in texts]
+    # One tagger call for the whole batch instead of one per text
+    nonempty = [toks for toks in token_lists if toks]
+    tagged = iter(pos_tag_sents(nonempty)) if nonempty else iter(())
+    return [_filter_tagged(next(tagged), use_stem, with_pos) if toks else [] for toks in token_lists]
+
+def preprocess_batch(texts: Sequence[str], use_stem: bool = False, with_pos: bool = False,
+                     workers: int = 1, chunk_size: int = BATCH_CHUNK) -> List[List[str]]:
+    """preprocess() (or preprocess_with_pos() when with_pos=True) over many texts.
+
+    Tags the batch with a single pos_tag_sents call and memoizes lemma/stem
+    lookups. With workers > 1 and at least PARALLEL_MIN texts, chunks are
+    spread over a process pool; results come back in input order.
+    """
+    texts = list(texts)
+    if workers <= 1 or len(texts) < PARALLEL_MIN:
+        return _preprocess_serial(texts, use_stem, with_pos)
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    out: List[List[str]] = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for part in pool.map(_preprocess_serial, chunks, [use_stem] * len(chunks), [with_pos] * len(chunks)):
+            out.extend(part)
+    return out
 
 if __name__ == "__main__":
     txt = input("Enter text: ")
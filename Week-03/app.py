@@ -1,11 +1,20 @@
 import os
+import time
+import uuid
+from collections import deque
 from pathlib import Path
 from dotenv import load_dotenv
 import streamlit as st
 from groq import Groq
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import re
+from chat_core import FALLBACK_MODEL, normalize_model, render_messages, cache_key_parts, pack_snippets, snippet_budget
+from llm_dispatch import Dispatcher
+from response_cache import ResponseCache, request_key
+from retrieval import retrieve
+from session_store import SessionStore
+from single_flight import SingleFlight
+from tenants import TenantRegistry, UnknownTenant
+from tracing import NOOP, tracer
 
 # Resolve workspace root and load env
 WORKSPACE = Path(__file__).resolve().parent.parent
@@ -16,126 +25,178 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 if not GROQ_API_KEY:
     st.error("GROQ_API_KEY missing in .env at repo root")
     st.stop()
-client = Groq(api_key=GROQ_API_KEY)
+# Retries are left to the dispatcher (budgeted, with fallback) rather than the SDK
+client = Groq(api_key=GROQ_API_KEY, max_retries=0)
 
-# Model aliases for backward compatibility
-MODEL_ALIASES = {
-    "llama3-8b-8192": "llama-3.1-8b-instant",
-    "llama3-70b-8192": "llama-3.1-70b-versatile",
-}
+CORPUS = WEEK03 / "joni_eats_corpus.txt"
+INDEX_CACHE = WEEK03 / ".cache"
+TENANTS_DIR = WEEK03 / "tenants"   # one <tenant>.txt KB per additional location
+SESSIONS_DB = INDEX_CACHE / "sessions.sqlite3"
+DEFAULT_TENANT = "joni-eats"
 
-def normalize_model(model: str) -> str:
-    return MODEL_ALIASES.get(model, model)
+CORPUS_POLL_SECONDS = 2.0
+INDEX_MEMORY_MB = 512
+PRELOAD_TENANTS = 4
+FLIGHT_TIMEOUT = 60.0
+CHAT_CAPACITY = 50   # messages kept (and shown) per conversation
 
-CORPUS = WEEK03 / "joni_eats_corpus.txt"
+@st.cache_resource(show_spinner=False)
+def init_tenants():
+    # One registry per process: each location's index and response cache are loaded
+    # on first use, shared by all sessions and kept in sync with edits to its KB file
+    registry = TenantRegistry(INDEX_CACHE, TENANTS_DIR, {DEFAULT_TENANT: CORPUS},
+                              max_bytes=INDEX_MEMORY_MB * 2 ** 20,
+                              make_cache=lambda: ResponseCache(max_entries=2048, ttl=3600.0, similarity=0.9))
+    registry.preload(registry.hottest(PRELOAD_TENANTS) or [DEFAULT_TENANT])
+    return registry.watch(CORPUS_POLL_SECONDS)
 
-def read_text(p: Path) -> str:
-    return p.read_text(encoding="utf-8")
+@st.cache_resource(show_spinner=False)
+def init_tracing():
+    # Off unless TRACE=1 / TRACE_FILE / METRICS_FILE / PROFILE_DIR are set (see tracing.py)
+    return tracer.configure_from_env()
 
-def parse_corpus(corpus: str):
-    import re
-    sections = re.split(r"^### SECTION: (.+)$", corpus, flags=re.M)
-    mapping = {"RESTAURANT_KB": "", "CHAT_PATTERNS": "", "CONTEXT_FLOW": ""}
-    for i in range(1, len(sections), 2):
-        name = sections[i].strip().upper()
-        body = sections[i+1] if i+1 < len(sections) else ""
-        if name in mapping:
-            mapping[name] = body.strip()
-    return mapping["RESTAURANT_KB"], mapping["CHAT_PATTERNS"], mapping["CONTEXT_FLOW"]
+@st.cache_resource(show_spinner=False)
+def init_flights():
+    # Identical questions asked at the same time (any session) share one LLM call
+    return SingleFlight()
 
 @st.cache_resource(show_spinner=False)
-def init_assets():
-    corpus = read_text(CORPUS)
-    kb_text, patterns, flow = parse_corpus(corpus)
-    return kb_text, patterns, flow
-
-def split_chunks(text: str, min_len: int = 120):
-    import re
-    parts = [p.strip() for p in re.split(r"\n\s*\n+", text) if p.strip()]
-    chunks = []
-    for p in parts:
-        if len(p) >= min_len:
-            chunks.append(p)
-        elif chunks and len(chunks[-1]) < min_len:
-            chunks[-1] += "\n" + p
-        else:
-            chunks.append(p)
-    return chunks
+def init_dispatch():
+    # Shared latency history, retry budget and circuit breakers for every session
+    return Dispatcher(fallbacks=[FALLBACK_MODEL])
 
 @st.cache_resource(show_spinner=False)
-def init_retriever(kb_text: str):
-    chunks = split_chunks(kb_text)
-    vec = TfidfVectorizer(
-        ngram_range=(1,3),
-        stop_words="english",
-        lowercase=True,
-        strip_accents="unicode",
-        sublinear_tf=True,
-    )
-    mat = vec.fit_transform(chunks)
-    return vec, mat, chunks
+def init_sessions():
+    # Conversations survive reruns and restarts: bounded in RAM, logged to SQLite
+    return SessionStore(SESSIONS_DB, capacity=CHAT_CAPACITY)
 
 # Note: We rely purely on retrieval; no special dietary indexing logic needed.
 
-def retrieve(vec, mat, chunks, query: str, top_k: int = 5):
-    qv = vec.transform([query])
-    sims = cosine_similarity(qv, mat).ravel()
-    idxs = sims.argsort()[::-1][:top_k]
-    return [(int(i), float(sims[i]), chunks[int(i)]) for i in idxs]
-
-def system_prompt():
-    return (
-        "You are Joni Eats’ cafe assistant. Be friendly, concise, and factual. "
-        "Use only the provided context snippets as your source of truth. If the answer isn't in the context, say you're not sure and ask a brief follow-up. "
-        "Scope: menu items (with ingredients/allergens when present), dietary suitability (vegan/vegetarian/gluten-free/halal), prices, hours, location, specials, ordering, and events. "
-        "Style: short paragraphs; when listing items, use bullet points (max 5) and prefer the most relevant choices. "
-        "When the user asks for a category (e.g., vegan/vegetarian/gluten-free/halal), scan the context and list matching items explicitly if present. "
-        "Do not deny availability when the context shows relevant items. Do not invent items, ingredients, prices, or policies that aren't in the context. "
-        "Maintain conversation context across messages; do not restart with greetings mid-conversation. If user preferences change (e.g., meat vs vegan), adapt recommendations accordingly. "
-        "If asked for 'most selling' and it's not in context, suggest popular-looking combos or deals without claiming they are the top-selling. "
-        "Avoid medical or legal advice; suggest speaking to staff for severe allergies or guarantees."
-    )
-
-MAX_HISTORY = 10
-
-def _sanitize(text: str) -> str:
-    text = text.strip()
-    if len(text) > 1200:
-        text = text[:1200] + "…"
-    return text
-
-def _history_messages(history):
-    msgs = []
-    if not history:
-        return msgs
-    # Keep the last MAX_HISTORY turns
-    tail = history[-MAX_HISTORY:]
-    for role, content in tail:
-        if role in ("user", "assistant") and isinstance(content, str) and content.strip():
-            msgs.append({"role": role, "content": _sanitize(content)})
-    return msgs
-
-def render_messages(sp: str, query: str, hits, few_shots: str | None, history=None):
-    ctx = "\n\n".join([f"[Snippet {i}]\n{t}" for i,_s,t in hits])
-    msgs = [
-        {"role":"system","content": sp},
-        {"role":"system","content": "Context from KB:\n" + (ctx or "(none)")},
-    ]
-    if few_shots and few_shots.strip():
-        msgs.append({"role":"system","content":"Examples:\n" + few_shots.strip()})
-    # Append short conversation history before current turn
-    msgs.extend(_history_messages(history))
-    msgs.append({"role":"user","content": query})
-    return msgs
-
-def answer(query, vec, mat, chunks, patterns, model, temperature, top_k, history=None):
-    hits = retrieve(vec, mat, chunks, query, top_k=top_k)
+def answer(query, vec, mat, chunks, prompt, model, temperature, top_k, history=None, cache=None,
+           bm25=None, retrieval="tfidf", faq=None, flights=None, scope=(), dispatch=None):
+    # With ``flights``, concurrent calls with the same scope (tenant, corpus version) and
+    # request key wait for one shared completion instead of each calling the model.
+    # With ``dispatch``, the call is retried, hedged or failed over (see llm_dispatch.py).
+    # ``prompt`` is the snapshot's compiled static prefix (chat_core.compile_prefix)
+    # Simple FAQ questions (hours, location, delivery...) are answered from KB facts directly
+    with tracer.span("faq"):
+        routed = faq.route(query) if faq is not None else None
+    if routed is not None:
+        return routed.answer, []
+    with tracer.span("retrieval", mode=retrieval):
+        hits = retrieve(vec, mat, chunks, query, top_k=top_k, bm25=bm25, mode=retrieval)
+        hits = pack_snippets(hits, snippet_budget(prompt, query, history))
     model = normalize_model(model)
-    msgs = render_messages(system_prompt(), query, hits, patterns, history=history)
-    resp = client.chat.completions.create(model=model, messages=msgs, temperature=temperature)
-    text = resp.choices[0].message.content
+    chunk_ids, ctx = cache_key_parts(hits, history)
+    if cache is not None:
+        with tracer.span("cache"):
+            text = cache.get(query, vec, chunk_ids, model, temperature, context=ctx)
+        if text is not None:
+            return text, hits
+    with tracer.span("prompt"):
+        msgs = render_messages(prompt, query, hits, history=history)
+
+    def call(m):
+        with tracer.span("llm", model=m):
+            return client.chat.completions.create(model=m, messages=msgs, temperature=temperature)
+
+    def complete():
+        resp = dispatch.complete(call, model)[0] if dispatch is not None else call(model)
+        text = resp.choices[0].message.content
+        if cache is not None and text:
+            cache.put(query, vec, chunk_ids, model, temperature, text, context=ctx)
+        return text
+
+    if flights is None:
+        return complete(), hits
+    key = (*scope, request_key(query, chunk_ids, model, temperature, ctx))
+    with tracer.span("flight") as span:
+        joined, text = flights.run(key, complete, timeout=FLIGHT_TIMEOUT)
+        span.set(coalesced=joined)
     return text, hits
 
+def answer_stream(query, vec, mat, chunks, prompt, model, temperature, top_k, history=None, cache=None,
+                  bm25=None, retrieval="tfidf", faq=None, flights=None, scope=(), dispatch=None):
+    """Streaming variant of answer(); returns (token iterator, hits, timing).
+
+    timing is filled in while the iterator is consumed: ttft (from this call,
+    so FAQ routing, retrieval and the cache lookup count, to the first token)
+    and total, both in seconds, plus the number of streamed deltas.
+    FAQ answers from ``faq`` set ``intent`` instead of calling the model.
+    With ``flights``, ``coalesced`` is True when the tokens came from another
+    request's identical stream; with ``dispatch``, ``model`` is the model that
+    answered.
+    """
+    start = time.perf_counter()
+    with tracer.span("faq"):
+        routed = faq.route(query) if faq is not None else None
+    if routed is not None:
+        elapsed = time.perf_counter() - start
+        timing = {"ttft": elapsed, "total": elapsed, "deltas": 1, "cached": False, "intent": routed.intent}
+        return iter([routed.answer]), [], timing
+    with tracer.span("retrieval", mode=retrieval):
+        hits = retrieve(vec, mat, chunks, query, top_k=top_k, bm25=bm25, mode=retrieval)
+        hits = pack_snippets(hits, snippet_budget(prompt, query, history))
+    model = normalize_model(model)
+    timing = {"ttft": None, "total": None, "deltas": 0, "cached": False}
+    cached = None
+    chunk_ids, ctx = cache_key_parts(hits, history)
+    if cache is not None:
+        with tracer.span("cache"):
+            cached = cache.get(query, vec, chunk_ids, model, temperature, context=ctx)
+
+    def tokens(start):
+        if cached is not None:
+            elapsed = time.perf_counter() - start
+            timing.update(ttft=elapsed, total=elapsed, deltas=1, cached=True)
+            yield cached
+            return
+        with tracer.span("prompt"):
+            msgs = render_messages(prompt, query, hits, history=history)
+
+        def open_stream(m):
+            with tracer.span("llm", model=m, stream=True):
+                stream = client.chat.completions.create(model=m, messages=msgs, temperature=temperature, stream=True)
+                for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        yield delta
+
+        def upstream():
+            if dispatch is None:
+                deltas = open_stream(model)
+            else:
+                deltas, timing["model"] = dispatch.stream(open_stream, model)
+            parts = []
+            for delta in deltas:
+                parts.append(delta)
+                yield delta
+            text = "".join(parts)
+            if cache is not None and text:
+                cache.put(query, vec, chunk_ids, model, temperature, text, context=ctx)
+
+        span = NOOP
+        # llm.ttft counts from the model call, as in server.py; timing["ttft"] from the request
+        llm_start = time.perf_counter()
+        if flights is None:
+            deltas = upstream()
+        else:
+            key = (*scope, request_key(query, chunk_ids, model, temperature, ctx))
+            timing["coalesced"], deltas = flights.stream(key, upstream, timeout=FLIGHT_TIMEOUT)
+            span = tracer.span("flight", coalesced=timing["coalesced"])
+        with span:
+            for delta in deltas:
+                if timing["ttft"] is None:
+                    now = time.perf_counter()
+                    timing["ttft"] = now - start
+                    tracer.observe("llm.ttft", now - llm_start)
+                    span.set(ttft_ms=round(1000 * (now - llm_start), 3))
+                timing["deltas"] += 1
+                yield delta
+        timing["total"] = time.perf_counter() - start
+
+    return tokens(start), hits, timing
+
 st.set_page_config(page_title="Joni Eats Chatbot", page_icon="🍽️", layout="wide")
 
 # --- Custom Styles & Brand Header ---
@@ -202,50 +263,89 @@ st.markdown(
         unsafe_allow_html=True,
 )
 
-kb_text, patterns, flow = init_assets()
-vec, mat, chunks = init_retriever(kb_text)
+# The location comes from the URL (?tenant=<name>); one snapshot per script run,
+# so a concurrent corpus update never mixes versions
+tenant_name = st.query_params.get("tenant", DEFAULT_TENANT)
+try:
+    tenant = init_tenants().get(tenant_name)
+except UnknownTenant:
+    st.error(f"Unknown location: {tenant_name}")
+    st.stop()
+snap = tenant.snapshot()
+kb_text, patterns, flow = snap.kb_text, snap.patterns, snap.flow
+vec, mat, chunks = snap.vec, snap.mat, snap.chunks
+response_cache = tenant.cache
+response_cache.sync_version(snap.version)
+init_tracing()
 
 # Defaults (simple UI, no technical sidebar controls)
 model = "llama-3.1-8b-instant"
 temperature = 0.2
 top_k = 10
+retrieval = "tfidf"   # or "bm25" / "hybrid" (BM25 + TF-IDF, see retrieval.py)
+faq_router = True     # answer hours/location/delivery/payment FAQs without the LLM
 
 # Top bar with only Clear Chat button
 left, right = st.columns([6,1])
 with right:
     clear_chat = st.button("Clear chat 🧹", use_container_width=True)
 
+# The conversation id lives in the URL (?session=<id>) so a reload or restart resumes it
+if "session" not in st.query_params:
+    st.query_params["session"] = uuid.uuid4().hex
+sessions = init_sessions()
+session = sessions.get(f"{tenant_name}/{st.query_params['session']}")
+
 if clear_chat:
-    st.session_state.chat = []
+    sessions.clear(session)
     st.success("Chat cleared")
 
-if "chat" not in st.session_state:
-    st.session_state.chat = []
+if "timings" not in st.session_state:
+    # Per-request ttft/total for the last 100 answers of this session
+    st.session_state.timings = deque(maxlen=100)
 
 def _esc(s: str) -> str:
     return (s.replace("&","&amp;").replace("<","&lt;").replace(">","&gt;")
             .replace("\n","<br>"))
 
-prompt = st.chat_input("Ask about our menu, hours, dietary options, or specials…")
-effective_prompt = prompt
-if effective_prompt:
-    try:
-        text, hits = answer(effective_prompt, vec, mat, chunks, patterns, model, temperature, top_k, history=st.session_state.chat)
-    except Exception as e:
-        text = f"Sorry, I couldn't process that. Please try again. ({e})"
-    st.session_state.chat.append(("user", effective_prompt))
-    st.session_state.chat.append(("assistant", text))
-
-# Render conversation (user left, assistant right)
-for role, content in st.session_state.chat:
+def _bubble(role: str, content: str) -> str:
     role_cls = "user" if role == "user" else "assistant"
-    st.markdown(
-        f"""
+    return f"""
         <div class="chat-row {role_cls}">
           <div class="bubble {role_cls}">{_esc(content)}</div>
         </div>
-        """,
-        unsafe_allow_html=True,
-    )
+        """
+
+# Render conversation (user left, assistant right)
+for role, content in session.history:
+    st.markdown(_bubble(role, content), unsafe_allow_html=True)
+
+# Minimum seconds between bubble redraws while streaming
+STREAM_REFRESH = 0.05
+
+prompt = st.chat_input("Ask about our menu, hours, dietary options, or specials…")
+effective_prompt = prompt
+if effective_prompt:
+    st.markdown(_bubble("user", effective_prompt), unsafe_allow_html=True)
+    placeholder = st.empty()
+    text = ""
+    # ?profile=1 runs this one answer under cProfile when PROFILE_DIR is set
+    with tracer.trace("chat", profile=st.query_params.get("profile") == "1", tenant=tenant_name) as request_trace:
+        try:
+            tokens, hits, timing = answer_stream(effective_prompt, vec, mat, chunks, snap.prompt, model, temperature, top_k, history=session.history, cache=response_cache, bm25=snap.bm25, retrieval=retrieval, faq=snap.faq if faq_router else None, flights=init_flights(), scope=(tenant_name, snap.version), dispatch=init_dispatch())
+            last_draw = 0.0
+            for tok in tokens:
+                text += tok
+                now = time.perf_counter()
+                if now - last_draw >= STREAM_REFRESH:
+                    placeholder.markdown(_bubble("assistant", text + " ▌"), unsafe_allow_html=True)
+                    last_draw = now
+            st.session_state.timings.append(timing)
+            request_trace.set(cached=timing["cached"], intent=timing.get("intent"))
+        except Exception as e:
+            text = f"Sorry, I couldn't process that. Please try again. ({e})"
+            request_trace.set(error=type(e).__name__)
+    placeholder.markdown(_bubble("assistant", text), unsafe_allow_html=True)
+    sessions.add(session, ("user", effective_prompt), ("assistant", text))
 
 st.caption("Joni Eats • For allergy concerns or special requests, please speak to our staff.")
@@ -0,0 +1,174 @@
+"""BM25 over an inverted index for the Joni Eats retriever.
+
+Postings are stored per term as a sorted run of chunk ids with each posting's
+precomputed BM25 weight (CSC layout: term -> postings), plus the largest score
+each term can add to any chunk. A query only touches the postings of its own terms, so
+cost follows the matching postings rather than the corpus size: the per-chunk
+score buffer is allocated once per thread and only the entries a query
+touched are reset afterwards.
+
+Top-k uses MaxScore pruning: terms are visited from the highest upper bound
+down, and once the upper bounds of the remaining terms add up to less than the
+current k-th best score, those terms cannot bring a new chunk into the top-k.
+They are then only looked up (binary search) for the chunks that are still
+in the running, instead of scanning their full postings lists. The top-k scores
+are the same as exhaustive scoring (``search_exhaustive``); chunks tied on score
+may come back in a different order.
+"""
+import threading
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+from retrieval import top_k_indices
+
+# Word-level analysis (n-grams add little to BM25 and multiply the postings)
+BM25_PARAMS = {
+    "stop_words": "english",
+    "lowercase": True,
+    "strip_accents": "unicode",
+    "dtype": np.float32,
+}
+K1 = 1.2
+B = 0.75
+
+
+class BM25Index:
+    def __init__(self, chunks, k1: float = K1, b: float = B):
+        self.k1 = k1
+        self.b = b
+        self.vec = CountVectorizer(**BM25_PARAMS)
+        self.analyze = self.vec.build_analyzer()
+        self.vocab = {}
+        self._scratch = threading.local()
+        try:
+            counts = self.vec.fit_transform(chunks)
+            self.vocab = self.vec.vocabulary_
+        except ValueError:
+            # Empty corpus or only stop words: nothing can match
+            counts = None
+        self.n = len(chunks)
+        if counts is None:
+            self.ptr = np.zeros(1, dtype=np.int64)
+            self.docs = np.empty(0, dtype=np.int32)
+            self.weights = np.empty(0, dtype=np.float32)
+            self.upper = np.empty(0, dtype=np.float32)
+            return
+        dl = np.asarray(counts.sum(axis=1), dtype=np.float32).ravel()
+        avgdl = float(dl.mean()) if self.n else 0.0
+        post = counts.tocsc()
+        post.sort_indices()
+        df = np.diff(post.indptr)
+        idf = np.log1p((self.n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        tf = post.data
+        docs = post.indices.astype(np.int32)
+        norm = k1 * (1.0 - b + b * dl[docs] / (avgdl or 1.0))
+        terms = np.repeat(np.arange(len(df)), df)
+        # Full per-posting BM25 contribution, so query time is gathers and adds only
+        self.weights = (idf[terms] * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+        self.docs = docs
+        self.ptr = post.indptr.astype(np.int64)
+        self.upper = np.zeros(len(df), dtype=np.float32)
+        nonempty = df > 0
+        self.upper[nonempty] = np.maximum.reduceat(self.weights, self.ptr[:-1][nonempty])
+
+    @property
+    def nbytes(self) -> int:
+        return self.ptr.nbytes + self.docs.nbytes + self.weights.nbytes + self.upper.nbytes
+
+    def query_terms(self, query: str):
+        """Distinct vocabulary ids of the query's terms."""
+        if not self.vocab:
+            return []
+        return sorted({self.vocab[t] for t in self.analyze(query) if t in self.vocab})
+
+    def _buffers(self):
+        """This thread's (scores, seen) arrays over all chunks, all zero between queries."""
+        scratch = self._scratch
+        if getattr(scratch, "acc", None) is None:
+            scratch.acc = np.zeros(self.n, dtype=np.float32)
+            scratch.seen = np.zeros(self.n, dtype=bool)
+        return scratch.acc, scratch.seen
+
+    def _postings(self, term: int):
+        start, end = self.ptr[term], self.ptr[term + 1]
+        return self.docs[start:end], self.weights[start:end]
+
+    def search(self, query: str, top_k: int = 5):
+        """[(chunk idx, score), ...] best first; only chunks sharing a term with the query."""
+        terms = sorted(self.query_terms(query), key=lambda t: -self.upper[t])
+        if not terms or top_k <= 0:
+            return []
+        bounds = self.upper[terms]
+        remaining = np.concatenate([np.cumsum(bounds[::-1])[::-1], [0.0]])
+        acc, seen = self._buffers()
+        parts = []
+        try:
+            n_cands = 0
+            theta = 0.0
+            i = 0
+            # Essential terms: their postings may still hold a chunk that belongs in the top-k
+            while i < len(terms):
+                if n_cands >= top_k and remaining[i] < theta:
+                    break
+                docs, w = self._postings(terms[i])
+                acc[docs] += w
+                new = docs[~seen[docs]]
+                seen[new] = True
+                parts.append(new)
+                n_cands += len(new)
+                i += 1
+                if n_cands >= top_k and i < len(terms):
+                    cands = np.concatenate(parts)
+                    parts = [cands]
+                    theta = float(np.partition(acc[cands], n_cands - top_k)[n_cands - top_k])
+            cands = np.concatenate(parts)
+            # Non-essential terms: score them only for chunks that can still reach theta
+            for j in range(i, len(terms)):
+                cands = cands[acc[cands] + remaining[j] >= theta]
+                docs, w = self._postings(terms[j])
+                pos = np.searchsorted(docs, cands)
+                pos[pos == len(docs)] = 0
+                found = docs[pos] == cands if len(docs) else np.zeros(len(cands), dtype=bool)
+                acc[cands[found]] += w[pos[found]]
+            scores = acc[cands]
+            order = top_k_indices(scores, top_k)
+            return [(int(cands[j]), float(scores[j])) for j in order if scores[j] > 0]
+        finally:
+            # Every chunk that got a score is in ``parts``; reset just those for the next query
+            for touched in parts:
+                acc[touched] = 0.0
+                seen[touched] = False
+
+    def search_exhaustive(self, query: str, top_k: int = 5):
+        """Reference scoring of every matching posting (no pruning); for tests and benchmarks."""
+        acc = np.zeros(self.n, dtype=np.float32)
+        for t in self.query_terms(query):
+            docs, w = self._postings(t)
+            acc[docs] += w
+        order = top_k_indices(acc, top_k)
+        return [(int(j), float(acc[j])) for j in order if acc[j] > 0]
+
+
+class LazyBM25:
+    """Builds the BM25 index for a chunk list on first search (thread-safe)."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._index = None
+        self._lock = threading.Lock()
+
+    def get(self) -> BM25Index:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = BM25Index(list(self._chunks))
+        return self._index
+
+    @property
+    def built(self):
+        """The index if it has been built, else None (never triggers a build)."""
+        return self._index
+
+    def search(self, query: str, top_k: int = 5):
+        return self.get().search(query, top_k)
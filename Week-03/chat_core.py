@@ -0,0 +1,139 @@
+"""Prompt assembly shared by the Streamlit app and the async server.
+
+Messages go out in a fixed order: the static prefix (system prompt, then the
+example dialogues), the conversation history, the KB snippets retrieved for
+this turn, and the question. The prefix is compiled once per corpus version
+(``compile_prefix``, kept on the index snapshot) so it is byte-identical on
+every request and the provider can reuse its cached prefill. Snippets are
+de-duplicated and packed into what is left of ``PROMPT_BUDGET``.
+"""
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+from response_cache import context_digest
+
+# Model aliases for backward compatibility
+MODEL_ALIASES = {
+    "llama3-8b-8192": "llama-3.1-8b-instant",
+    "llama3-70b-8192": "llama-3.1-70b-versatile",
+}
+
+
+# Hedged duplicate / failover target for slow or failing calls (see llm_dispatch.py)
+FALLBACK_MODEL = "llama-3.3-70b-versatile"
+
+
+def normalize_model(model: str) -> str:
+    return MODEL_ALIASES.get(model, model)
+
+
+def system_prompt():
+    return (
+        "You are Joni Eats’ cafe assistant. Be friendly, concise, and factual. "
+        "Use only the provided context snippets as your source of truth. If the answer isn't in the context, say you're not sure and ask a brief follow-up. "
+        "Scope: menu items (with ingredients/allergens when present), dietary suitability (vegan/vegetarian/gluten-free/halal), prices, hours, location, specials, ordering, and events. "
+        "Style: short paragraphs; when listing items, use bullet points (max 5) and prefer the most relevant choices. "
+        "When the user asks for a category (e.g., vegan/vegetarian/gluten-free/halal), scan the context and list matching items explicitly if present. "
+        "Do not deny availability when the context shows relevant items. Do not invent items, ingredients, prices, or policies that aren't in the context. "
+        "Maintain conversation context across messages; do not restart with greetings mid-conversation. If user preferences change (e.g., meat vs vegan), adapt recommendations accordingly. "
+        "If asked for 'most selling' and it's not in context, suggest popular-looking combos or deals without claiming they are the top-selling. "
+        "Avoid medical or legal advice; suggest speaking to staff for severe allergies or guarantees."
+    )
+
+
+MAX_HISTORY = 10
+PROMPT_BUDGET = 3000        # estimated input tokens per request
+MIN_SNIPPET_TOKENS = 400    # snippets keep at least this much, however long the history
+SNIPPET_OVERLAP = 0.8       # share of a snippet's word trigrams already sent that makes it a duplicate
+
+
+def sanitize(text: str) -> str:
+    text = text.strip()
+    if len(text) > 1200:
+        text = text[:1200] + "…"
+    return text
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English; good enough for budgeting
+    return (len(text) + 3) // 4
+
+
+def history_messages(history):
+    msgs = []
+    if not history:
+        return msgs
+    if hasattr(history, "messages"):
+        # session_store.History: already sanitized message dicts
+        return history.messages(MAX_HISTORY)
+    # Keep the last MAX_HISTORY turns
+    tail = history[-MAX_HISTORY:]
+    for role, content in tail:
+        if role in ("user", "assistant") and isinstance(content, str) and content.strip():
+            msgs.append({"role": role, "content": sanitize(content)})
+    return msgs
+
+
+def history_tokens(history) -> int:
+    if not history:
+        return 0
+    if hasattr(history, "tokens"):
+        return history.tokens(MAX_HISTORY)
+    return sum(estimate_tokens(m["content"]) for m in history_messages(history))
+
+
+class PromptPrefix(NamedTuple):
+    messages: tuple   # static system messages, sent first on every request
+    tokens: int
+
+
+def compile_prefix(few_shots: str | None, sp: str | None = None) -> PromptPrefix:
+    msgs = [{"role": "system", "content": sp or system_prompt()}]
+    if few_shots and few_shots.strip():
+        msgs.append({"role": "system", "content": "Examples:\n" + few_shots.strip()})
+    return PromptPrefix(tuple(msgs), sum(estimate_tokens(m["content"]) for m in msgs))
+
+
+@lru_cache(maxsize=4096)
+def _trigrams(text: str) -> frozenset:
+    words = re.findall(r"\w+", text.lower())
+    return frozenset(zip(words, words[1:], words[2:])) or frozenset([tuple(words)])
+
+
+def snippet_budget(prefix: PromptPrefix, query: str, history=None) -> int:
+    used = prefix.tokens + history_tokens(history) + estimate_tokens(query)
+    return max(MIN_SNIPPET_TOKENS, PROMPT_BUDGET - used)
+
+
+def pack_snippets(hits, budget: int, overlap: float = SNIPPET_OVERLAP):
+    """Best-first hits that fit in ``budget`` tokens, skipping near-duplicates of ones already kept."""
+    packed, seen, used = [], set(), 0
+    for hit in hits:
+        text = hit[2]
+        grams = _trigrams(text)
+        if len(grams & seen) >= overlap * len(grams):
+            continue
+        cost = estimate_tokens(text) + 4   # "[Snippet i]" header and separator
+        if used + cost > budget:
+            continue
+        packed.append(hit)
+        seen |= grams
+        used += cost
+    return packed
+
+
+def render_messages(prefix: PromptPrefix, query: str, hits, history=None):
+    ctx = "\n\n".join([f"[Snippet {i}]\n{t}" for i,_s,t in hits])
+    msgs = list(prefix.messages)
+    # History before the snippets: the prompt up to the last turn is the same as the previous request's
+    msgs.extend(history_messages(history))
+    msgs.append({"role":"system","content": "Context from KB:\n" + (ctx or "(none)")})
+    msgs.append({"role":"user","content": query})
+    return msgs
+
+
+def cache_key_parts(hits, history):
+    if hasattr(history, "digest"):
+        return [i for i, _s, _t in hits], history.digest()
+    return [i for i, _s, _t in hits], context_digest(history_messages(history))
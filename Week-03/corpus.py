@@ -0,0 +1,31 @@
+"""Corpus parsing and chunking for the Joni Eats knowledge base."""
+import re
+from pathlib import Path
+
+
+def read_text(p: Path) -> str:
+    return p.read_text(encoding="utf-8")
+
+
+def parse_corpus(corpus: str):
+    sections = re.split(r"^### SECTION: (.+)$", corpus, flags=re.M)
+    mapping = {"RESTAURANT_KB": "", "CHAT_PATTERNS": "", "CONTEXT_FLOW": ""}
+    for i in range(1, len(sections), 2):
+        name = sections[i].strip().upper()
+        body = sections[i+1] if i+1 < len(sections) else ""
+        if name in mapping:
+            mapping[name] = body.strip()
+    return mapping["RESTAURANT_KB"], mapping["CHAT_PATTERNS"], mapping["CONTEXT_FLOW"]
+
+
+def split_chunks(text: str, min_len: int = 120):
+    parts = [p.strip() for p in re.split(r"\n\s*\n+", text) if p.strip()]
+    chunks = []
+    for p in parts:
+        if len(p) >= min_len:
+            chunks.append(p)
+        elif chunks and len(chunks[-1]) < min_len:
+            chunks[-1] += "\n" + p
+        else:
+            chunks.append(p)
+    return chunks
@@ -0,0 +1,110 @@
+"""Fast path that answers simple FAQ questions from the KB without calling the LLM.
+
+Facts are extracted once, when the corpus is parsed: the body of sections such
+as ``### TIMINGS`` and ``### LOCATION`` and the ``Q:``/``A:`` pairs under
+``### FAQ``. ``FaqRouter.route`` answers from them only for a short question
+with exactly one intent (hours, location, delivery, payment, phone or a
+listed FAQ). An utterance must read as a question (a leading interrogative or
+a trailing "?"), so "Delivery please" or "card" in reply to the agent stays
+part of the order flow. Anything that mentions an order, a complaint, prices
+or a menu item returns None and goes to the LLM as before, as does a question
+that matches two intents or asks about times the fact does not cover ("how
+long", "after midnight", holidays). Routing is a few precompiled regex
+searches, so it takes microseconds.
+"""
+import re
+from typing import NamedTuple
+
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+HEADING = re.compile(r"^###\s+(.+?)\s*$", re.M)
+QA_PAIR = re.compile(r"^Q:\s*(.+?)\s*\n\s*A:\s*(.+?)\s*$", re.M)
+MENU_LINE = re.compile(r"^\s*-\s*(.+?)\s*[–-]\s*\$", re.M)
+WORD = re.compile(r"[a-z]+")
+
+MAX_WORDS = 12
+# Questions that need the conversation, the menu or a person stay with the LLM
+VETO = re.compile(r"\$|\b(my|me|order\w*|late|missing|wrong|refund\w*|complain\w*|manager|cancel\w*|"
+                  r"price\w*|cost\w*|how much|cheap\w*|recommend\w*|suggest\w*|menu|deals?|"
+                  r"allerg\w*|spicy)\b")
+STOP_WORDS = ENGLISH_STOP_WORDS | {"offer", "options", "option"}
+# Answers to the agent ("Delivery please", "I'll pay with card") are not FAQ questions
+QUESTION = re.compile(r"\?\s*$|^\s*(do|does|did|is|are|was|can|could|will|would|should|may|"
+                      r"what|what's|whats|when|where|where's|which|who|how)\b")
+# The hours and delivery facts say nothing about durations, late night or holidays
+TIME_VETO = (r"\b(how long|takes?|taking|took|minutes?|mins?|after|before|until|till|early|midnight|"
+             r"holidays?|eid|christmas|ramadan|new year)\b")
+
+# intent -> (query pattern, where the fact comes from, answer template, veto pattern or None)
+INTENTS = {
+    "hours": (r"\b(hours?|open(ing)?|clos(e|es|ed|ing)|timings?|what time)\b", ("section", "TIMINGS"), "{fact}",
+              TIME_VETO),
+    "location": (r"\b(where (are|is) (you|joni eats|the restaurant)|address|located|location|directions?)\b",
+                 ("section", "LOCATION"), "We're at {fact}", None),
+    "delivery": (r"\bdeliver(y|ies|s)?\b", ("faq", r"\bdeliver"), "{fact}", TIME_VETO),
+    "payment": (r"\b(cards?|credit|debit|wallets?|pay by|pay with|payment)\b", ("faq", r"\b(cards?|pay)"), "{fact}",
+                None),
+    "phone": (r"\b(phone|number|call you|contact)\b", ("section", "CONTACT"), "You can reach us at {fact}", None),
+}
+
+
+class Route(NamedTuple):
+    intent: str
+    answer: str
+
+
+def _flatten(text: str) -> str:
+    return " ".join(line.strip() for line in text.splitlines() if line.strip())
+
+
+def kb_sections(kb_text: str):
+    """``### NAME`` heading (upper-cased) -> section body."""
+    parts = HEADING.split(kb_text)
+    return {parts[i].strip().upper(): parts[i + 1].strip() for i in range(1, len(parts) - 1, 2)}
+
+
+def _keywords(text: str):
+    return {w.rstrip("s") for w in WORD.findall(text.lower()) if len(w) > 2 and w not in STOP_WORDS}
+
+
+class FaqRouter:
+    def __init__(self, kb_text: str):
+        sections = kb_sections(kb_text)
+        pairs = QA_PAIR.findall(sections.get("FAQ", ""))
+        used = set()
+        self.facts = {}
+        self.routes = []
+        for intent, (pattern, (kind, source), template, veto) in INTENTS.items():
+            if kind == "section":
+                fact = _flatten(sections.get(source, ""))
+            else:
+                found = next((i for i, (q, _a) in enumerate(pairs) if re.search(source, q, re.I)), None)
+                fact = pairs[found][1] if found is not None else ""
+                used.add(found)
+            if fact:
+                self.facts[intent] = fact
+                self.routes.append((intent, re.compile(pattern), veto and re.compile(veto), template.format(fact=fact)))
+        # Remaining FAQ entries match when the query has every keyword of the question
+        self.faq = [(f"faq:{q}", _keywords(q), a) for i, (q, a) in enumerate(pairs) if i not in used]
+        words = {w for m in MENU_LINE.finditer(kb_text) for w in WORD.findall(m.group(1).lower())
+                 if len(w) > 2 and w not in STOP_WORDS}
+        self.menu = re.compile(r"\b(" + "|".join(sorted(words)) + r")s?\b") if words else None
+
+    def route(self, query: str):
+        """A ``Route`` for a single-intent FAQ question, else None."""
+        q = query.lower()
+        if (len(q.split()) > MAX_WORDS or not QUESTION.search(q) or VETO.search(q)
+                or (self.menu is not None and self.menu.search(q))):
+            return None
+        matched = []
+        for intent, pattern, veto, answer in self.routes:
+            if pattern.search(q):
+                if veto is not None and veto.search(q):
+                    return None
+                matched.append((intent, answer))
+        if len(matched) > 1:
+            return None
+        if self.faq:
+            words = {w.rstrip("s") for w in WORD.findall(q)}
+            matched += [(intent, answer) for intent, keys, answer in self.faq if keys and keys <= words]
+        return Route(*matched[0]) if len(matched) == 1 else None
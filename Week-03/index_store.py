@@ -0,0 +1,146 @@
+"""Build-once, memory-mapped TF-IDF index for the Joni Eats retriever.
+
+Layout of one index directory (``.cache/tfidf-<key>/``):
+
+- ``meta.json``    – key, shape, vectorizer settings
+- ``vocab.json``   – term -> column
+- ``idf.npy``      – idf vector
+- ``data.npy`` / ``indices.npy`` / ``indptr.npy`` – CSR arrays of the chunk matrix
+- ``chunks.bin``   – UTF-8 chunk texts back to back, ``offsets.npy`` – byte offsets
+
+The key hashes the KB text, the chunking and vectorizer settings and the
+format/sklearn versions, so an index is rebuilt only when one of those changes.
+Arrays and chunk text are opened with ``mmap_mode="r"``, so worker processes
+on one host share the same page-cache pages instead of each holding a copy.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import sklearn
+from scipy.sparse import csr_matrix
+
+from corpus import split_chunks
+from retrieval import TFIDF_PARAMS, fit_retriever, make_vectorizer
+
+FORMAT_VERSION = 1
+PREFIX = "tfidf-"
+
+
+class ChunkStore:
+    """Read-only sequence of chunk strings decoded lazily from a memory map."""
+
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return bytes(self._blob[start:end]).decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+def index_key(kb_text: str, min_len: int = 120) -> str:
+    settings = json.dumps(
+        {"tfidf": TFIDF_PARAMS, "min_len": min_len,
+         "format": FORMAT_VERSION, "sklearn": sklearn.__version__},
+        sort_keys=True,
+    )
+    h = hashlib.sha256()
+    h.update(settings.encode("utf-8"))
+    h.update(b"\0")
+    h.update(kb_text.encode("utf-8"))
+    return h.hexdigest()[:24]
+
+
+def save_index(path: Path, key: str, vec, mat, chunks):
+    """Write an index into ``path`` atomically (build in a temp dir, then rename)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=".building-", dir=path.parent))
+    try:
+        mat = csr_matrix(mat)
+        mat.sort_indices()
+        np.save(tmp / "data.npy", mat.data.astype(np.float32))
+        np.save(tmp / "indices.npy", mat.indices.astype(np.int32))
+        np.save(tmp / "indptr.npy", mat.indptr.astype(np.int64))
+        np.save(tmp / "idf.npy", vec.idf_)
+        encoded = [c.encode("utf-8") for c in chunks]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        np.save(tmp / "offsets.npy", offsets)
+        (tmp / "chunks.bin").write_bytes(b"".join(encoded))
+        vocab = {t: int(c) for t, c in vec.vocabulary_.items()}
+        (tmp / "vocab.json").write_text(json.dumps(vocab, ensure_ascii=False), encoding="utf-8")
+        meta = {"key": key, "shape": list(mat.shape), "tfidf": TFIDF_PARAMS, "format": FORMAT_VERSION}
+        # meta.json is written last and marks a complete index
+        (tmp / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+        try:
+            os.replace(tmp, path)
+        except OSError:
+            # Another process finished the same index first; keep theirs
+            if not (path / "meta.json").exists():
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def load_index(path: Path):
+    """Open a saved index; returns (vec, mat, chunks) backed by memory maps."""
+    meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+    data = np.load(path / "data.npy", mmap_mode="r")
+    indices = np.load(path / "indices.npy", mmap_mode="r")
+    indptr = np.load(path / "indptr.npy", mmap_mode="r")
+    mat = csr_matrix((data, indices, indptr), shape=tuple(meta["shape"]), copy=False)
+    vec = make_vectorizer()
+    vec.vocabulary_ = json.loads((path / "vocab.json").read_text(encoding="utf-8"))
+    vec.idf_ = np.load(path / "idf.npy")
+    offsets = np.load(path / "offsets.npy", mmap_mode="r")
+    if offsets[-1] > 0:
+        blob = np.memmap(path / "chunks.bin", dtype=np.uint8, mode="r")
+    else:
+        blob = b""
+    return vec, mat, ChunkStore(blob, offsets)
+
+
+def _prune(cache_dir: Path, keep: Path):
+    # Readers that already mapped an old index keep working after the unlink
+    for old in cache_dir.glob(PREFIX + "*"):
+        if old != keep:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def load_or_build(kb_text: str, cache_dir: Path, min_len: int = 120):
+    """Load the index for ``kb_text`` from ``cache_dir``, building it on a miss."""
+    key = index_key(kb_text, min_len=min_len)
+    path = cache_dir / f"{PREFIX}{key}"
+    if (path / "meta.json").exists():
+        try:
+            return load_index(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Index at {path} is unreadable ({e}); rebuilding.")
+            shutil.rmtree(path, ignore_errors=True)
+    chunks = split_chunks(kb_text, min_len=min_len)
+    vec, mat = fit_retriever(chunks)
+    try:
+        save_index(path, key, vec, mat, chunks)
+        _prune(cache_dir, path)
+        return load_index(path)
+    except OSError as e:
+        # Read-only or full disk: serve the in-memory index instead
+        print(f"Could not persist index to {path} ({e}); using in-memory index.")
+        return vec, mat, chunks
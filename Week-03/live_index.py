@@ -0,0 +1,251 @@
+"""Live TF-IDF index that follows edits to the corpus file without a restart.
+
+Readers call ``live.snapshot()`` and get an immutable ``IndexSnapshot``; an
+update builds a new snapshot off to the side and swaps the reference in one
+assignment, so concurrent readers never see a half-updated index.
+
+Updates are incremental:
+
+- the corpus is re-parsed with ``parse_corpus``; if the KB section did not
+  change only the patterns/flow text is swapped
+- otherwise the KB is re-chunked with ``split_chunks`` and diffed against the
+  live chunks, and only added chunks are analyzed (n-grams); removed chunks just
+  drop their row and decrement document frequencies
+- idf is refreshed lazily: new rows are weighted with the current idf and all
+  rows are reweighted only once the changed rows exceed ``idf_refresh_ratio``
+  of the corpus (a vectorized pass over cached term frequencies, no re-analysis)
+- terms no longer in any chunk keep their column until they make up
+  ``VOCAB_COMPACT_RATIO`` of the vocabulary; then the vocabulary is compacted
+  so the matrix does not keep widening under edits
+- a reload that fails (file mid-write, parse error) is retried on the next poll
+
+The per-chunk term state is built on the first update, so a process that never
+sees an edit serves the memory-mapped index from ``index_store`` untouched.
+"""
+import os
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from bm25 import LazyBM25
+from chat_core import compile_prefix
+from corpus import read_text, parse_corpus, split_chunks
+from faq_router import FaqRouter
+from index_store import load_or_build
+from retrieval import fit_retriever, make_vectorizer
+
+VOCAB_COMPACT_RATIO = 0.25   # share of dead (df == 0) terms that triggers a vocabulary compaction
+
+
+class IndexSnapshot(NamedTuple):
+    version: int
+    vec: object
+    mat: object
+    chunks: object
+    kb_text: str
+    patterns: str
+    flow: str
+    bm25: object = None   # LazyBM25 over ``chunks``; built on the first BM25/hybrid query
+    faq: object = None    # FaqRouter with the facts of ``kb_text``
+    prompt: object = None # chat_core.PromptPrefix: system prompt + ``patterns``, token-counted once
+
+
+class _TermState:
+    """Per-chunk term frequencies, document frequencies and a growable vocabulary."""
+
+    def __init__(self, min_len: int):
+        self.min_len = min_len
+        self.analyzer = make_vectorizer().build_analyzer()
+        self.vocab = {}
+        self.df = np.zeros(1024, dtype=np.int64)
+        self.idf = np.zeros(0)
+        self.rows = {}       # chunk text -> (cols, sublinear tf)
+        self.weighted = {}   # chunk text -> (cols, l2-normalized tf-idf) under self.idf
+        self.counts = Counter()
+        self.order = []
+        self.changed = 0
+
+    def _analyze(self, text: str):
+        tf = Counter(self.analyzer(text))
+        for term in tf:
+            if term not in self.vocab:
+                self.vocab[term] = len(self.vocab)
+        if len(self.vocab) > len(self.df):
+            grown = np.zeros(max(len(self.vocab), 2 * len(self.df)), dtype=np.int64)
+            grown[:len(self.df)] = self.df
+            self.df = grown
+        cols = np.fromiter((self.vocab[t] for t in tf), dtype=np.int32, count=len(tf))
+        vals = 1.0 + np.log(np.fromiter(tf.values(), dtype=np.float64, count=len(tf)))
+        order = np.argsort(cols)
+        return cols[order], vals[order]
+
+    def _idf_for(self, df):
+        # Same formula as TfidfTransformer(smooth_idf=True)
+        n = len(self.order)
+        return np.log((1.0 + n) / (1.0 + df)) + 1.0
+
+    def refresh_idf(self):
+        self.idf = self._idf_for(self.df[:len(self.vocab)])
+        self.weighted.clear()
+        self.changed = 0
+
+    def _weighted_row(self, text: str):
+        row = self.weighted.get(text)
+        if row is None:
+            cols, tf = self.rows[text]
+            w = tf * self.idf[cols]
+            norm = np.sqrt(np.dot(w, w))
+            row = (cols, w / norm if norm > 0 else w)
+            self.weighted[text] = row
+        return row
+
+    def update(self, chunks, idf_refresh_ratio: float):
+        new_counts = Counter(chunks)
+        added = new_counts - self.counts
+        removed = self.counts - new_counts
+        for text, m in removed.items():
+            cols, _tf = self.rows[text]
+            self.df[cols] -= m
+            if text not in new_counts:
+                del self.rows[text]
+                self.weighted.pop(text, None)
+        for text, m in added.items():
+            if text not in self.rows:
+                self.rows[text] = self._analyze(text)
+            self.df[self.rows[text][0]] += m
+        self.counts = new_counts
+        self.order = list(chunks)
+        self.changed += sum(added.values()) + sum(removed.values())
+        if self.changed > idf_refresh_ratio * max(len(self.order), 1):
+            self.refresh_idf()
+        elif len(self.idf) < len(self.vocab):
+            # Lazy path: only terms first seen in this update get an idf now
+            self.idf = np.concatenate([self.idf, self._idf_for(self.df[len(self.idf):len(self.vocab)])])
+        return len(added), len(removed)
+
+    def compact(self):
+        """Drop terms no chunk contains any more and renumber the rest (order kept)."""
+        n = len(self.vocab)
+        alive = self.df[:n] > 0
+        remap = np.full(n, -1, dtype=np.int32)
+        remap[alive] = np.arange(int(alive.sum()), dtype=np.int32)
+        self.vocab = {t: int(remap[i]) for t, i in self.vocab.items() if alive[i]}
+        df = self.df[:n][alive]
+        self.df = np.zeros(max(1024, len(df)), dtype=np.int64)
+        self.df[:len(df)] = df
+        self.idf = self.idf[alive]
+        # Live rows only use live terms; remap is increasing, so columns stay sorted
+        self.rows = {t: (remap[c], v) for t, (c, v) in self.rows.items()}
+        self.weighted = {t: (remap[c], w) for t, (c, w) in self.weighted.items()}
+
+    def materialize(self):
+        n = len(self.vocab)
+        if n and np.count_nonzero(self.df[:n] == 0) > VOCAB_COMPACT_RATIO * n:
+            self.compact()
+        rows = [self._weighted_row(t) for t in self.order]
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(c) for c, _w in rows])
+        if rows:
+            indices = np.concatenate([c for c, _w in rows])
+            data = np.concatenate([w for _c, w in rows])
+        else:
+            indices, data = np.empty(0, dtype=np.int32), np.empty(0)
+        mat = csr_matrix((data, indices, indptr), shape=(len(rows), len(self.vocab)))
+        vec = make_vectorizer()
+        # Copies, so later updates never touch what a published snapshot uses
+        vec.vocabulary_ = dict(self.vocab)
+        vec.idf_ = self.idf.copy()
+        return vec, mat, list(self.order)
+
+
+class LiveIndex:
+    def __init__(self, corpus_path: Path, cache_dir: Path | None = None,
+                 min_len: int = 120, idf_refresh_ratio: float = 0.2):
+        self.corpus_path = Path(corpus_path)
+        self.cache_dir = cache_dir
+        self.min_len = min_len
+        self.idf_refresh_ratio = idf_refresh_ratio
+        self._lock = threading.Lock()
+        self._state = None
+        self._stat = None
+        self._stop = threading.Event()
+        self._watcher = None
+        self._snap = self._initial_snapshot()
+
+    def _file_stat(self):
+        st = os.stat(self.corpus_path)
+        return st.st_mtime_ns, st.st_size
+
+    def _initial_snapshot(self):
+        self._stat = self._file_stat()
+        kb_text, patterns, flow = parse_corpus(read_text(self.corpus_path))
+        if self.cache_dir is not None:
+            vec, mat, chunks = load_or_build(kb_text, self.cache_dir, min_len=self.min_len)
+        else:
+            chunks = split_chunks(kb_text, min_len=self.min_len)
+            vec, mat = fit_retriever(chunks)
+        return IndexSnapshot(0, vec, mat, chunks, kb_text, patterns, flow, LazyBM25(chunks), FaqRouter(kb_text),
+                             compile_prefix(patterns))
+
+    def snapshot(self) -> IndexSnapshot:
+        return self._snap
+
+    def reload(self, force: bool = False) -> bool:
+        """Re-read the corpus file and apply the diff; returns True if anything changed.
+
+        The file's stat is only recorded once the new snapshot is published, so a
+        reload that raises is tried again on the next call.
+        """
+        with self._lock:
+            stat = self._file_stat()
+            if stat == self._stat and not force:
+                return False
+            kb_text, patterns, flow = parse_corpus(read_text(self.corpus_path))
+            old = self._snap
+            if kb_text == old.kb_text:
+                if (patterns, flow) != (old.patterns, old.flow):
+                    self._snap = old._replace(version=old.version + 1, patterns=patterns, flow=flow,
+                                              prompt=compile_prefix(patterns))
+                self._stat = stat
+                return self._snap is not old
+            try:
+                if self._state is None:
+                    self._state = _TermState(self.min_len)
+                    self._state.update(list(old.chunks), self.idf_refresh_ratio)
+                    self._state.refresh_idf()
+                added, removed = self._state.update(
+                    split_chunks(kb_text, min_len=self.min_len), self.idf_refresh_ratio)
+                vec, mat, chunks = self._state.materialize()
+            except Exception:
+                # The term state may be half-updated; rebuild it from the live snapshot next time
+                self._state = None
+                raise
+            self._stat = stat
+            self._snap = IndexSnapshot(old.version + 1, vec, mat, chunks, kb_text, patterns, flow,
+                                       LazyBM25(chunks), FaqRouter(kb_text),
+                                       old.prompt if patterns == old.patterns else compile_prefix(patterns))
+            print(f"Index v{self._snap.version}: +{added} / -{removed} chunks ({len(chunks)} total)")
+            return True
+
+    def _watch_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.reload()
+            except Exception as e:
+                # Keep serving the last good snapshot (e.g. file mid-write or missing)
+                print(f"Corpus reload failed: {e}")
+
+    def watch(self, interval: float = 2.0):
+        """Poll the corpus file for changes on a daemon thread."""
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch_loop, args=(interval,),
+                                             name="corpus-watcher", daemon=True)
+            self._watcher.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,442 @@
+"""Latency-aware dispatch of LLM calls: hedging, model fallback, retries and circuit breakers.
+
+    dispatch = Dispatcher(fallbacks=["llama-3.3-70b-versatile"])
+    resp, model = dispatch.complete(
+        lambda m: client.chat.completions.create(model=m, messages=msgs), "llama-3.1-8b-instant")
+
+``call(model)`` makes one upstream request for the given model; the dispatcher
+decides which models to call and when:
+
+- hedging: each model keeps a rolling p95 of its recent latencies (the whole
+  reply for ``complete``, the first token for ``stream``). If the primary
+  has not answered within its p95, the same request also goes to the first
+  healthy fallback. The first success wins and the other call is cancelled
+  (asyncio) or closed when it returns (threads)
+- retries: 429, 5xx and connection errors are retried up to ``retries`` times
+  with full-jitter exponential backoff, honouring ``Retry-After``. A model that
+  still fails hands over to the next fallback. Retries and hedges spend tokens
+  from a shared ``RetryBudget`` that only refills with traffic, so they cannot
+  multiply the load on a provider that is already struggling
+- circuit breaker per model: after ``BREAKER_FAILURES`` consecutive retryable
+  errors the model is skipped for ``BREAKER_COOLDOWN`` seconds; then a single
+  probe call decides whether it is used again
+
+Provider SDK retries should be turned off (``max_retries=0``) so they do not
+stack on top of these.
+"""
+import asyncio
+import contextvars
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import groq
+
+from tracing import nearest_rank
+
+WINDOW = 200            # latency samples kept per model and kind
+MIN_SAMPLES = 20        # below this, hedge after HEDGE_DEFAULT instead of the p95
+HEDGE_DEFAULT = 2.0
+HEDGE_FLOOR = 0.3       # never hedge sooner than this
+RETRIES = 2
+BACKOFF_BASE = 0.2
+BACKOFF_CAP = 2.0
+TIMEOUT = 30.0          # whole reply (complete) or first token (stream)
+BREAKER_FAILURES = 5
+BREAKER_COOLDOWN = 30.0
+BUDGET_RATIO = 0.2      # retries + hedges allowed per call, on average
+BUDGET_PER_SECOND = 1.0
+BUDGET_CAP = 10.0
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+def retryable(exc) -> bool:
+    if isinstance(exc, groq.APIStatusError):
+        return exc.status_code == 429 or exc.status_code >= 500
+    return isinstance(exc, (groq.APIConnectionError, ConnectionError, TimeoutError))
+
+
+def backoff(attempt: int, exc=None) -> float:
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    response = getattr(exc, "response", None)
+    try:
+        hint = float(response.headers.get("retry-after", "")) if response is not None else None
+    except ValueError:
+        hint = None
+    return max(delay, min(hint, BACKOFF_CAP)) if hint is not None else delay
+
+
+class LatencyWindow:
+    def __init__(self, size: int = WINDOW):
+        self.samples = deque(maxlen=size)
+        self._p95 = None
+
+    def add(self, secs: float):
+        self.samples.append(secs)
+        self._p95 = None
+
+    def p95(self):
+        if self._p95 is None and self.samples:
+            ordered = sorted(self.samples)
+            self._p95 = ordered[nearest_rank(95, len(ordered)) - 1]
+        return self._p95
+
+
+class CircuitBreaker:
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.opens = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self.opened_at < self.cooldown else "half-open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.probing = True   # one probe at a time while half-open
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                if self.opened_at is None or self.probing:
+                    self.opens += 1
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def release(self):
+        """A call that was cancelled before it could tell either way."""
+        with self._lock:
+            self.probing = False
+
+
+class RetryBudget:
+    """Token bucket: each call adds ``ratio`` tokens (plus ``per_second`` over time), a retry or hedge spends one."""
+
+    def __init__(self, ratio: float = BUDGET_RATIO, per_second: float = BUDGET_PER_SECOND, cap: float = BUDGET_CAP):
+        self.ratio = ratio
+        self.per_second = per_second
+        self.cap = cap
+        self.tokens = cap
+        self.denied = 0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, extra: float = 0.0):
+        now = time.monotonic()
+        self.tokens = min(self.cap, self.tokens + extra + (now - self._last) * self.per_second)
+        self._last = now
+
+    def deposit(self):
+        with self._lock:
+            self._refill(self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            self.denied += 1
+            return False
+
+
+async def _afirst(stream):
+    """(first delta, the rest of ``stream``); the time to it is the stream's latency sample."""
+    async for delta in stream:
+        return delta, stream
+    return None, stream
+
+
+def _first(stream):
+    stream = iter(stream)
+    for delta in stream:
+        return delta, stream
+    return None, stream
+
+
+class Dispatcher:
+    def __init__(self, fallbacks=(), hedge: bool = True, retries: int = RETRIES, timeout: float = TIMEOUT,
+                 budget: RetryBudget | None = None, max_workers: int = 16):
+        self.fallbacks = [m for m in fallbacks if m]
+        self.hedge = hedge
+        self.retries = retries
+        self.timeout = timeout
+        self.budget = budget or RetryBudget()
+        self.max_workers = max_workers
+        self.counts = Counter()
+        self._latency = {}    # (model, "complete" | "stream") -> LatencyWindow
+        self._breakers = {}   # model -> CircuitBreaker
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            if model not in self._breakers:
+                self._breakers[model] = CircuitBreaker()
+            return self._breakers[model]
+
+    def observe(self, model: str, kind: str, secs: float):
+        with self._lock:
+            window = self._latency.get((model, kind))
+            if window is None:
+                window = self._latency[(model, kind)] = LatencyWindow()
+            window.add(secs)
+
+    def hedge_after(self, model: str, kind: str) -> float:
+        """Seconds to wait for ``model`` before hedging: its rolling p95."""
+        with self._lock:
+            window = self._latency.get((model, kind))
+            p95 = window.p95() if window is not None and len(window.samples) >= MIN_SAMPLES else None
+        return HEDGE_DEFAULT if p95 is None else max(HEDGE_FLOOR, p95)
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counts[name] += n
+
+    def _next_model(self, model: str, tried):
+        for candidate in [model, *self.fallbacks]:
+            if candidate not in tried and self.breaker(candidate).allow():
+                return candidate
+        return None
+
+    def _retry(self, model: str, attempt: int, exc) -> bool:
+        """Record a failed try; True if ``model`` should be tried again."""
+        breaker = self.breaker(model)
+        if not retryable(exc):
+            if isinstance(exc, groq.APIStatusError):
+                # The provider answered; the request itself is the problem
+                breaker.success()
+            else:
+                breaker.release()
+            return False
+        breaker.failure()
+        if attempt >= self.retries or breaker.state != "closed" or not self.budget.withdraw():
+            return False
+        self._count("retries")
+        return True
+
+    # --- threads -------------------------------------------------------------
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="llm-dispatch")
+            return self._pool
+
+    def _attempt(self, model: str, call, kind: str, cancel: threading.Event):
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                result = call(model) if kind == "complete" else _first(call(model))
+            except Exception as e:
+                if cancel.is_set() or not self._retry(model, attempt, e) or cancel.wait(backoff(attempt, e)):
+                    raise
+                attempt += 1
+                continue
+            self.breaker(model).success()
+            self.observe(model, kind, time.perf_counter() - start)
+            return result
+
+    def _dispatch(self, call, model: str, kind: str):
+        self.budget.deposit()
+        self._count("calls")
+        tried, running, errors = [], {}, {}
+        cancel = threading.Event()
+        deadline = time.monotonic() + self.timeout
+
+        def launch():
+            candidate = self._next_model(model, tried)
+            if candidate is None:
+                return False
+            tried.append(candidate)
+            # Copy the context so tracing spans opened by ``call`` join the caller's trace
+            ctx = contextvars.copy_context()
+            running[self._executor().submit(ctx.run, self._attempt, candidate, call, kind, cancel)] = candidate
+            return True
+
+        if not launch():
+            raise CircuitOpen(f"circuit open for {', '.join([model, *self.fallbacks])}")
+        hedge_at = time.monotonic() + self.hedge_after(tried[0], kind) if self.hedge else None
+        try:
+            while running:
+                now = time.monotonic()
+                if now >= deadline:
+                    self._count("timeouts")
+                    raise TimeoutError(f"no reply from {', '.join(tried)} within {self.timeout:g}s")
+                wake = deadline if hedge_at is None else min(deadline, hedge_at)
+                done, _pending = wait(running, timeout=max(0.0, wake - now), return_when=FIRST_COMPLETED)
+                if hedge_at is not None and time.monotonic() >= hedge_at:
+                    hedge_at = None
+                    if not done and self.budget.withdraw() and launch():
+                        self._count("hedged")
+                for fut in sorted(done, key=lambda f: f.exception() is not None):
+                    answered = running.pop(fut)
+                    if fut.exception() is None:
+                        self._count("fallback" if answered != model else "primary")
+                        return fut.result(), answered
+                    errors[answered] = fut.exception()
+                if not running and errors and retryable(errors[tried[-1]]) and launch():
+                    # Primary gave up: fail over to the next healthy model
+                    hedge_at = None
+            raise errors.get(tried[0]) or next(iter(errors.values()))
+        finally:
+            cancel.set()
+            for fut in running:
+                fut.add_done_callback(_discard)
+
+    def complete(self, call, model: str):
+        """``(call(m), m)`` for the model ``m`` that answered first."""
+        return self._dispatch(call, model, "complete")
+
+    def stream(self, call, model: str):
+        """``(deltas, m)``: ``call(m)`` returns an iterator of deltas; hedged on the first delta."""
+        (first, rest), answered = self._dispatch(call, model, "stream")
+
+        def deltas():
+            try:
+                if first is not None:
+                    yield first
+                yield from rest
+            finally:
+                close = getattr(rest, "close", None)
+                if close is not None:
+                    close()
+
+        return deltas(), answered
+
+    # --- asyncio -------------------------------------------------------------
+
+    async def _aattempt(self, model: str, call, kind: str):
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                result = await (call(model) if kind == "complete" else _afirst(call(model)))
+            except asyncio.CancelledError:
+                # The loser of a hedge: its elapsed time is a lower bound on its latency
+                self.observe(model, kind, time.perf_counter() - start)
+                self.breaker(model).release()
+                raise
+            except Exception as e:
+                if not self._retry(model, attempt, e):
+                    raise
+                await asyncio.sleep(backoff(attempt, e))
+                attempt += 1
+                continue
+            self.breaker(model).success()
+            self.observe(model, kind, time.perf_counter() - start)
+            return result
+
+    async def _adispatch(self, call, model: str, kind: str):
+        self.budget.deposit()
+        self._count("calls")
+        tried, running, errors = [], {}, {}
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+
+        def launch():
+            candidate = self._next_model(model, tried)
+            if candidate is None:
+                return False
+            tried.append(candidate)
+            running[asyncio.ensure_future(self._aattempt(candidate, call, kind))] = candidate
+            return True
+
+        if not launch():
+            raise CircuitOpen(f"circuit open for {', '.join([model, *self.fallbacks])}")
+        hedge_at = loop.time() + self.hedge_after(tried[0], kind) if self.hedge else None
+        try:
+            while running:
+                now = loop.time()
+                if now >= deadline:
+                    self._count("timeouts")
+                    raise TimeoutError(f"no reply from {', '.join(tried)} within {self.timeout:g}s")
+                wake = deadline if hedge_at is None else min(deadline, hedge_at)
+                done, _pending = await asyncio.wait(running, timeout=max(0.0, wake - now),
+                                                    return_when=asyncio.FIRST_COMPLETED)
+                if hedge_at is not None and loop.time() >= hedge_at:
+                    hedge_at = None
+                    if not done and self.budget.withdraw() and launch():
+                        self._count("hedged")
+                for task in sorted(done, key=lambda t: t.exception() is not None):
+                    answered = running.pop(task)
+                    if task.exception() is None:
+                        self._count("fallback" if answered != model else "primary")
+                        return task.result(), answered
+                    errors[answered] = task.exception()
+                if not running and errors and retryable(errors[tried[-1]]) and launch():
+                    hedge_at = None
+            raise errors.get(tried[0]) or next(iter(errors.values()))
+        finally:
+            for task in running:
+                task.cancel()
+                task.add_done_callback(_adiscard)
+
+    async def acomplete(self, call, model: str):
+        """``(await call(m), m)`` for the model ``m`` that answered first; losers are cancelled."""
+        return await self._adispatch(call, model, "complete")
+
+    async def astream(self, call, model: str):
+        """``(deltas, m)``: ``call(m)`` returns an async iterator of deltas; hedged on the first delta."""
+        (first, rest), answered = await self._adispatch(call, model, "stream")
+
+        async def deltas():
+            try:
+                if first is not None:
+                    yield first
+                async for delta in rest:
+                    yield delta
+            finally:
+                aclose = getattr(rest, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+
+        return deltas(), answered
+
+    def stats(self) -> dict:
+        with self._lock:
+            latency = {f"{model}:{kind}": {"p95_ms": round(1000 * w.p95(), 1), "samples": len(w.samples)}
+                       for (model, kind), w in self._latency.items() if w.samples}
+            breakers = {model: {"state": b.state, "opens": b.opens} for model, b in self._breakers.items()}
+            return {**self.counts, "budget": round(self.budget.tokens, 2), "budget_denied": self.budget.denied,
+                    "latency": latency, "breakers": breakers}
+
+
+def _discard(fut):
+    # A thread-side loser that finished anyway: close its stream so the connection is released
+    if fut.exception() is None and isinstance(fut.result(), tuple):
+        close = getattr(fut.result()[1], "close", None)
+        if close is not None:
+            close()
+
+
+def _adiscard(task):
+    if not task.cancelled() and task.exception() is None and isinstance(task.result(), tuple):
+        aclose = getattr(task.result()[1], "aclose", None)
+        if aclose is not None:
+            asyncio.ensure_future(aclose())
@@ -0,0 +1,144 @@
+"""Response cache in front of the chat completion call.
+
+Two tiers:
+
+- exact: normalized query + retrieved chunk ids + model + temperature + context
+- near-duplicate: among entries whose best ``NEAR_TOP`` retrieved chunks (in
+  any order) and model/temperature/context match, the cached query whose
+  TF-IDF vector is closest to the new one, if its cosine similarity is at
+  least ``similarity``. Keying on the top chunks rather than the whole set
+  lets a paraphrase that pulls in a different low-ranked chunk still hit
+
+``context`` is a digest of the conversation history sent with the query, so a
+follow-up only reuses an answer given after the same history. Entries are
+evicted LRU once ``max_entries`` is reached and expire after ``ttl`` seconds.
+The whole cache is dropped when the corpus version changes.
+"""
+import hashlib
+import json
+import re
+import string
+import threading
+import time
+from collections import OrderedDict
+
+NEAR_TOP = 2   # leading chunk ids that must match for a near-duplicate hit
+_PUNCT = str.maketrans("", "", string.punctuation)
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    return _SPACES.sub(" ", query.lower().translate(_PUNCT)).strip()
+
+
+def context_digest(messages) -> str:
+    if not messages:
+        return ""
+    raw = json.dumps(messages, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def request_key(query: str, chunk_ids, model: str, temperature: float, context: str = ""):
+    """Exact-tier key: requests with the same key get the same prompt and settings."""
+    return (normalize_query(query), tuple(sorted(int(i) for i in chunk_ids)), model, float(temperature), context)
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 2048, ttl: float = 3600.0, similarity: float = 0.9):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.version = None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # exact key -> (expires_at, text, bucket, qv)
+        self._buckets = {}             # bucket -> {exact key, ...}
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _keys(query, chunk_ids, model, temperature, context):
+        """(exact key, near-duplicate bucket); ``chunk_ids`` are in rank order, best first."""
+        key = request_key(query, chunk_ids, model, temperature, context)
+        top = tuple(sorted(int(i) for i in list(chunk_ids)[:NEAR_TOP]))
+        return key, (top, *key[2:])
+
+    def _drop(self, key):
+        _exp, _text, bucket, _qv = self._entries.pop(key)
+        keys = self._buckets.get(bucket)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._buckets[bucket]
+
+    def sync_version(self, version):
+        """Clear the cache if the corpus/index version changed since the last call."""
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self._buckets.clear()
+                self.version = version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def get(self, query: str, vec, chunk_ids, model: str, temperature: float, context: str = ""):
+        key, bucket = self._keys(query, chunk_ids, model, temperature, context)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._drop(key)
+                self.expirations += 1
+            candidates = list(self._buckets.get(bucket, ()))
+        if candidates and self.similarity < 1.0:
+            qv = vec.transform([key[0]])
+            with self._lock:
+                best, best_sim = None, self.similarity
+                for k in candidates:
+                    entry = self._entries.get(k)
+                    if entry is None or entry[0] <= now:
+                        continue
+                    sim = float(qv.multiply(entry[3]).sum())
+                    if sim >= best_sim:
+                        best, best_sim = k, sim
+                if best is not None:
+                    self._entries.move_to_end(best)
+                    self.near_hits += 1
+                    return self._entries[best][1]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, query: str, vec, chunk_ids, model: str, temperature: float, text: str, context: str = ""):
+        key, bucket = self._keys(query, chunk_ids, model, temperature, context)
+        qv = vec.transform([key[0]])
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, text, bucket, qv)
+            self._buckets.setdefault(bucket, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
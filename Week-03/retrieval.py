@@ -0,0 +1,127 @@
+"""TF-IDF retrieval for the Joni Eats chatbot.
+
+TfidfVectorizer L2-normalizes every row by default, so cosine similarity is just
+a sparse dot product. Scores are computed as one sparse matmul per batch of
+queries and top-k is picked with a partial selection over the non-zero scores
+instead of sorting the whole similarity row.
+
+``retrieve`` can also rank with BM25 over an inverted index (``bm25.py``) or
+fuse both. Hybrid takes BM25's best ``HYBRID_POOL`` chunks and re-scores only
+those with their exact TF-IDF cosine; both scores are scaled by their best
+value in the pool and mixed with ``HYBRID_WEIGHT``. Every chunk TF-IDF can
+match shares a word with the query (n-grams are built after stop-word
+removal), so BM25 sees it too, and the cost stays that of the pruned BM25
+search rather than a similarity row over the whole corpus. BM25 favours short
+chunks that contain the query words (menu items); tri-gram TF-IDF rewards
+phrase matches.
+"""
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+# Vectorizer settings; also part of the on-disk index key (see index_store.py)
+TFIDF_PARAMS = {
+    "ngram_range": (1, 3),
+    "stop_words": "english",
+    "lowercase": True,
+    "strip_accents": "unicode",
+    "sublinear_tf": True,
+}
+
+# Queries scored per sparse matmul in retrieve_many; bounds the size of the
+# (queries x chunks) score matrix held in memory at once.
+BATCH_SIZE = 1024
+
+RETRIEVAL_MODES = ("tfidf", "bm25", "hybrid")
+HYBRID_WEIGHT = 0.5   # share of TF-IDF in the fused score
+HYBRID_POOL = 50      # candidates taken from each retriever before fusing
+
+
+def make_vectorizer():
+    return TfidfVectorizer(**TFIDF_PARAMS)
+
+
+def fit_retriever(chunks):
+    vec = make_vectorizer()
+    mat = vec.fit_transform(chunks)
+    return vec, mat
+
+
+def top_k_indices(scores, k: int):
+    """Indices of the k largest scores, best first (argpartition + small sort)."""
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        idxs = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idxs = np.arange(n)
+    return idxs[np.argsort(-scores[idxs], kind="stable")]
+
+
+def _pad(picked, n_chunks: int, top_k: int):
+    # Fewer matching chunks than top_k: pad with zero-score chunks, like a full sort would
+    if len(picked) < min(top_k, n_chunks):
+        seen = {i for i, _s in picked}
+        for i in range(n_chunks):
+            if len(picked) >= top_k:
+                break
+            if i not in seen:
+                picked.append((i, 0.0))
+    return picked
+
+
+def _row_hits(indptr, indices, data, row: int, n_chunks: int, top_k: int):
+    start, end = indptr[row], indptr[row + 1]
+    cols, vals = indices[start:end], data[start:end]
+    order = top_k_indices(vals, top_k)
+    return _pad([(int(cols[j]), float(vals[j])) for j in order], n_chunks, top_k)
+
+
+def score_matrix(vec, mat, queries):
+    """Sparse (queries x chunks) similarity matrix for a list of query strings."""
+    qm = vec.transform(queries)
+    # mat @ qm.T keeps the big chunk matrix in CSR, only the small query block is converted
+    return (mat @ qm.T).T.tocsr()
+
+
+def retrieve_many(vec, mat, chunks, queries, top_k: int = 5, batch_size: int = BATCH_SIZE):
+    """Top-k hits for every query; returns one [(idx, score, chunk), ...] list per query."""
+    queries = list(queries)
+    results = []
+    n_chunks = mat.shape[0]
+    for b in range(0, len(queries), batch_size):
+        sims = score_matrix(vec, mat, queries[b:b + batch_size])
+        for row in range(sims.shape[0]):
+            hits = _row_hits(sims.indptr, sims.indices, sims.data, row, n_chunks, top_k)
+            results.append([(i, s, chunks[i]) for i, s in hits])
+    return results
+
+
+def hybrid_hits(vec, mat, bm25, query: str, top_k: int = 5, weight: float = HYBRID_WEIGHT):
+    """[(idx, fused score)]: BM25 candidates re-scored with their TF-IDF cosine."""
+    pool = bm25.search(query, max(HYBRID_POOL, top_k))
+    if not pool:
+        return []
+    ids = np.fromiter((i for i, _s in pool), dtype=np.int64, count=len(pool))
+    lexical = np.fromiter((s for _i, s in pool), dtype=np.float64, count=len(pool))
+    # Rows are L2-normalized, so the cosine of just these chunks is one small sparse product
+    cosine = np.asarray((mat[ids] @ vec.transform([query]).T).todense(), dtype=np.float64).ravel()
+    scores = (weight * cosine / (cosine.max() or 1.0)
+              + (1.0 - weight) * lexical / (lexical.max() or 1.0))
+    return [(int(ids[j]), float(scores[j])) for j in top_k_indices(scores, top_k)]
+
+
+def retrieve(vec, mat, chunks, query: str, top_k: int = 5, bm25=None, mode: str = "tfidf"):
+    """Top-k [(idx, score, chunk)]; ``mode`` is one of RETRIEVAL_MODES (bm25/hybrid need ``bm25``)."""
+    if mode == "tfidf":
+        return retrieve_many(vec, mat, chunks, [query], top_k=top_k)[0]
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode {mode!r}; choose from {', '.join(RETRIEVAL_MODES)}")
+    if bm25 is None:
+        raise ValueError(f"retrieval mode {mode!r} needs a BM25 index")
+    if mode == "bm25":
+        hits = bm25.search(query, top_k)
+    else:
+        hits = hybrid_hits(vec, mat, bm25, query, top_k=top_k)
+    return [(i, s, chunks[i]) for i, s in _pad(hits, len(chunks), top_k)]
@@ -0,0 +1,439 @@
+"""Headless asyncio server for the Joni Eats chatbot.
+
+    python server.py --port 8080
+
+Endpoints:
+
+- ``POST /chat`` with ``{"session_id": "...", "message": "...", "tenant": "..."}``
+  returns ``{"session_id", "reply", "snippets"}``; omit ``session_id`` to start a
+  session and ``tenant`` (restaurant location) for the default KB
+- ``GET /ws?tenant=...`` WebSocket; the first frame is ``{"session_id"}``, then each
+  ``{"message": "..."}`` sent is answered with ``{"delta": "..."}`` frames and a
+  final ``{"done": true, "reply": "..."}``
+- ``GET /healthz`` load, queue, tenant index and cache counters
+- ``GET /metrics`` per-stage latency summaries (Prometheus text, ``?format=json``
+  for JSON) when tracing is on (``--trace``)
+
+All sessions of a location share one read-only retrieval index (a ``LiveIndex``
+snapshot per request) from the ``TenantRegistry``, and every session shares one
+pooled async HTTP client. Retrieval and the rest of the per-request CPU work
+run on worker threads, off the event loop. Upstream LLM calls are capped by a
+semaphore; once ``max_waiting`` requests are already queued behind it, new
+requests get HTTP 503 with ``Retry-After`` instead of piling up. Chat history
+lives in a ``SessionStore``: a small ring per session in RAM, logged to SQLite
+(``--sessions-db``) so a session survives idle eviction and restarts. Identical
+requests that arrive while one is already being answered (same location, query,
+retrieved chunks, model settings and history) wait for that upstream call
+instead of making their own; see ``single_flight``. Upstream calls go through
+``llm_dispatch``: retries with a budget, a circuit breaker per model, and a
+hedged request to ``--fallback-model`` when the primary is slower than its
+recent p95.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+from aiohttp import WSMsgType, web
+from dotenv import load_dotenv
+from groq import AsyncGroq
+
+from chat_core import FALLBACK_MODEL, cache_key_parts, normalize_model, pack_snippets, render_messages, snippet_budget
+from llm_dispatch import Dispatcher
+from response_cache import request_key
+from retrieval import RETRIEVAL_MODES, retrieve
+from session_store import Session as StoredSession, SessionStore
+from single_flight import AsyncSingleFlight
+from tenants import TenantRegistry, UnknownTenant
+from tracing import tracer
+
+WORKSPACE = Path(__file__).resolve().parent.parent
+WEEK03 = WORKSPACE / "Week-03"
+ENV = WORKSPACE / ".env"
+CORPUS = WEEK03 / "joni_eats_corpus.txt"
+INDEX_CACHE = WEEK03 / ".cache"
+SESSIONS_DB = INDEX_CACHE / "sessions.sqlite3"
+TENANTS_DIR = WEEK03 / "tenants"   # one <tenant>.txt KB per additional location
+DEFAULT_TENANT = "joni-eats"
+
+# Same defaults as the Streamlit app
+MODEL = "llama-3.1-8b-instant"
+TEMPERATURE = 0.2
+TOP_K = 10
+RETRIEVAL = "tfidf"
+FAQ_ROUTER = True
+
+MAX_SESSIONS = 10000
+SESSION_IDLE_SECONDS = 1800
+QUEUE_TIMEOUT = 10.0
+FLIGHT_TIMEOUT = 60.0   # longest wait for a shared call's reply or next delta
+MEMORY_MB = 512
+PRELOAD = 4
+
+
+class Overloaded(Exception):
+    pass
+
+
+class UpstreamGate:
+    """Caps concurrent upstream calls and rejects work once the wait queue is full."""
+
+    def __init__(self, max_concurrent: int, max_waiting: int, timeout: float = QUEUE_TIMEOUT):
+        self._sem = asyncio.Semaphore(max_concurrent)
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.waiting = 0
+        self.active = 0
+        self.rejected = 0
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        # Counted rather than sem.locked(): acquirers inside wait_for have not taken the sem yet
+        if self.active + self.waiting >= self.max_concurrent + self.max_waiting:
+            self.rejected += 1
+            raise Overloaded()
+        self.waiting += 1
+        try:
+            with tracer.span("queue"):
+                await asyncio.wait_for(self._sem.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded() from None
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._sem.release()
+
+
+class Session(StoredSession):
+    def __init__(self, session_id: str, history):
+        super().__init__(session_id, history)
+        self.lock = asyncio.Lock()  # one turn at a time per session keeps history ordered
+
+    def busy(self) -> bool:
+        return self.lock.locked()
+
+
+class ChatServer:
+    def __init__(self, client, tenants: TenantRegistry, gate: UpstreamGate,
+                 model: str = MODEL, temperature: float = TEMPERATURE, top_k: int = TOP_K,
+                 retrieval: str = RETRIEVAL, faq_router: bool = FAQ_ROUTER, dispatch: Dispatcher | None = None,
+                 sessions: SessionStore | None = None):
+        self.client = client
+        self.dispatch = dispatch or Dispatcher()
+        self.tenants = tenants
+        self.gate = gate
+        self.sessions = sessions or SessionStore(max_sessions=MAX_SESSIONS, idle_seconds=SESSION_IDLE_SECONDS,
+                                                 session_cls=Session)
+        self.flights = AsyncSingleFlight()
+        self.model = normalize_model(model)
+        self.temperature = temperature
+        self.top_k = top_k
+        self.retrieval = retrieval
+        self.faq_router = faq_router
+
+    async def _warm(self, tenant: str):
+        # A cold tenant is loaded (or its index built) on a worker thread, not the event loop
+        if not self.tenants.loaded(tenant):
+            loc = await asyncio.to_thread(self.tenants.get, tenant)
+            if self.retrieval != "tfidf":
+                await asyncio.to_thread(loc.snapshot().bm25.get)
+
+    async def _prepare_off_loop(self, tenant: str, session: Session, message: str, timing: dict):
+        # Tenant lookup, FAQ routing, retrieval and the cache lookup are CPU work; they run
+        # on a worker thread (with the caller's trace context) so the event loop keeps serving
+        def prepare():
+            with self.tenants.use(tenant) as loc:
+                return self._prepare(loc, session, message, timing)
+        return await asyncio.to_thread(prepare)
+
+    def _prepare(self, tenant, session: Session, message: str, timing: dict):
+        t0 = time.perf_counter()
+        snap = tenant.snapshot()
+        with tracer.span("faq"):
+            routed = snap.faq.route(message) if self.faq_router and snap.faq is not None else None
+        if routed is not None:
+            # FAQ fast path: answered from KB facts, no retrieval or LLM call
+            timing["faq"] = time.perf_counter() - t0
+            timing["intent"] = routed.intent
+            return [], routed.answer, None, None
+        tenant.cache.sync_version(snap.version)
+        history = session.history
+        with tracer.span("retrieval", mode=self.retrieval):
+            hits = retrieve(snap.vec, snap.mat, snap.chunks, message, top_k=self.top_k,
+                            bm25=snap.bm25, mode=self.retrieval)
+            hits = pack_snippets(hits, snippet_budget(snap.prompt, message, history))
+        chunk_ids, ctx = cache_key_parts(hits, history)
+        with tracer.span("cache"):
+            cached = tenant.cache.get(message, snap.vec, chunk_ids, self.model, self.temperature, context=ctx)
+        t1 = time.perf_counter()
+        with tracer.span("prompt"):
+            msgs = render_messages(snap.prompt, message, hits, history=history)
+        timing["retrieval"] = t1 - t0
+        timing["prompt"] = time.perf_counter() - t1
+        flight = (tenant.name, snap.version, request_key(message, chunk_ids, self.model, self.temperature, ctx))
+        return hits, cached, msgs, (tenant.cache, snap.vec, chunk_ids, ctx, flight)
+
+    def _store(self, message: str, key, text: str):
+        cache, vec, chunk_ids, ctx, _flight = key
+        cache.put(message, vec, chunk_ids, self.model, self.temperature, text, context=ctx)
+
+    async def _call(self, model: str, msgs):
+        async with self.gate.slot():
+            with tracer.span("llm", model=model):
+                return await self.client.chat.completions.create(
+                    model=model, messages=msgs, temperature=self.temperature)
+
+    async def _open_stream(self, model: str, msgs):
+        async with self.gate.slot():
+            with tracer.span("llm", model=model, stream=True):
+                stream = await self.client.chat.completions.create(
+                    model=model, messages=msgs, temperature=self.temperature, stream=True)
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        yield delta
+
+    async def _complete(self, message: str, msgs, key) -> str:
+        """One upstream call, shared by every identical request waiting on it."""
+        resp, _model = await self.dispatch.acomplete(lambda m: self._call(m, msgs), self.model)
+        text = resp.choices[0].message.content or ""
+        if text:
+            self._store(message, key, text)
+        return text
+
+    async def _stream_llm(self, message: str, msgs, key):
+        deltas, _model = await self.dispatch.astream(lambda m: self._open_stream(m, msgs), self.model)
+        parts = []
+        async for delta in deltas:
+            parts.append(delta)
+            yield delta
+        text = "".join(parts)
+        if text:
+            self._store(message, key, text)
+
+    async def answer(self, session_id: str, message: str, timing: dict | None = None,
+                     tenant: str = DEFAULT_TENANT, profile: bool = False):
+        """Answer one message; per-stage seconds are written into ``timing`` if given."""
+        with tracer.trace("chat", profile=profile, tenant=tenant) as trace:
+            timing = {} if timing is None else timing
+            start = time.perf_counter()
+            await self._warm(tenant)
+            session = self.sessions.get(f"{tenant}/{session_id}")
+            async with session.lock:
+                hits, text, msgs, key = await self._prepare_off_loop(tenant, session, message, timing)
+                timing["cached"] = text is not None and "intent" not in timing
+                if text is None:
+                    t0 = time.perf_counter()
+                    with tracer.span("flight") as span:
+                        joined, text = await self.flights.run(
+                            key[-1], lambda: self._complete(message, msgs, key), timeout=FLIGHT_TIMEOUT)
+                        span.set(coalesced=joined)
+                    timing["llm"] = time.perf_counter() - t0
+                    timing["coalesced"] = joined
+                self.sessions.add(session, ("user", message), ("assistant", text))
+            timing["total"] = time.perf_counter() - start
+            trace.set(cached=timing["cached"], intent=timing.get("intent"))
+        return text, hits
+
+    async def answer_stream(self, session_id: str, message: str, tenant: str = DEFAULT_TENANT,
+                            profile: bool = False):
+        """Async generator of reply deltas; history is updated once the reply completes."""
+        with tracer.trace("chat.stream", profile=profile, tenant=tenant):
+            await self._warm(tenant)
+            session = self.sessions.get(f"{tenant}/{session_id}")
+            async with session.lock:
+                _hits, text, msgs, key = await self._prepare_off_loop(tenant, session, message, {})
+                if text is not None:
+                    yield text
+                else:
+                    parts = []
+                    t0 = time.perf_counter()
+                    joined, deltas = self.flights.stream(
+                        key[-1], lambda: self._stream_llm(message, msgs, key), timeout=FLIGHT_TIMEOUT)
+                    with tracer.span("flight", coalesced=joined) as span:
+                        async for delta in deltas:
+                            if not parts:
+                                # Per subscriber: a late joiner's first delta is the buffered backlog
+                                ttft = time.perf_counter() - t0
+                                tracer.observe("llm.ttft", ttft)
+                                span.set(ttft_ms=round(1000 * ttft, 3))
+                            parts.append(delta)
+                            yield delta
+                    text = "".join(parts)
+                self.sessions.add(session, ("user", message), ("assistant", text))
+
+
+def _wants_profile(request, body=None) -> bool:
+    # Single-request cProfile, only honoured when the server runs with --profile-dir
+    flag = request.headers.get("X-Profile") or (body or {}).get("profile") or request.query.get("profile")
+    return tracer.profile_dir is not None and str(flag).lower() in ("1", "true", "yes")
+
+
+def _unknown_tenant(tenant: str):
+    return web.json_response({"error": f"unknown tenant: {tenant}"}, status=404)
+
+
+def _overloaded():
+    return web.json_response({"error": "overloaded, retry shortly"}, status=503, headers={"Retry-After": "1"})
+
+
+async def handle_chat(request):
+    server = request.app["chat"]
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        return web.json_response({"error": "body must be JSON"}, status=400)
+    message = str(body.get("message") or "").strip()
+    if not message:
+        return web.json_response({"error": "message is required"}, status=400)
+    session_id = str(body.get("session_id") or uuid.uuid4().hex)
+    tenant = str(body.get("tenant") or DEFAULT_TENANT)
+    try:
+        reply, hits = await server.answer(session_id, message, tenant=tenant, profile=_wants_profile(request, body))
+    except UnknownTenant:
+        return _unknown_tenant(tenant)
+    except Overloaded:
+        return _overloaded()
+    except Exception as e:
+        return web.json_response({"error": f"upstream error: {e}"}, status=502)
+    return web.json_response({"session_id": session_id, "reply": reply, "snippets": [i for i, _s, _t in hits]})
+
+
+async def handle_ws(request):
+    server = request.app["chat"]
+    session_id = request.query.get("session_id") or uuid.uuid4().hex
+    tenant = request.query.get("tenant") or DEFAULT_TENANT
+    # Checked before the upgrade: once prepared, the socket can no longer answer with a 404
+    try:
+        server.tenants.corpus_path(tenant)
+    except UnknownTenant:
+        return _unknown_tenant(tenant)
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    await ws.send_json({"session_id": session_id})
+    async for msg in ws:
+        if msg.type != WSMsgType.TEXT:
+            continue
+        try:
+            message = str(json.loads(msg.data).get("message") or "").strip()
+        except (json.JSONDecodeError, AttributeError):
+            message = msg.data.strip()
+        if not message:
+            await ws.send_json({"error": "message is required"})
+            continue
+        parts = []
+        try:
+            async for delta in server.answer_stream(session_id, message, tenant=tenant,
+                                                    profile=_wants_profile(request)):
+                parts.append(delta)
+                await ws.send_json({"delta": delta})
+        except Overloaded:
+            await ws.send_json({"error": "overloaded, retry shortly"})
+            continue
+        except Exception as e:
+            await ws.send_json({"error": f"upstream error: {e}"})
+            continue
+        await ws.send_json({"done": True, "reply": "".join(parts)})
+    return ws
+
+
+async def handle_health(request):
+    server = request.app["chat"]
+    gate = server.gate
+    return web.json_response({
+        "sessions": server.sessions.stats(),
+        "upstream_active": gate.active,
+        "upstream_waiting": gate.waiting,
+        "rejected": gate.rejected,
+        "flights": server.flights.stats(),
+        "llm": server.dispatch.stats(),
+        "tenants": server.tenants.stats(),
+    })
+
+
+async def handle_metrics(request):
+    if request.query.get("format") == "json":
+        return web.json_response({"enabled": tracer.enabled, "stages": tracer.metrics()})
+    return web.Response(text=tracer.prometheus(), content_type="text/plain")
+
+
+def build_app(args) -> web.Application:
+    load_dotenv(ENV)
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        raise SystemExit("GROQ_API_KEY missing in .env at repo root")
+    if args.trace or args.profile_dir:
+        tracer.configure(trace_file=args.trace, sample=args.trace_sample, profile_dir=args.profile_dir)
+    else:
+        tracer.configure_from_env()
+
+    async def on_startup(app):
+        # One pooled connection set for every session; sized to the upstream cap
+        limits = httpx.Limits(max_connections=args.max_upstream, max_keepalive_connections=args.max_upstream)
+        app["http"] = httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(60.0, connect=5.0))
+        # Retries are left to the dispatcher (budgeted, with fallback) rather than the SDK
+        client = AsyncGroq(api_key=api_key, http_client=app["http"], max_retries=0)
+        tenants = TenantRegistry(INDEX_CACHE, TENANTS_DIR, {DEFAULT_TENANT: CORPUS},
+                                 max_bytes=args.memory_mb * 2 ** 20)
+        # Busiest locations from earlier runs first; the default KB on a fresh install
+        preload = tenants.hottest(args.preload) or [DEFAULT_TENANT]
+        await asyncio.to_thread(tenants.preload, preload)
+        app["chat"] = ChatServer(
+            client, tenants.watch(), UpstreamGate(args.max_upstream, args.max_waiting),
+            model=args.model, temperature=args.temperature, top_k=args.top_k, retrieval=args.retrieval,
+            faq_router=not args.no_faq,
+            dispatch=Dispatcher(fallbacks=[normalize_model(args.fallback_model)], hedge=not args.no_hedge),
+            sessions=SessionStore(args.sessions_db or None, max_sessions=MAX_SESSIONS,
+                                  idle_seconds=SESSION_IDLE_SECONDS, session_cls=Session))
+
+    async def on_cleanup(app):
+        app["chat"].tenants.stop()
+        app["chat"].sessions.close()
+        await app["http"].aclose()
+
+    app = web.Application()
+    app.router.add_post("/chat", handle_chat)
+    app.router.add_get("/ws", handle_ws)
+    app.router.add_get("/healthz", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Joni Eats chatbot API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-upstream", type=int, default=32, help="concurrent LLM requests")
+    parser.add_argument("--max-waiting", type=int, default=256, help="requests queued before 503")
+    parser.add_argument("--model", default=MODEL)
+    parser.add_argument("--fallback-model", default=FALLBACK_MODEL, help="hedge/fail over to this model ('' for none)")
+    parser.add_argument("--no-hedge", action="store_true", help="fail over on errors only, never hedge slow calls")
+    parser.add_argument("--temperature", type=float, default=TEMPERATURE)
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--retrieval", choices=RETRIEVAL_MODES, default=RETRIEVAL)
+    parser.add_argument("--no-faq", action="store_true", help="send FAQ questions to the LLM too")
+    parser.add_argument("--trace", help="append per-request traces (JSONL) here; enables /metrics")
+    parser.add_argument("--trace-sample", type=float, default=1.0, help="fraction of requests written to --trace")
+    parser.add_argument("--profile-dir", help="allow X-Profile: 1 requests and write their cProfile stats here")
+    parser.add_argument("--sessions-db", default=str(SESSIONS_DB), help="SQLite chat history log ('' to keep none)")
+    parser.add_argument("--memory-mb", type=int, default=MEMORY_MB, help="budget for loaded tenant indexes")
+    parser.add_argument("--preload", type=int, default=PRELOAD, help="busiest tenants to load at startup")
+    args = parser.parse_args()
+    web.run_app(build_app(args), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
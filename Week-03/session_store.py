@@ -0,0 +1,272 @@
+"""Bounded, persistent chat history for the Joni Eats chatbot.
+
+``History`` is a fixed-size ring of one session's last ``capacity`` messages.
+Each message is sanitized, turned into its chat-completions dict and
+token-counted once, when it is appended. Building a turn's prompt then only
+reads the ring: nothing is re-sliced, re-sanitized or re-serialized, and the
+history digest used in response-cache keys is cached until the next message.
+
+``SessionStore`` keeps active sessions in RAM, at most ``max_sessions`` in
+LRU order, and drops any that see no request for ``idle_seconds``. Every
+message is also appended to a SQLite log by a background thread, in batches
+of up to ``BATCH`` rows or every ``FLUSH_SECONDS``. A session that returns
+after eviction or a restart is rebuilt from its last ``capacity`` logged
+messages. The same flush prunes each written session's log down to those
+rows (nothing before its last clear, at most ``capacity`` rows), so the file
+stays proportional to the number of sessions and SQLite reuses the freed
+pages. Without a ``path`` nothing is persisted.
+"""
+import itertools
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import NamedTuple
+
+from chat_core import MAX_HISTORY, estimate_tokens, sanitize
+from response_cache import context_digest
+
+MAX_SESSIONS = 10000
+IDLE_SECONDS = 1800
+BATCH = 256
+FLUSH_SECONDS = 1.0
+CLEARED = "clear"   # log row marking a cleared conversation
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_session ON messages (session, id);
+"""
+# Per written session: drop the last clear marker and everything before it, then all but the newest rows
+PRUNE_CLEARED = ("DELETE FROM messages WHERE session = ? AND id <= "
+                 "(SELECT MAX(id) FROM messages WHERE session = ? AND role = ?)")
+PRUNE_OLD = ("DELETE FROM messages WHERE session = ? AND id <= "
+             "(SELECT id FROM messages WHERE session = ? ORDER BY id DESC LIMIT 1 OFFSET ?)")
+
+
+class Message(NamedTuple):
+    role: str
+    content: str            # as said, for display
+    message: dict | None    # sanitized chat-completions dict; None if it is not sent to the model
+    tokens: int
+
+
+class History:
+    def __init__(self, capacity: int = MAX_HISTORY, messages=()):
+        self._ring = deque(maxlen=capacity)
+        self._digest = None
+        for role, content in messages:
+            self.append(role, content)
+
+    def append(self, role: str, content: str):
+        if role in ("user", "assistant") and isinstance(content, str) and content.strip():
+            text = sanitize(content)
+            self._ring.append(Message(role, content, {"role": role, "content": text}, estimate_tokens(text)))
+        else:
+            self._ring.append(Message(role, content, None, 0))
+        self._digest = None
+
+    def clear(self):
+        self._ring.clear()
+        self._digest = None
+
+    def _tail(self, last):
+        if last is None or last >= len(self._ring):
+            return self._ring
+        return itertools.islice(self._ring, len(self._ring) - last, None)
+
+    def messages(self, last: int | None = MAX_HISTORY):
+        """Message dicts of the last ``last`` entries, ready for the API."""
+        return [m.message for m in self._tail(last) if m.message is not None]
+
+    def tokens(self, last: int | None = MAX_HISTORY) -> int:
+        return sum(m.tokens for m in self._tail(last))
+
+    def digest(self) -> str:
+        """``context_digest`` of ``messages()``, as used in response-cache keys."""
+        if self._digest is None:
+            self._digest = context_digest(self.messages())
+        return self._digest
+
+    def __iter__(self):
+        return ((m.role, m.content) for m in self._ring)
+
+    def __len__(self):
+        return len(self._ring)
+
+
+class Session:
+    def __init__(self, session_id: str, history: History):
+        self.id = session_id
+        self.history = history
+        self.last_seen = time.monotonic()
+
+    def busy(self) -> bool:
+        """True while a turn is in progress; busy sessions are not evicted."""
+        return False
+
+
+class SessionStore:
+    def __init__(self, path=None, capacity: int = MAX_HISTORY, max_sessions: int = MAX_SESSIONS,
+                 idle_seconds: float = IDLE_SECONDS, session_cls=Session, batch: int = BATCH,
+                 flush_seconds: float = FLUSH_SECONDS):
+        self.capacity = capacity
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.session_cls = session_cls
+        self.batch = batch
+        self.loads = 0
+        self.evictions = 0
+        self.written = 0
+        self.pruned = 0
+        self._sessions = OrderedDict()   # session id -> Session, least recently used first
+        self._pending = []               # log rows not written yet
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._db = None
+        self._writer = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+        self._writer = threading.Thread(target=self._write_loop, args=(flush_seconds,),
+                                        name="session-writer", daemon=True)
+        self._writer.start()
+
+    def _load(self, session_id: str) -> History:
+        if self._db is None:
+            return History(self.capacity)
+        with self._lock:
+            unwritten = any(row[0] == session_id for row in self._pending)
+        if unwritten:
+            # Evicted moments ago: its last messages are still queued
+            self.flush()
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT role, content FROM messages WHERE session = ? AND id > "
+                "(SELECT COALESCE(MAX(id), 0) FROM messages WHERE session = ? AND role = ?) "
+                "ORDER BY id DESC LIMIT ?", (session_id, session_id, CLEARED, self.capacity)).fetchall()
+        if rows:
+            self.loads += 1
+        return History(self.capacity, reversed(rows))
+
+    def get(self, session_id: str) -> Session:
+        """The session, from RAM or rebuilt from the log (marks it most recently used)."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                return self._touch(session)
+        history = self._load(session_id)
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = self.session_cls(session_id, history)
+            return self._touch(session)
+
+    def _touch(self, session: Session) -> Session:
+        # Caller holds _lock
+        self._sessions.move_to_end(session.id)
+        session.last_seen = time.monotonic()
+        self._evict(keep=session.id)
+        return session
+
+    def add(self, session: Session, *messages):
+        """Append ``(role, content)`` messages to the session and queue them for the log."""
+        ts = time.time()
+        for role, content in messages:
+            session.history.append(role, content)
+        self._queue([(session.id, role, content or "", ts) for role, content in messages])
+
+    def clear(self, session: Session):
+        session.history.clear()
+        self._queue([(session.id, CLEARED, "", time.time())])
+
+    def _queue(self, rows):
+        if self._db is None:
+            return
+        with self._lock:
+            self._pending.extend(rows)
+            full = len(self._pending) >= self.batch
+        if full:
+            self._wake.set()
+
+    def _evict(self, keep=None):
+        # Caller holds _lock; evicted sessions reload from the log on their next request.
+        # ``keep`` is the session being handed to a caller right now
+        cutoff = time.monotonic() - self.idle_seconds
+        skipped = 0
+        while len(self._sessions) > skipped:
+            sid, oldest = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and oldest.last_seen >= cutoff:
+                break
+            if oldest.busy() or sid == keep:
+                # A turn in progress must not hold up evicting the sessions behind it
+                self._sessions.move_to_end(sid)
+                skipped += 1
+                continue
+            del self._sessions[sid]
+            self.evictions += 1
+
+    def flush(self):
+        """Write queued messages, and prune their sessions' logs, in one transaction."""
+        if self._db is None:
+            return
+        with self._db_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return
+            try:
+                with self._db:
+                    self._db.executemany("INSERT INTO messages (session, role, content, ts) VALUES (?, ?, ?, ?)",
+                                         rows)
+                    pruned = 0
+                    for sid in {row[0] for row in rows}:
+                        pruned += self._db.execute(PRUNE_CLEARED, (sid, sid, CLEARED)).rowcount
+                        pruned += self._db.execute(PRUNE_OLD, (sid, sid, self.capacity)).rowcount
+            except sqlite3.Error:
+                with self._lock:
+                    # Keep them, in order, for the next flush
+                    self._pending[:0] = rows
+                raise
+            self.written += len(rows)
+            self.pruned += pruned
+
+    def _write_loop(self, interval: float):
+        while not self._stop.is_set():
+            self._wake.wait(interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Session log write failed: {e}")
+            with self._lock:
+                # Idle sessions leave RAM even when no new requests arrive
+                self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"active": len(self._sessions), "pending": len(self._pending), "written": self.written,
+                    "pruned": self.pruned, "loads": self.loads, "evictions": self.evictions}
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._writer is not None:
+            self._writer.join(timeout=5)
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+
+    def __len__(self):
+        return len(self._sessions)
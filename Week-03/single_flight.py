@@ -0,0 +1,260 @@
+"""Single-flight coalescing of identical concurrent LLM calls.
+
+Requests with the same key (tenant, corpus version and the response cache's
+``request_key``: normalized query, retrieved chunk ids, model, temperature and
+history digest) that
+arrive while a call for that key is still running do not start their own
+call. They wait for the running one:
+
+- ``run`` shares one result (or one exception) among all callers
+- ``stream`` fans one upstream token stream out to every subscriber; one who
+  joins late first gets the deltas produced so far, then the live ones.
+  Streamed and non-streamed calls never share a flight
+
+The upstream call runs in its own thread (``SingleFlight``, for the Streamlit
+app) or task (``AsyncSingleFlight``, for the server), not in any one caller, so
+a caller that times out or disconnects does not cancel it for the others.
+Only when every caller has gone is it abandoned. ``timeout`` is how long a
+caller waits for the result or for the next delta before it gives up on its own
+(``TimeoutError``). A finished flight is forgotten right away; repeats after
+that are the response cache's job.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+
+
+class _Flight:
+    def __init__(self):
+        self.parts = []
+        self.result = None
+        self.error = None
+        self.done = False
+        self.waiters = 0
+        self.abandoned = False
+
+
+class SingleFlight:
+    """Thread version: the upstream call runs on a daemon thread per flight."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._flights = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def _join(self, key, start):
+        with self._lock:
+            flight = self._flights.get(key)
+            joined = flight is not None
+            if joined:
+                self.coalesced += 1
+            else:
+                flight = self._flights[key] = _Flight()
+                self.calls += 1
+            flight.waiters += 1
+        if not joined:
+            # Copy the caller's context so tracing spans of the call land in its trace
+            ctx = contextvars.copy_context()
+            threading.Thread(target=ctx.run, args=(start, key, flight), name="single-flight", daemon=True).start()
+        return joined, flight
+
+    def _finish(self, key, flight, error=None):
+        with self._lock:
+            flight.error = error
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            self._changed.notify_all()
+
+    def _leave(self, key, flight):
+        with self._lock:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.done:
+                # Nobody is left to read it; the producer stops at its next delta
+                flight.abandoned = True
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def _wait(self, flight, seen: int, timeout):
+        """Block until ``flight`` has more than ``seen`` parts or is done (lock held)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while len(flight.parts) <= seen and not flight.done:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError("timed out waiting for a shared LLM call")
+            self._changed.wait(remaining)
+
+    def run(self, key, fn, timeout=None):
+        """``(joined, fn())``; ``joined`` is True if another caller's call was reused."""
+        def start(key, flight):
+            try:
+                flight.result = fn()
+            except BaseException as e:
+                self._finish(key, flight, e)
+            else:
+                self._finish(key, flight)
+
+        joined, flight = self._join(key, start)
+        try:
+            with self._lock:
+                self._wait(flight, len(flight.parts), timeout)
+            if flight.error is not None:
+                raise flight.error
+            return joined, flight.result
+        finally:
+            self._leave(key, flight)
+
+    def stream(self, key, factory, timeout=None):
+        """``(joined, deltas)``: ``factory()`` yields the upstream deltas, iterated once per key."""
+        def start(key, flight):
+            try:
+                for delta in factory():
+                    if flight.abandoned:
+                        break
+                    with self._lock:
+                        flight.parts.append(delta)
+                        self._changed.notify_all()
+            except BaseException as e:
+                self._finish(key, flight, e)
+            else:
+                self._finish(key, flight)
+
+        key = ("stream", key)
+        joined, flight = self._join(key, start)
+
+        def deltas():
+            seen = 0
+            try:
+                while True:
+                    with self._lock:
+                        self._wait(flight, seen, timeout)
+                        new = flight.parts[seen:]
+                        done = flight.done
+                    yield from new
+                    seen += len(new)
+                    if done and seen == len(flight.parts):
+                        if flight.error is not None:
+                            raise flight.error
+                        return
+            finally:
+                self._leave(key, flight)
+
+        return joined, deltas()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"in_flight": len(self._flights), "calls": self.calls, "coalesced": self.coalesced}
+
+
+class AsyncSingleFlight:
+    """asyncio version: the upstream call runs as its own task on the event loop."""
+
+    def __init__(self):
+        self._flights = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def _join(self, key, make_coro):
+        flight = self._flights.get(key)
+        joined = flight is not None
+        if joined:
+            self.coalesced += 1
+        else:
+            flight = self._flights[key] = _Flight()
+            flight.changed = asyncio.Event()
+            self.calls += 1
+            flight.task = asyncio.ensure_future(make_coro(key, flight))
+        flight.waiters += 1
+        return joined, flight
+
+    def _notify(self, flight):
+        # Waiters hold the old event; a fresh one catches the next change
+        changed, flight.changed = flight.changed, asyncio.Event()
+        changed.set()
+
+    def _finish(self, key, flight, error=None):
+        flight.error = error
+        flight.done = True
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        self._notify(flight)
+
+    def _leave(self, key, flight):
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.done:
+            flight.abandoned = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.task.cancel()
+
+    async def _wait(self, flight, seen: int, timeout):
+        while len(flight.parts) <= seen and not flight.done:
+            changed = flight.changed
+            try:
+                await asyncio.wait_for(changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError("timed out waiting for a shared LLM call") from None
+
+    async def run(self, key, fn, timeout=None):
+        """``(joined, await fn())``; ``joined`` is True if another caller's call was reused."""
+        async def produce(key, flight):
+            try:
+                flight.result = await fn()
+            except asyncio.CancelledError:
+                self._finish(key, flight, asyncio.CancelledError())
+                raise
+            except Exception as e:
+                self._finish(key, flight, e)
+            else:
+                self._finish(key, flight)
+
+        joined, flight = self._join(key, produce)
+        try:
+            await self._wait(flight, 0, timeout)
+            if flight.error is not None:
+                raise flight.error
+            return joined, flight.result
+        finally:
+            self._leave(key, flight)
+
+    def stream(self, key, factory, timeout=None):
+        """``(joined, deltas)``: ``factory()`` is an async generator of upstream deltas."""
+        async def produce(key, flight):
+            try:
+                async for delta in factory():
+                    flight.parts.append(delta)
+                    self._notify(flight)
+            except asyncio.CancelledError:
+                self._finish(key, flight, asyncio.CancelledError())
+                raise
+            except Exception as e:
+                self._finish(key, flight, e)
+            else:
+                self._finish(key, flight)
+
+        key = ("stream", key)
+        joined, flight = self._join(key, produce)
+
+        async def deltas():
+            seen = 0
+            try:
+                while True:
+                    await self._wait(flight, seen, timeout)
+                    new = flight.parts[seen:]
+                    for delta in new:
+                        yield delta
+                    seen += len(new)
+                    if flight.done and seen == len(flight.parts):
+                        if flight.error is not None:
+                            raise flight.error
+                        return
+            finally:
+                self._leave(key, flight)
+
+        return joined, deltas()
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._flights), "calls": self.calls, "coalesced": self.coalesced}
@@ -0,0 +1,298 @@
+"""Per-location indexes for the Joni Eats chatbot, shared by every session of a process.
+
+Each restaurant location (tenant) has its own KB file, either listed
+explicitly or found as ``<tenants_dir>/<tenant>.txt``. ``TenantRegistry``
+loads a tenant's ``LiveIndex`` and response cache on its first request. Every
+later request of any session reuses them. Each tenant's memory-mapped index is
+kept under its own ``<cache_root>/<tenant>/`` directory.
+
+Memory is bounded across tenants:
+
+- each loaded tenant is charged an estimate of its snapshot size: matrix,
+  vocabulary, idf and chunk text, plus BM25 postings once they have been built
+- once the total exceeds ``max_bytes``, the least recently used tenants that
+  have no request in flight are unloaded. A tenant serving a request is never
+  evicted, since its snapshot stays referenced until the request ends anyway
+- request counts per tenant are saved to ``<cache_root>/tenant_hits.json``.
+  ``preload()`` uses them to load the busiest tenants at startup, as far as the
+  budget allows
+
+A single watcher thread polls the corpus files of all loaded tenants, instead
+of one thread per ``LiveIndex``.
+"""
+import contextlib
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+from live_index import LiveIndex
+from response_cache import ResponseCache
+
+MAX_BYTES = 512 * 1024 * 1024
+TENANT_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+HITS_FILE = "tenant_hits.json"
+
+
+class UnknownTenant(KeyError):
+    pass
+
+
+def _array_bytes(*arrays) -> int:
+    return sum(getattr(a, "nbytes", 0) for a in arrays)
+
+
+def _vocab_bytes(vocab) -> int:
+    # Keys dominate: short n-gram strings plus one boxed int each
+    return sys.getsizeof(vocab) + sum(sys.getsizeof(t) + 28 for t in vocab)
+
+
+def snapshot_nbytes(snap) -> int:
+    """Approximate resident size of an ``IndexSnapshot``, BM25 included once built."""
+    mat = snap.mat
+    size = _array_bytes(mat.data, mat.indices, mat.indptr, snap.vec.idf_)
+    size += _vocab_bytes(snap.vec.vocabulary_)
+    chunks = snap.chunks
+    if hasattr(chunks, "_blob"):
+        size += len(chunks._blob) + _array_bytes(chunks._offsets)
+    else:
+        size += sum(sys.getsizeof(c) for c in chunks)
+    size += sum(map(sys.getsizeof, (snap.kb_text, snap.patterns, snap.flow)))
+    bm25 = snap.bm25.built if snap.bm25 is not None else None
+    if bm25 is not None:
+        size += bm25.nbytes + _vocab_bytes(bm25.vocab)
+    return size
+
+
+class Tenant:
+    def __init__(self, name: str, index: LiveIndex, cache: ResponseCache):
+        self.name = name
+        self.index = index
+        self.cache = cache
+        self.active = 0
+        self.last_used = time.monotonic()
+        self.nbytes = 0
+        self._sized = None   # (snapshot version, bm25 built) that nbytes was measured for
+
+    def snapshot(self):
+        return self.index.snapshot()
+
+    def measure(self) -> bool:
+        """Refresh ``nbytes`` if the snapshot changed since it was last measured."""
+        snap = self.index.snapshot()
+        state = (snap.version, snap.bm25 is not None and snap.bm25.built is not None)
+        if state == self._sized:
+            return False
+        self.nbytes = snapshot_nbytes(snap)
+        self._sized = state
+        return True
+
+
+class TenantRegistry:
+    def __init__(self, cache_root: Path, tenants_dir: Path | None = None, corpora: dict | None = None,
+                 max_bytes: int = MAX_BYTES, make_cache=ResponseCache):
+        self.cache_root = Path(cache_root)
+        self.tenants_dir = Path(tenants_dir) if tenants_dir is not None else None
+        self.corpora = {name: Path(p) for name, p in (corpora or {}).items()}
+        self.max_bytes = max_bytes
+        self.make_cache = make_cache
+        self.loads = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._loading = {}              # tenant -> Lock, so a tenant is loaded once
+        self._tenants = OrderedDict()   # tenant -> Tenant, least recently used first
+        self._hits = Counter(self._read_hits())
+        self._saved_hits = sum(self._hits.values())
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def corpus_path(self, name: str) -> Path:
+        if name in self.corpora:
+            return self.corpora[name]
+        if self.tenants_dir is not None and TENANT_ID.match(name):
+            path = self.tenants_dir / f"{name}.txt"
+            if path.is_file():
+                return path
+        raise UnknownTenant(name)
+
+    def loaded(self, name: str) -> bool:
+        return name in self._tenants
+
+    def names(self):
+        """Every tenant that has a corpus, loaded or not."""
+        names = set(self.corpora)
+        if self.tenants_dir is not None and self.tenants_dir.is_dir():
+            names.update(p.stem for p in self.tenants_dir.glob("*.txt") if TENANT_ID.match(p.stem))
+        return sorted(names)
+
+    def _load(self, name: str) -> Tenant:
+        with self._lock:
+            lock = self._loading.setdefault(name, threading.Lock())
+        try:
+            with lock:
+                with self._lock:
+                    tenant = self._tenants.get(name)
+                if tenant is not None:
+                    return tenant
+                started = time.perf_counter()
+                index = LiveIndex(self.corpus_path(name), self.cache_root / name)
+                tenant = Tenant(name, index, self.make_cache())
+                tenant.measure()
+                with self._lock:
+                    self._tenants[name] = tenant
+                    self.loads += 1
+                print(f"Tenant {name}: loaded {tenant.nbytes / 2 ** 20:.1f} MB "
+                      f"in {time.perf_counter() - started:.2f}s")
+                return tenant
+        finally:
+            with self._lock:
+                self._loading.pop(name, None)
+
+    def get(self, name: str) -> Tenant:
+        """The tenant's index and cache, loading it if needed (marks it most recently used)."""
+        with self._lock:
+            tenant = self._tenants.get(name)
+        loaded = tenant is None
+        if loaded:
+            tenant = self._load(name)
+        with self._lock:
+            if name in self._tenants:
+                self._tenants.move_to_end(name)
+            tenant.last_used = time.monotonic()
+            self._hits[name] += 1
+        # Re-measured after corpus edits and once BM25 has been built
+        if tenant.measure() or loaded:
+            self._evict(keep=name)
+        return tenant
+
+    @contextlib.contextmanager
+    def use(self, name: str):
+        """``get`` that also keeps the tenant from being evicted until the block exits."""
+        tenant = self.get(name)
+        with self._lock:
+            tenant.active += 1
+        try:
+            yield tenant
+        finally:
+            with self._lock:
+                tenant.active -= 1
+                tenant.last_used = time.monotonic()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(t.nbytes for t in list(self._tenants.values()))
+
+    def _evict(self, keep: str | None = None):
+        dropped = []
+        with self._lock:
+            total = sum(t.nbytes for t in self._tenants.values())
+            for name, tenant in list(self._tenants.items()):
+                if total <= self.max_bytes:
+                    break
+                if name == keep or tenant.active:
+                    continue
+                del self._tenants[name]
+                total -= tenant.nbytes
+                dropped.append(tenant)
+            self.evictions += len(dropped)
+        for tenant in dropped:
+            tenant.index.stop()
+            print(f"Tenant {tenant.name}: evicted ({tenant.nbytes / 2 ** 20:.1f} MB, "
+                  f"idle {time.monotonic() - tenant.last_used:.0f}s)")
+        if total > self.max_bytes:
+            print(f"Tenant indexes use {total / 2 ** 20:.1f} MB, over the "
+                  f"{self.max_bytes / 2 ** 20:.0f} MB budget; the rest are in use")
+
+    def hottest(self, n: int | None = None):
+        """Tenants with a corpus, busiest first by recorded request counts."""
+        available = set(self.names())
+        ranked = [name for name, _c in self._hits.most_common() if name in available]
+        return ranked if n is None else ranked[:n]
+
+    def preload(self, names=None, limit: int | None = None):
+        """Load ``names`` (default: the hottest tenants) while they fit in the budget."""
+        loaded = []
+        for name in list(names if names is not None else self.hottest())[:limit]:
+            if self.nbytes >= self.max_bytes:
+                break
+            try:
+                tenant = self._load(name)
+            except (UnknownTenant, OSError) as e:
+                print(f"Tenant {name}: preload skipped ({e})")
+                continue
+            if loaded and self.nbytes > self.max_bytes:
+                self._unload(tenant)
+                break
+            loaded.append(name)
+        with self._lock:
+            # Busiest last, so it is the last to be evicted
+            for name in reversed(loaded):
+                if name in self._tenants:
+                    self._tenants.move_to_end(name)
+        return loaded
+
+    def _unload(self, tenant: Tenant):
+        with self._lock:
+            if self._tenants.get(tenant.name) is tenant:
+                del self._tenants[tenant.name]
+        tenant.index.stop()
+
+    def _read_hits(self):
+        try:
+            hits = json.loads((self.cache_root / HITS_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return {str(k): int(v) for k, v in hits.items() if isinstance(v, int)}
+
+    def save_hits(self):
+        with self._lock:
+            total = sum(self._hits.values())
+            if total == self._saved_hits:
+                return
+            hits = dict(self._hits)
+            self._saved_hits = total
+        path = self.cache_root / HITS_FILE
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(hits, sort_keys=True), encoding="utf-8")
+            tmp.replace(path)
+        except OSError as e:
+            print(f"Could not save tenant hit counts ({e})")
+
+    def _watch_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            for tenant in list(self._tenants.values()):
+                try:
+                    tenant.index.reload()
+                except Exception as e:
+                    # Keep serving the last good snapshot (e.g. file mid-write or missing)
+                    print(f"Tenant {tenant.name}: corpus reload failed: {e}")
+            self.save_hits()
+
+    def watch(self, interval: float = 2.0):
+        """Poll the corpus files of loaded tenants on one daemon thread."""
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch_loop, args=(interval,),
+                                             name="tenant-watcher", daemon=True)
+            self._watcher.start()
+        return self
+
+    def stats(self) -> dict:
+        with self._lock:
+            tenants = {name: {"mb": round(t.nbytes / 2 ** 20, 2), "active": t.active,
+                              "idle_s": round(time.monotonic() - t.last_used, 1),
+                              "version": t.index.snapshot().version, "cache": t.cache.stats()}
+                       for name, t in self._tenants.items()}
+        return {"loaded": len(tenants), "mb": round(self.nbytes / 2 ** 20, 2),
+                "budget_mb": round(self.max_bytes / 2 ** 20, 2), "loads": self.loads,
+                "evictions": self.evictions, "tenants": tenants}
+
+    def stop(self):
+        self._stop.set()
+        self.save_hits()
+        for tenant in list(self._tenants.values()):
+            tenant.index.stop()
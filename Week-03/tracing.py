@@ -0,0 +1,361 @@
+"""Per-stage latency spans, histograms and JSONL traces for the Joni Eats assistants.
+
+    with tracer.trace("chat", tenant="joni-eats"):
+        with tracer.span("retrieval"):
+            hits = retrieve(...)
+
+Off by default: ``trace`` and ``span`` then return one shared no-op context
+manager, so instrumented code pays a single attribute check per stage.
+``configure`` (or ``configure_from_env``: ``TRACE_FILE``, ``TRACE_SAMPLE``,
+``METRICS_FILE``, ``PROFILE_DIR``, or just ``TRACE=1``) turns it on:
+
+- every span feeds an in-process latency histogram for its stage name
+  (log-spaced buckets, percentiles within ~12%); ``metrics()`` returns them as
+  a dict and ``prometheus()`` in Prometheus text format
+- each finished trace (one request or turn) is appended to the JSONL file with
+  its spans, for a ``sample`` fraction of traces; ``METRICS_FILE`` is rewritten
+  with ``metrics()`` at most every ``metrics_interval`` seconds
+  (``METRICS_INTERVAL``, default 5) and once more at exit. Failing to write
+  trace or metrics files never raises into the request
+- ``trace(..., profile=True)`` runs that one request under cProfile and writes
+  ``<profile_dir>/<name>-<trace id>.prof`` (``python -m pstats`` or snakeviz).
+  cProfile sees the whole thread, so on an event loop it includes whatever
+  other requests ran meanwhile
+
+Spans attach to the trace of the current context (thread or asyncio task);
+code on another thread, such as a TTS worker, passes ``trace=`` or enters
+``attach(trace)`` first.
+"""
+import atexit
+import bisect
+import contextvars
+import cProfile
+import functools
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+BUCKET_START = 0.0001   # 0.1 ms
+BUCKET_GROWTH = 1.25
+BUCKETS = [BUCKET_START * BUCKET_GROWTH ** i for i in range(64)]   # up to ~2 min
+METRICS_INTERVAL = 5.0   # seconds between METRICS_FILE rewrites
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+def nearest_rank(p: float, n: int) -> int:
+    """1-based rank of the p-th percentile among n sorted values (nearest rank, as in bench/stats.py)."""
+    return max(1, math.ceil(p / 100 * n))
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, secs: float):
+        self.counts[bisect.bisect_left(BUCKETS, secs)] += 1
+        self.count += 1
+        self.sum += secs
+        if secs > self.max:
+            self.max = secs
+
+    def percentile(self, p: float) -> float:
+        rank = nearest_rank(p, self.count)
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                # Upper edge of the bucket, capped by the largest value seen
+                return min(BUCKETS[i] if i < len(BUCKETS) else self.max, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": 1000 * self.sum / self.count if self.count else 0.0,
+            "p50_ms": 1000 * self.percentile(50),
+            "p95_ms": 1000 * self.percentile(95),
+            "p99_ms": 1000 * self.percentile(99),
+            "max_ms": 1000 * self.max,
+        }
+
+
+class _NoOp:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NOOP = _NoOp()
+
+
+class _Span:
+    __slots__ = ("tracer", "trace", "name", "attrs", "start")
+
+    def __init__(self, tracer, trace, name, attrs):
+        self.tracer = tracer
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        self.tracer.observe(self.name, end - self.start)
+        if self.trace is not None:
+            if exc_type is not None:
+                self.attrs["error"] = exc_type.__name__
+            self.trace.spans.append((self.name, self.start, end, self.attrs))
+        return False
+
+
+class _Attach:
+    __slots__ = ("trace", "token")
+
+    def __init__(self, trace):
+        self.trace = trace
+
+    def __enter__(self):
+        self.token = _current.set(self.trace)
+        return self.trace
+
+    def __exit__(self, *exc):
+        _current.reset(self.token)
+        return False
+
+
+class Trace:
+    def __init__(self, tracer, name: str, attrs: dict, profile: bool):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.id = uuid.uuid4().hex[:16]
+        self.spans = []
+        self.profiler = cProfile.Profile() if profile and tracer.profile_dir is not None else None
+        self._token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        self._token = _current.set(self)
+        if self.profiler is not None:
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # Another request on this thread is already being profiled
+                self.profiler = None
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.profiler is not None:
+            self.profiler.disable()
+        self.end = time.perf_counter()
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Closed from another context (e.g. an abandoned async generator)
+            pass
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.finish(self)
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "ts": self.wall,
+            "duration_ms": round(1000 * (self.end - self.start), 3),
+            "attrs": self.attrs,
+            "spans": [{"name": name, "start_ms": round(1000 * (s - self.start), 3),
+                       "duration_ms": round(1000 * (e - s), 3), **({"attrs": a} if a else {})}
+                      for name, s, e, a in self.spans],
+        }
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.sample = 1.0
+        self.trace_file = None
+        self.metrics_file = None
+        self.profile_dir = None
+        self.metrics_interval = METRICS_INTERVAL
+        self._hist = {}
+        self._lock = threading.Lock()
+        # Serializes METRICS_FILE writes; finish() skips the dump rather than wait for it
+        self._dump_lock = threading.Lock()
+        self._last_dump = float("-inf")
+        self._exit_hook = False
+        self._out = None
+
+    def configure(self, enabled: bool = True, trace_file=None, sample: float = 1.0,
+                  metrics_file=None, profile_dir=None, metrics_interval: float = METRICS_INTERVAL):
+        with self._lock:
+            if self._out is not None:
+                self._out.close()
+                self._out = None
+            self.trace_file = Path(trace_file) if trace_file else None
+            self.metrics_file = Path(metrics_file) if metrics_file else None
+            self.profile_dir = Path(profile_dir) if profile_dir else None
+            self.sample = sample
+            self.metrics_interval = metrics_interval
+            if self.metrics_file is not None and not self._exit_hook:
+                atexit.register(self._dump_at_exit)
+                self._exit_hook = True
+            if self.trace_file is not None:
+                self.trace_file.parent.mkdir(parents=True, exist_ok=True)
+                self._out = open(self.trace_file, "a", encoding="utf-8", buffering=1)
+            if self.profile_dir is not None:
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+            self.enabled = enabled
+        return self
+
+    def configure_from_env(self):
+        env = os.environ
+        keys = ("TRACE_FILE", "METRICS_FILE", "PROFILE_DIR")
+        if env.get("TRACE", "").lower() in ("1", "true", "yes") or any(env.get(k) for k in keys):
+            self.configure(trace_file=env.get("TRACE_FILE"), sample=float(env.get("TRACE_SAMPLE", "1")),
+                           metrics_file=env.get("METRICS_FILE"), profile_dir=env.get("PROFILE_DIR"),
+                           metrics_interval=float(env.get("METRICS_INTERVAL", METRICS_INTERVAL)))
+        return self
+
+    def current(self):
+        return _current.get()
+
+    def trace(self, name: str, profile: bool = False, **attrs):
+        """One request or turn; spans opened inside it are recorded with it."""
+        if not self.enabled:
+            return NOOP
+        return Trace(self, name, attrs, profile)
+
+    def attach(self, trace):
+        """Make ``trace`` current on this thread for the duration of the block."""
+        if not self.enabled or trace is None or trace is NOOP:
+            return NOOP
+        return _Attach(trace)
+
+    def span(self, name: str, trace=None, **attrs):
+        """Time one stage; ``trace`` defaults to the current context's trace."""
+        if not self.enabled:
+            return NOOP
+        return _Span(self, trace if trace is not None else _current.get(), name, attrs)
+
+    def timed(self, name: str | None = None):
+        """Decorator form of ``span``."""
+        def wrap(fn):
+            label = name or fn.__qualname__
+
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self.span(label):
+                    return fn(*args, **kwargs)
+            return inner
+        return wrap
+
+    def observe(self, name: str, secs: float):
+        """Add one latency sample (seconds) to the ``name`` histogram."""
+        if not self.enabled:
+            return
+        with self._lock:
+            hist = self._hist.get(name)
+            if hist is None:
+                hist = self._hist[name] = Histogram()
+            hist.add(secs)
+
+    def finish(self, trace: Trace):
+        self.observe(trace.name, trace.end - trace.start)
+        try:
+            if trace.profiler is not None:
+                trace.profiler.dump_stats(self.profile_dir / f"{trace.name}-{trace.id}.prof")
+            if self._out is not None and (self.sample >= 1.0 or random.random() < self.sample):
+                line = json.dumps(trace.to_dict(), ensure_ascii=False, default=str)
+                with self._lock:
+                    if self._out is not None:
+                        self._out.write(line + "\n")
+            path = self.metrics_file
+            if path is not None and time.monotonic() - self._last_dump >= self.metrics_interval:
+                # Whoever holds the lock is writing fresh numbers already
+                if self._dump_lock.acquire(blocking=False):
+                    try:
+                        self._last_dump = time.monotonic()
+                        self._write_metrics(path)
+                    finally:
+                        self._dump_lock.release()
+        except (OSError, ValueError) as e:
+            # Metrics I/O must never fail the request being traced
+            print(f"⚠️ tracing: could not write trace output: {e}")
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {name: hist.summary() for name, hist in sorted(self._hist.items())}
+
+    def prometheus(self, prefix: str = "joni") -> str:
+        lines = [f"# TYPE {prefix}_stage_seconds summary"]
+        with self._lock:
+            for name, hist in sorted(self._hist.items()):
+                label = f'stage="{name}"'
+                for q in (50, 95, 99):
+                    lines.append(f'{prefix}_stage_seconds{{{label},quantile="{q / 100}"}} {hist.percentile(q):.6f}')
+                lines.append(f"{prefix}_stage_seconds_sum{{{label}}} {hist.sum:.6f}")
+                lines.append(f"{prefix}_stage_seconds_count{{{label}}} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """Atomically rewrite ``path`` with ``metrics()``."""
+        with self._dump_lock:
+            self._write_metrics(path)
+
+    def _write_metrics(self, path):
+        path = Path(path)
+        # A unique temp file per write, so concurrent dumps never replace each other's file
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=path.parent, prefix=path.name + ".",
+                                         suffix=".tmp", delete=False) as tmp:
+            json.dump(self.metrics(), tmp, indent=2)
+        try:
+            os.replace(tmp.name, path)
+        except OSError:
+            os.unlink(tmp.name)
+            raise
+
+    def _dump_at_exit(self):
+        if self.metrics_file is not None:
+            try:
+                self.dump(self.metrics_file)
+            except OSError as e:
+                print(f"⚠️ tracing: could not write {self.metrics_file}: {e}")
+
+    def report(self) -> str:
+        rows = [f"{'stage':<16}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)"]
+        for name, s in self.metrics().items():
+            rows.append(f"{name:<16}{s['count']:>8}{s['mean_ms']:>10.2f}{s['p50_ms']:>10.2f}"
+                        f"{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}")
+        return "\n".join(rows)
+
+
+tracer = Tracer()
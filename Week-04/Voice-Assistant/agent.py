@@ -1,15 +1,36 @@
 import os
-from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory
-from langchain.prompts import PromptTemplate
-from langchain_groq import ChatGroq
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import pyttsx3
 import speech_recognition as sr
+from startup import AgentStartup
+from tts_cache import TTSCache
+from tts_pipeline import Interrupted, SpeechPipeline, SentenceStreamHandler
+from shared import tracer
+
+# Stream LLM tokens into a TTS worker sentence by sentence instead of
+# waiting for the full reply before speaking
+PIPELINED_TTS = True
+
+# Frame-level VAD on the open mic stream with a call-long noise floor, instead of
+# recalibrating and waiting out a fixed pause every turn (see vad.py)
+STREAMING_VAD = True
+
+# Keep listening while the agent speaks; caller speech stops the reply (and the
+# LLM call behind it) and becomes the next turn. Needs PIPELINED_TTS and
+# STREAMING_VAD; a headset works best, since loud speaker echo can trigger it
+FULL_DUPLEX = True
 
 # Load environment variables from .env
 load_dotenv()
 
+# Per-stage latency (listen, stt, context, llm, tts) per turn; off unless TRACE=1,
+# TRACE_FILE, METRICS_FILE or PROFILE_DIR is set. PROFILE_TURNS=3,5 runs those
+# turns under cProfile (needs PROFILE_DIR)
+tracer.configure_from_env()
+PROFILE_TURNS = {int(t) for t in os.getenv("PROFILE_TURNS", "").split(",") if t.strip().isdigit()}
+_turn_trace = None  # trace of the turn in progress, for spans on the TTS thread
+
 # Groq API credentials with validation
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 if not GROQ_API_KEY:
@@ -17,163 +38,166 @@ if not GROQ_API_KEY:
     print("Please check your .env file and ensure GROQ_API_KEY is set.")
     exit(1)
 
-# Load text files with error handling
-def load_text_file(filepath):
-    try:
-        with open(filepath, "r", encoding="utf-8") as file:
-            return file.read()
-    except FileNotFoundError:
-        print(f"⚠️ Warning: {filepath} not found. Using default content.")
-        return f"Default content for {filepath}"
-    except Exception as e:
-        print(f"❌ Error loading {filepath}: {e}")
-        return ""
+# Config files + LLM and recognizer + microphone load in the background;
+# the TTS engine comes up on first use, so the greeting does not wait for the rest
+script_dir = os.path.dirname(os.path.abspath(__file__))
+startup = AgentStartup(script_dir, GROQ_API_KEY, streaming=PIPELINED_TTS)
 
-# Load configuration files using absolute paths
-try:
-    # Get the directory where this script is located
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    chat_patterns = load_text_file(os.path.join(script_dir, "chat_patterns.txt"))
-    context_flow = load_text_file(os.path.join(script_dir, "context_flow.txt"))
-    restaurant_kb = load_text_file(os.path.join(script_dir, "restaurant_kb.txt"))
-    print("✅ All configuration files loaded successfully.")
-except Exception as e:
-    print(f"❌ Error loading configuration files: {e}")
-    exit(1)
-
-# Enhanced Prompt Template
-custom_template = f"""
-You are an intelligent, warm, and professional AI voice assistant for Joni Eats restaurant. Your goal is to provide exceptional customer service through natural conversation.
+# Fixed phrases are rendered to audio files once and played back from disk on
+# every later call; other sentences are cached once they have been said twice
+GREETING = "Hi, Welcome to Joni Eats! How can I help you today?"
+GOODBYE = "Thank you for calling Joni Eats! Have a wonderful day!"
+TROUBLE_HEARING = "I'm having trouble hearing you. Please call back when you have a better connection. Thank you!"
+FALLBACK = "I apologize, but I'm having a technical issue. Could you please repeat your request?"
+TECHNICAL_DIFFICULTIES = "I apologize, but we're experiencing technical difficulties. Please call back later."
+FIXED_PHRASES = (GREETING, GOODBYE, TROUBLE_HEARING, FALLBACK, TECHNICAL_DIFFICULTIES, "Goodbye!")
+tts_cache = TTSCache(os.path.join(script_dir, ".cache", "tts"), pinned=FIXED_PHRASES)
 
-### CORE PERSONALITY TRAITS
-- Friendly and approachable, but professional
-- Patient and understanding with all customers
-- Proactive in offering help and suggestions
-- Knowledgeable about all menu items and deals
-- Empathetic when handling complaints or issues
+def dialogue():
+    try:
+        return startup.dialogue()
+    except Exception as e:
+        print(f"❌ Error initializing configuration files / Groq LLM: {e}")
+        exit(1)
 
-### CONVERSATION GUIDELINES
-{context_flow}
+def clean_for_voice(text):
+    # Remove formatting, keep it natural
+    return text.replace("*", "").replace("#", "")
 
-### ADVANCED INSTRUCTIONS
-- Listen carefully to customer needs and respond appropriately to their tone
-- If a customer seems indecisive, offer 2-3 specific recommendations based on popularity or value
-- For complaints, always acknowledge the issue, apologize sincerely, and offer concrete solutions
-- When taking orders, confirm details clearly and suggest complementary items naturally
-- Keep responses concise but complete - avoid overwhelming customers with too much information at once
-- Use natural speech patterns suitable for voice conversation (avoid bullet points or complex formatting)
-- Remember context from earlier in the conversation to provide personalized service
+_hooked_engine = None
 
-### RESTAURANT KNOWLEDGE BASE
-{restaurant_kb}
+def _on_word(name, location, length):
+    # Runs inside runAndWait on the TTS thread, where stop() is safe to call
+    if speech is not None and speech.interrupted.is_set():
+        startup.engine().stop()
 
-### CONVERSATION EXAMPLES FOR REFERENCE
-{chat_patterns}
+def _speak_now(text):
+    global _hooked_engine
+    try:
+        if text and text.strip():  # Only speak if there's actual text
+            engine = startup.engine()
+            if _hooked_engine is not engine:
+                engine.connect('started-word', _on_word)
+                _hooked_engine = engine
+            with tracer.attach(_turn_trace), tracer.span("tts", chars=len(text)):
+                tts_cache.speak(engine, text, interrupted=speech.interrupted if speech is not None else None)
+    except Exception as e:
+        print(f"❌ Error during speech synthesis: {e}")
+        print(f"📝 Message was: {text}")
 
-IMPORTANT: Use the examples above as a guide for tone and style, but respond naturally to each unique customer interaction. Don't repeat exact phrases unless they fit perfectly.
+# In pipelined mode every utterance goes through the one TTS worker thread
+speech = SpeechPipeline(_speak_now, clean_fn=clean_for_voice) if PIPELINED_TTS else None
 
-### CURRENT CONVERSATION
-{{history}}
+def speak(text):
+    if speech is None:
+        _speak_now(text)
+        return
+    speech.begin()
+    speech.say(text)
+    speech.end()
 
-Customer: {{input}}
-Assistant:"""
+def _note_fallback():
+    model = dialogue().last_timing.get("model")
+    if model and model != dialogue().llm.model_name:
+        print(f"🔀 Answered by fallback model {model} (primary slow or failing)")
 
-prompt = PromptTemplate(
-    input_variables=["history", "input"],
-    template=custom_template,
-)
+def respond_pipelined(user_input, cancel=None):
+    """Generate a reply while speaking it sentence by sentence; returns the full text."""
+    speech.begin()
+    handler = SentenceStreamHandler(speech, cancel=cancel)
+    try:
+        response = dialogue().predict(user_input, callbacks=[handler])
+    except Interrupted:
+        # Generation was cut off by the caller; keep what was said so the next turn has context
+        partial = clean_for_voice(handler.text).strip()
+        dialogue().memory.save_context({"input": user_input}, {"response": partial + " ..."})
+        print(f"✋ Interrupted after: {partial}")
+        # Let sentences queued before the cut-off drain unspoken, then re-arm for the next phrase
+        speech.end()
+        return partial
+    _note_fallback()
+    if handler.tokens:
+        speech.flush()
+    else:
+        # Backend did not stream; speak the whole reply at once
+        speech.say(response)
+    response = clean_for_voice(response).strip()
+    print(f"🤖 Assistant: {response}")
+    speech.end()
+    ttfa = speech.time_to_first_audio()
+    if ttfa is not None:
+        tracer.observe("first_audio", ttfa)
+        print(f"⏱️ First audio after {ttfa * 1000:.0f} ms")
+    return response
 
-# Memory
-memory = ConversationBufferMemory()
-memory.clear()
+_barge_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="barge-in")
 
-# LangChain LLM with Groq and error handling
-try:
-    llm = ChatGroq(
-        groq_api_key=GROQ_API_KEY,
-        model_name="llama-3.1-8b-instant",
-        temperature=0.5,
-        max_tokens=200  # Limit response length for voice conversations
-    )
-    print("✅ Groq LLM initialized successfully.")
-except Exception as e:
-    print(f"❌ Error initializing Groq LLM: {e}")
-    exit(1)
+def respond_duplex(user_input):
+    """Speak the reply while listening; returns what the caller said if they cut in, else None."""
+    barge = threading.Event()
+    finished = threading.Event()
 
-# Conversation Chain
-conversation = ConversationChain(
-    llm=llm,
-    memory=memory,
-    prompt=prompt,
-    verbose=False
-) 
+    def on_caller_speech():
+        barge.set()
+        speech.interrupt()
 
-# Enhanced Text-to-Speech engine with error handling
-try:
-    engine = pyttsx3.init()
-    engine.setProperty('rate', 170)  # Moderate speaking speed
-    engine.setProperty('volume', 0.9)  # Set volume (0.0 to 1.0)
-    
-    # Set female voice with fallback
-    voices = engine.getProperty('voices')
-    voice_set = False
-    
-    # Try to find a female voice
-    for voice in voices:
-        if voice.name and ("female" in voice.name.lower() or "zira" in voice.name.lower() or "susan" in voice.name.lower()):
-            engine.setProperty('voice', voice.id)
-            voice_set = True
-            print(f"✅ Voice set to: {voice.name}")
-            break
-    
-    if not voice_set and voices:
-        engine.setProperty('voice', voices[0].id)  # Use first available voice as fallback
-        print(f"✅ Voice set to: {voices[0].name} (fallback)")
-        
-except Exception as e:
-    print(f"❌ Error initializing text-to-speech: {e}")
-    exit(1)
+    watcher = _barge_pool.submit(startup.streaming_listener().listen, timeout=float("inf"),
+                                 phrase_time_limit=8, barge_in=True, on_start=on_caller_speech, cancel=finished)
+    try:
+        respond_pipelined(user_input, cancel=barge)
+    finally:
+        # Stops the watcher unless the caller is already mid-sentence; either way it
+        # has to be done with the microphone before listen() reads from it again
+        finished.set()
+        text = _caller_utterance(watcher)
+    return text
 
-def speak(text):
+def _caller_utterance(watcher):
     try:
-        if text and text.strip():  # Only speak if there's actual text
-            engine.say(text)
-            engine.runAndWait()
+        text = watcher.result()
+    except (sr.UnknownValueError, sr.WaitTimeoutError):
+        print("😕 Sorry, I couldn't understand that. Could you please repeat?")
+        return None
     except Exception as e:
-        print(f"❌ Error during speech synthesis: {e}")
-        print(f"📝 Message was: {text}")
-
-# Speech Recognizer with error handling
-try:
-    recognizer = sr.Recognizer()
-    # Configure recognizer settings
-    recognizer.energy_threshold = 300
-    recognizer.dynamic_energy_threshold = True
-    recognizer.pause_threshold = 0.8
-    print("✅ Speech recognizer initialized successfully.")
-except Exception as e:
-    print(f"❌ Error initializing speech recognizer: {e}")
-    print("This might be due to missing audio dependencies.")
-    exit(1)
+        print(f"❌ Error while listening during playback: {e}")
+        return None
+    if text:
+        print(f"🗣️ You said (while I was talking): {text}")
+    return text
 
 def listen():
     try:
-        # Check if microphone is available
-        mic_list = sr.Microphone.list_microphone_names()
-        if not mic_list:
-            print("❌ No microphone detected. Please connect a microphone.")
+        try:
+            recognizer, mic, stt = startup.listener()
+        except OSError as e:
+            print(f"❌ {e}")
             return None
-            
-        with sr.Microphone(sample_rate=16000, chunk_size=1024) as source:
-            print("🎤 Listening...")
+        except Exception as e:
+            print(f"❌ Error initializing speech recognizer: {e}")
+            print("This might be due to missing audio dependencies.")
+            exit(1)
+
+        # The stream stays open between turns; skip what it picked up while we were talking
+        source = mic.open()
+        mic.drain()
+        print("🎤 Listening...")
+        if STREAMING_VAD:
+            vad_listener = startup.streaming_listener()
+            with tracer.span("listen", vad=True):
+                text = vad_listener.listen(timeout=10, phrase_time_limit=8)
+            print(f"🗣️ You said: {text}")
+            print(f"⏱️ Transcript {vad_listener.last_timing['eos_to_text'] * 1000:.0f} ms after end of speech")
+            return text
+
+        with tracer.span("listen", vad=False):
             # Adjust for ambient noise with shorter duration
             recognizer.adjust_for_ambient_noise(source, duration=0.2)
             # Listen with timeout
             audio = recognizer.listen(source, timeout=10, phrase_time_limit=8)
-        
+
         # Try to recognize speech
-        text = recognizer.recognize_google(audio)
+        with tracer.span("stt"):
+            text = stt.transcribe(audio)
         print(f"🗣️ You said: {text}")
         return text
         
@@ -191,8 +215,7 @@ def listen():
             print("🔄 Audio stream issue detected. Reinitializing microphone...")
             try:
                 # Try to reinitialize the microphone
-                import time
-                time.sleep(0.5)  # Brief pause
+                startup.listener()[1].reopen()
                 return None
             except:
                 print("❌ Could not reinitialize microphone. Please check your audio settings.")
@@ -206,52 +229,77 @@ def listen():
 
 # Enhanced main loop with better error handling
 def main():
+    global _turn_trace
     print("🍕 Starting Joni Eats Voice Assistant...")
     
     try:
-        speak("Hi, Welcome to Joni Eats! How can I help you today?")
+        # Warm the LLM connection while the greeting is being spoken
+        startup.warm_up()
+        with tracer.trace("greeting") as _turn_trace:
+            speak(GREETING)
+        if startup.tts_ready_at is not None:
+            print(f"⏱️ Greeting synthesis started {(startup.tts_ready_at - startup.started_at) * 1000:.0f} ms after launch")
+        # Render the other fixed phrases on the TTS thread while the caller talks
+        if speech is not None:
+            speech.run(lambda: tts_cache.prerender(startup.engine()))
         
         consecutive_errors = 0
         max_errors = 3
+        duplex = FULL_DUPLEX and PIPELINED_TTS and STREAMING_VAD
+        barged_in = None
+        turn = 0
         
         while True:
-            user_input = listen()
+            turn += 1
+            with tracer.trace("turn", profile=turn in PROFILE_TURNS, turn=turn) as _turn_trace:
+                # A barge-in during the last reply already is the next utterance
+                user_input, barged_in = barged_in or listen(), None
             
-            if user_input is None:
-                consecutive_errors += 1
-                if consecutive_errors >= max_errors:
-                    speak("I'm having trouble hearing you. Please call back when you have a better connection. Thank you!")
-                    break
-                continue
+                if user_input is None:
+                    consecutive_errors += 1
+                    if consecutive_errors >= max_errors:
+                        speak(TROUBLE_HEARING)
+                        break
+                    continue
             
-            # Reset error counter on successful input
-            consecutive_errors = 0
+                # Reset error counter on successful input
+                consecutive_errors = 0
             
-            # Check for conversation ending phrases
-            end_phrases = ["bye", "goodbye", "end call", "hang up", "that's all", "thanks bye"]
-            if any(phrase in user_input.lower() for phrase in end_phrases):
-                speak("Thank you for calling Joni Eats! Have a wonderful day!")
-                break
+                # Check for conversation ending phrases
+                end_phrases = ["bye", "goodbye", "end call", "hang up", "that's all", "thanks bye"]
+                if any(phrase in user_input.lower() for phrase in end_phrases):
+                    speak(GOODBYE)
+                    break
             
-            # Generate response with error handling
-            try:
-                response = conversation.predict(input=user_input)
-                # Clean up response for voice (remove formatting, keep it natural)
-                response = response.replace("*", "").replace("#", "").strip()
-                print(f"🤖 Assistant: {response}")
-                speak(response)
+                # Generate response with error handling
+                try:
+                    if duplex:
+                        barged_in = respond_duplex(user_input)
+                    elif PIPELINED_TTS:
+                        respond_pipelined(user_input)
+                    else:
+                        response = dialogue().predict(user_input)
+                        _note_fallback()
+                        # Clean up response for voice (remove formatting, keep it natural)
+                        response = clean_for_voice(response).strip()
+                        print(f"🤖 Assistant: {response}")
+                        speak(response)
                 
-            except Exception as e:
-                print(f"❌ Error generating response: {e}")
-                fallback_response = "I apologize, but I'm having a technical issue. Could you please repeat your request?"
-                speak(fallback_response)
+                except Exception as e:
+                    print(f"❌ Error generating response: {e}")
+                    speak(FALLBACK)
                 
     except KeyboardInterrupt:
         print("\n👋 Voice assistant stopped by user.")
         speak("Goodbye!")
     except Exception as e:
         print(f"❌ Unexpected error in main loop: {e}")
-        speak("I apologize, but we're experiencing technical difficulties. Please call back later.")
+        speak(TECHNICAL_DIFFICULTIES)
+    finally:
+        startup.close()
+        if tracer.enabled:
+            print("📊 Stage latency this call:")
+            print(tracer.report())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,202 @@
+"""Bounded conversation memory for the Joni Eats voice assistant.
+
+``CallMemory`` is a drop-in for ``ConversationBufferMemory`` that keeps the
+``{history}`` slot a bounded size for the whole call:
+
+- the last ``max_turns`` exchanges are kept verbatim, within ``token_budget``
+- older exchanges are folded into a running summary by the LLM on a
+  background thread, so summarizing never delays a reply
+- order details (items with quantities, delivery/pickup, payment method) are
+  extracted from what the customer says and kept as structured slots, so they
+  survive summarization exactly. An item is only added when the same sentence
+  asks for it ("I'll take two Zinger Burgers"), and dropped on "remove ...";
+  a question such as "Is the Chicken Tikka spicy?" leaves the order alone
+"""
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from langchain.schema import BaseMemory
+from langchain.pydantic_v1 import PrivateAttr
+
+from shared import estimate_tokens
+
+MENU_LINE = re.compile(r"^\s*-\s*(.+?)\s*[–-]\s*\$", re.M)
+PAREN = re.compile(r"\s*\(.*?\)")
+NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+                "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+QTY = r"(?:(\d+|" + "|".join(NUMBER_WORDS) + r")\s+)?(?:(?:small|medium|large)\s+)?"
+# The nearest of these before an item, within its sentence, decides what happens to it
+ITEM_INTENT = re.compile(
+    r"(?P<remove>\b(?:remove|drop|cancel|delete|take off|no more|don'?t want|do not want)\b)"
+    r"|(?P<order>\b(?:want|wanna|take|order|add|get|make (?:it|that)|i'?ll have|i will have|we'?ll have|"
+    r"i'?d like|i would like|we'?d like)\b)"
+    r"|(?P<stop>[.;!?]|\bbut\b)")
+FULFILMENT = {"delivery": re.compile(r"\bdeliver(y|ed)?\b"),
+              "pickup": re.compile(r"\b(pick ?up|collect|collection|takeaway|take away)\b")}
+PAYMENT = {"cash": re.compile(r"\bcash\b"), "card": re.compile(r"\b(card|credit|debit)\b")}
+
+SUMMARY_PROMPT = """Progressively summarize this phone call between a customer and the Joni Eats assistant.
+Keep names, addresses, complaints, preferences and anything the assistant promised. Be brief (3-4 sentences).
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{lines}
+
+New summary:"""
+
+
+def menu_items_from_kb(kb_text: str):
+    """Item names from '- Name – $price' lines ('Deal 1: ...' becomes 'Deal 1', 'Coke (Can)' becomes 'Coke')."""
+    names = {PAREN.sub("", m.group(1).split(":")[0]).strip() for m in MENU_LINE.finditer(kb_text)}
+    return sorted(names, key=len, reverse=True)
+
+
+class _CallState:
+    # Shared by reference: pydantic copies the memory model when a chain is built,
+    # so all mutable state lives here rather than in fields/attrs of the model
+    def __init__(self, menu_items):
+        self.turns = deque()
+        self.pending = []
+        self.summary = ""
+        self.slots = {"items": {}}
+        self.summarizing = False
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-summary")
+        self.item_patterns = [
+            (name, re.compile(r"\b" + QTY + re.escape(name.lower()) + r"s?\b"))
+            for name in menu_items
+        ]
+
+
+class CallMemory(BaseMemory):
+    llm: Any = None
+    menu_items: List[str] = []
+    max_turns: int = 6
+    token_budget: int = 600
+    human_prefix: str = "Human"
+    ai_prefix: str = "AI"
+    memory_key: str = "history"
+
+    _state: Any = PrivateAttr(default=None)
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        self._state = _CallState(self.menu_items)
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    @property
+    def summary(self) -> str:
+        return self._state.summary
+
+    @property
+    def slots(self) -> Dict[str, Any]:
+        st = self._state
+        with st.lock:
+            return {k: (dict(v) if isinstance(v, dict) else v) for k, v in st.slots.items()}
+
+    def _line(self, human: str, ai: str) -> str:
+        return f"{self.human_prefix}: {human}\n{self.ai_prefix}: {ai}"
+
+    def _render(self) -> str:
+        st = self._state
+        parts = []
+        if st.summary:
+            parts.append(f"Summary of earlier conversation: {st.summary}")
+        if st.slots["items"]:
+            parts.append("Order so far: " + "; ".join(f"{q}x {name}" for name, q in st.slots["items"].items()))
+        if st.slots.get("fulfilment"):
+            parts.append(f"Fulfilment: {st.slots['fulfilment']}")
+        if st.slots.get("payment"):
+            parts.append(f"Payment: {st.slots['payment']}")
+        parts.extend(self._line(h, a) for h, a in st.turns)
+        return "\n".join(parts)
+
+    @property
+    def buffer(self) -> str:
+        with self._state.lock:
+            return self._render()
+
+    def load_memory_variables(self, inputs: Dict[str, Any]) -> Dict[str, str]:
+        return {self.memory_key: self.buffer}
+
+    def _update_slots(self, text: str):
+        st = self._state
+        said = text.lower()
+        intents = [(m.start(), m.lastgroup) for m in ITEM_INTENT.finditer(said)]
+        masked = said
+        for name, pattern in st.item_patterns:
+            for m in pattern.finditer(masked):
+                intent = None
+                for start, kind in intents:
+                    if start >= m.start():
+                        break
+                    intent = None if kind == "stop" else kind
+                if intent == "order":
+                    qty = m.group(1)
+                    st.slots["items"][name] = int(qty) if qty and qty.isdigit() else NUMBER_WORDS.get(qty, 1)
+                elif intent == "remove":
+                    st.slots["items"].pop(name, None)
+            # Blank matches so "Chicken Burger" is not found again inside "Grilled Chicken Burger"
+            masked = pattern.sub(lambda m: " " * len(m.group(0)), masked)
+        for slot, options in (("fulfilment", FULFILMENT), ("payment", PAYMENT)):
+            for value, words in options.items():
+                if words.search(said):
+                    st.slots[slot] = value
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        st = self._state
+        human = inputs.get("input") or next(iter(inputs.values()), "")
+        ai = next(iter(outputs.values()), "")
+        with st.lock:
+            self._update_slots(human)
+            st.turns.append((human, ai))
+            # Evict oldest turns past the turn cap or token budget (always keep the newest)
+            while len(st.turns) > 1 and (
+                len(st.turns) > self.max_turns
+                or sum(estimate_tokens(self._line(h, a)) for h, a in st.turns) > self.token_budget
+            ):
+                st.pending.append(st.turns.popleft())
+            schedule = bool(st.pending) and not st.summarizing and self.llm is not None
+            if schedule:
+                st.summarizing = True
+        if schedule:
+            st.executor.submit(self._fold_pending)
+
+    def _fold_pending(self):
+        """Fold evicted turns into the running summary (runs on the background thread)."""
+        st = self._state
+        while True:
+            with st.lock:
+                batch = list(st.pending)
+                summary = st.summary
+                if not batch:
+                    st.summarizing = False
+                    return
+            lines = "\n".join(self._line(h, a) for h, a in batch)
+            try:
+                result = self.llm.invoke(SUMMARY_PROMPT.format(summary=summary or "(none)", lines=lines))
+                new_summary = getattr(result, "content", result).strip()
+            except Exception as e:
+                print(f"⚠️ Could not summarize earlier conversation: {e}")
+                with st.lock:
+                    st.summarizing = False
+                return
+            with st.lock:
+                st.summary = new_summary
+                del st.pending[:len(batch)]
+
+    def clear(self) -> None:
+        st = self._state
+        with st.lock:
+            st.turns.clear()
+            st.pending.clear()
+            st.summary = ""
+            st.slots = {"items": {}}
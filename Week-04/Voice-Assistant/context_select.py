@@ -0,0 +1,80 @@
+"""Per-turn prompt context selection for the Joni Eats voice assistant.
+
+Instead of inlining the whole knowledge base and every example dialogue into
+each prompt, the KB is split into paragraph chunks and the chat patterns into
+single Customer/Assistant exchanges, both indexed with TF-IDF (the Week-03
+retriever's settings and chunking). Each turn only the best-matching chunks and
+examples are packed into the prompt, within a token budget.
+"""
+import re
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from shared import TFIDF_PARAMS, estimate_tokens, split_chunks, top_k_indices
+
+TOPIC_HEADER = re.compile(r"^#\s*=+\s*(.+?)\s*=+\s*$")
+
+
+def split_examples(patterns: str):
+    """Split chat patterns into exchanges; returns (example texts, topic per example)."""
+    examples, topics = [], []
+    topic = ""
+    for part in re.split(r"\n\s*\n+", patterns):
+        lines = []
+        for line in part.strip().splitlines():
+            m = TOPIC_HEADER.match(line.strip())
+            if m:
+                topic = m.group(1).strip().lower()
+            elif line.strip():
+                lines.append(line.strip())
+        if lines:
+            examples.append("\n".join(lines))
+            topics.append(topic)
+    return examples, topics
+
+
+class _Index:
+    def __init__(self, docs, index_texts=None):
+        self.docs = docs
+        self.vec = TfidfVectorizer(**TFIDF_PARAMS)
+        self.mat = self.vec.fit_transform(index_texts or docs) if docs else None
+
+    def rank(self, query: str, k: int):
+        """Indices of the k best docs, best first; zero-score docs fill in."""
+        if self.mat is None:
+            return []
+        sims = (self.mat @ self.vec.transform([query]).T).toarray().ravel()
+        return [int(i) for i in top_k_indices(sims, k)]
+
+
+class ContextSelector:
+    def __init__(self, restaurant_kb: str, chat_patterns: str,
+                 kb_k: int = 4, example_k: int = 3, token_budget: int = 1500):
+        self.kb_k = kb_k
+        self.example_k = example_k
+        self.token_budget = token_budget
+        self.kb = _Index(split_chunks(restaurant_kb))
+        examples, topics = split_examples(chat_patterns)
+        # Topic headers ("MENU INQUIRIES") are indexed with the example but not sent
+        self.examples = _Index(examples, [f"{t}\n{e}" for t, e in zip(topics, examples)])
+
+    def _pack(self, index: _Index, query: str, k: int, budget: int):
+        picked, used = [], 0
+        for i in index.rank(query, k):
+            cost = estimate_tokens(index.docs[i]) + 1
+            if used + cost > budget:
+                continue
+            picked.append(index.docs[i])
+            used += cost
+        return "\n\n".join(picked), used
+
+    def select(self, query: str, fixed_tokens: int = 0):
+        """Pick KB chunks then examples for ``query``; returns (kb_text, examples_text).
+
+        ``fixed_tokens`` is what the rest of the prompt (instructions, history,
+        the query) already costs; KB chunks get first claim on what is left.
+        """
+        remaining = max(self.token_budget - fixed_tokens, 0)
+        kb_text, used = self._pack(self.kb, query, self.kb_k, remaining)
+        examples_text, _used = self._pack(self.examples, query, self.example_k, remaining - used)
+        return kb_text, examples_text
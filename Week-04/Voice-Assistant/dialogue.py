@@ -0,0 +1,162 @@
+"""Text side of the Joni Eats voice assistant: prompt, context selection, memory and LLM.
+
+Kept free of audio dependencies so the same turn logic can be driven from the
+voice loop in ``agent.py`` or from text-only tools such as the benchmarks.
+"""
+import contextlib
+import time
+
+from langchain.prompts import PromptTemplate
+from langchain_groq import ChatGroq
+
+from call_memory import CallMemory, menu_items_from_kb
+from context_select import ContextSelector
+from shared import Dispatcher, FaqRouter, estimate_tokens, tracer
+
+MODEL = "llama-3.1-8b-instant"
+FALLBACK_MODEL = "llama-3.3-70b-versatile"   # hedged duplicate / failover for slow or failing turns
+
+# Only the KB chunks and example dialogues relevant to each turn go into the prompt,
+# so prompt size stays flat as the menu and example library grow
+PROMPT_TOKEN_BUDGET = 1500
+
+
+# Load text files with error handling
+def load_text_file(filepath):
+    try:
+        with open(filepath, "r", encoding="utf-8") as file:
+            return file.read()
+    except FileNotFoundError:
+        print(f"⚠️ Warning: {filepath} not found. Using default content.")
+        return f"Default content for {filepath}"
+    except Exception as e:
+        print(f"❌ Error loading {filepath}: {e}")
+        return ""
+
+
+def build_prompt(context_flow):
+    # Enhanced Prompt Template
+    custom_template = f"""
+You are an intelligent, warm, and professional AI voice assistant for Joni Eats restaurant. Your goal is to provide exceptional customer service through natural conversation.
+
+### CORE PERSONALITY TRAITS
+- Friendly and approachable, but professional
+- Patient and understanding with all customers
+- Proactive in offering help and suggestions
+- Knowledgeable about all menu items and deals
+- Empathetic when handling complaints or issues
+
+### CONVERSATION GUIDELINES
+{context_flow}
+
+### ADVANCED INSTRUCTIONS
+- Listen carefully to customer needs and respond appropriately to their tone
+- If a customer seems indecisive, offer 2-3 specific recommendations based on popularity or value
+- For complaints, always acknowledge the issue, apologize sincerely, and offer concrete solutions
+- When taking orders, confirm details clearly and suggest complementary items naturally
+- Keep responses concise but complete - avoid overwhelming customers with too much information at once
+- Use natural speech patterns suitable for voice conversation (avoid bullet points or complex formatting)
+- Remember context from earlier in the conversation to provide personalized service
+
+### RESTAURANT KNOWLEDGE BASE (entries relevant to this turn)
+{{restaurant_kb}}
+
+### CONVERSATION EXAMPLES FOR REFERENCE
+{{chat_patterns}}
+
+IMPORTANT: Use the examples above as a guide for tone and style, but respond naturally to each unique customer interaction. Don't repeat exact phrases unless they fit perfectly.
+
+### CURRENT CONVERSATION
+{{history}}
+
+Customer: {{input}}
+Assistant:"""
+    return PromptTemplate(
+        input_variables=["history", "input", "restaurant_kb", "chat_patterns"],
+        template=custom_template,
+    )
+
+
+def make_llm(api_key, streaming=False, base_url=None, model=MODEL):
+    return ChatGroq(
+        groq_api_key=api_key,
+        groq_api_base=base_url,
+        model_name=model,
+        temperature=0.5,
+        max_tokens=200,  # Limit response length for voice conversations
+        streaming=streaming,
+        max_retries=0,   # Retries and failover are the Dialogue's Dispatcher's job
+    )
+
+
+class Dialogue:
+    """One call's conversation state; ``predict`` runs a single turn."""
+
+    def __init__(self, llm, restaurant_kb, chat_patterns, context_flow, token_budget=PROMPT_TOKEN_BUDGET,
+                 faq_router=True, fallbacks=(), hedge=True):
+        self.llm = llm
+        # One chat model per name: a turn slower than the primary's recent p95, or one that
+        # keeps failing, is also sent to the fallbacks (see Week-03/llm_dispatch.py)
+        self.llms = {model.model_name: model for model in (llm, *fallbacks)}
+        self.dispatch = Dispatcher(fallbacks=[model.model_name for model in fallbacks], hedge=hedge)
+        # Hours, location, delivery and payment questions are answered from KB facts, skipping the LLM
+        self.router = FaqRouter(restaurant_kb) if faq_router else None
+        self.prompt = build_prompt(context_flow)
+        self.selector = ContextSelector(restaurant_kb, chat_patterns, kb_k=4, example_k=3, token_budget=token_budget)
+        self.static_tokens = estimate_tokens(self.prompt.format(history="", input="", restaurant_kb="", chat_patterns=""))
+        # Memory: last few turns verbatim, older turns summarized in the background,
+        # order items/quantities kept as structured slots
+        self.memory = CallMemory(
+            llm=llm,
+            menu_items=menu_items_from_kb(restaurant_kb),
+            max_turns=6,
+            token_budget=600,
+        )
+        self.last_timing = {}
+
+    # Prompt, rebuilt per turn around the context selected for that turn
+    def prompt_for(self, user_input):
+        history = self.memory.buffer
+        fixed = self.static_tokens + estimate_tokens(history) + estimate_tokens(user_input)
+        kb, examples = self.selector.select(user_input, fixed_tokens=fixed)
+        return self.prompt.format(history=history, input=user_input,
+                                  restaurant_kb=kb or "(no matching entries)", chat_patterns=examples)
+
+    def generate(self, prompt, callbacks=None):
+        """(reply, model that answered); with ``callbacks``, tokens go to their ``on_llm_new_token``."""
+        primary = self.llm.model_name
+        if not callbacks:
+            return self.dispatch.complete(lambda m: self.llms[m].invoke(prompt).content, primary)
+        deltas, model = self.dispatch.stream(
+            lambda m: (chunk.content for chunk in self.llms[m].stream(prompt) if chunk.content), primary)
+        parts = []
+        # Closing ends the upstream stream too, e.g. when a callback raises Interrupted
+        with contextlib.closing(deltas):
+            for token in deltas:
+                for callback in callbacks:
+                    callback.on_llm_new_token(token)
+                parts.append(token)
+        return "".join(parts), model
+
+    def predict(self, user_input, callbacks=None):
+        """Reply to one customer utterance; stage timings (seconds) land in ``last_timing``."""
+        start = time.perf_counter()
+        with tracer.span("faq"):
+            # Mid-order, short replies answer the agent's last question, so they stay with the LLM
+            ordering = bool(self.memory.slots["items"])
+            routed = self.router.route(user_input) if self.router is not None and not ordering else None
+        if routed is not None:
+            self.memory.save_context({"input": user_input}, {"response": routed.answer})
+            done = time.perf_counter()
+            self.last_timing = {"faq": done - start, "total": done - start, "intent": routed.intent}
+            return routed.answer
+        with tracer.span("context"):
+            prompt = self.prompt_for(user_input)
+        built = time.perf_counter()
+        with tracer.span("llm", model=self.llm.model_name) as span:
+            response, model = self.generate(prompt, callbacks)
+            span.set(answered_by=model)
+        self.memory.save_context({"input": user_input}, {"response": response})
+        done = time.perf_counter()
+        self.last_timing = {"context": built - start, "llm": done - built, "total": done - start, "model": model}
+        return response
@@ -0,0 +1,87 @@
+"""Speech-to-text backends for the Joni Eats voice agent.
+
+Every backend turns an ``sr.AudioData`` into text and fails the way
+``speech_recognition`` does (``sr.UnknownValueError`` for unintelligible audio,
+``sr.RequestError`` for service problems), so ``listen()`` and the batch replay
+(``bench/audio_replay.py``) treat them interchangeably:
+
+- ``google``: Google Web Speech API (network; the default)
+- ``sphinx``: CMU PocketSphinx, fully offline (``pip install pocketsphinx``)
+- ``transcript``: stand-in for load tests; returns the ``.txt`` transcript
+  stored next to a recording, after an optional simulated latency
+
+Choose one with the ``STT_BACKEND`` environment variable or ``make_backend(name)``.
+"""
+import os
+import time
+from abc import ABC, abstractmethod
+
+import speech_recognition as sr
+
+
+class RecognizerBackend(ABC):
+    name = "base"
+
+    def __init__(self, recognizer=None, language="en-US"):
+        self.recognizer = recognizer or sr.Recognizer()
+        self.language = language
+
+    @abstractmethod
+    def transcribe(self, audio, source=None) -> str:
+        """Text for ``audio``; ``source`` is the file it came from, when there is one."""
+
+
+class GoogleBackend(RecognizerBackend):
+    name = "google"
+
+    def transcribe(self, audio, source=None):
+        return self.recognizer.recognize_google(audio, language=self.language)
+
+
+class SphinxBackend(RecognizerBackend):
+    name = "sphinx"
+
+    def transcribe(self, audio, source=None):
+        return self.recognizer.recognize_sphinx(audio, language=self.language)
+
+
+class TranscriptBackend(RecognizerBackend):
+    name = "transcript"
+
+    def __init__(self, recognizer=None, language="en-US", latency_ms=0.0):
+        super().__init__(recognizer, language)
+        self.latency_ms = latency_ms
+
+    def transcribe(self, audio, source=None):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if source is None:
+            raise sr.UnknownValueError()
+        sidecar = os.path.splitext(str(source))[0] + ".txt"
+        try:
+            with open(sidecar, "r", encoding="utf-8") as f:
+                text = f.read().strip()
+        except FileNotFoundError:
+            raise sr.UnknownValueError() from None
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+
+BACKENDS = {cls.name: cls for cls in (GoogleBackend, SphinxBackend, TranscriptBackend)}
+
+
+def make_backend(name=None, recognizer=None, **options) -> RecognizerBackend:
+    name = (name or os.getenv("STT_BACKEND") or "google").lower()
+    try:
+        cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown STT backend {name!r}; choose from {', '.join(BACKENDS)}") from None
+    return cls(recognizer, **options)
+
+
+def load_audio(path, recognizer=None):
+    """Whole WAV/AIFF/FLAC file as ``sr.AudioData``."""
+    recognizer = recognizer or sr.Recognizer()
+    with sr.AudioFile(str(path)) as source:
+        return recognizer.record(source)
@@ -0,0 +1,22 @@
+"""Modules the voice agent shares with the Week-03 chatbot instead of keeping copies.
+
+Importing this puts ``Week-03`` on ``sys.path`` (after this directory, so a
+voice-agent module of the same name would still win) and re-exports what the
+voice agent uses from there.
+"""
+import sys
+from pathlib import Path
+
+WEEK03 = Path(__file__).resolve().parents[2] / "Week-03"
+if str(WEEK03) not in sys.path:
+    sys.path.append(str(WEEK03))
+
+from chat_core import estimate_tokens  # noqa: E402
+from corpus import split_chunks  # noqa: E402
+from faq_router import FaqRouter  # noqa: E402
+from llm_dispatch import Dispatcher  # noqa: E402
+from retrieval import TFIDF_PARAMS, top_k_indices  # noqa: E402
+from tracing import tracer  # noqa: E402
+
+__all__ = ["Dispatcher", "FaqRouter", "TFIDF_PARAMS", "estimate_tokens", "split_chunks",
+           "top_k_indices", "tracer"]
@@ -0,0 +1,264 @@
+"""Startup for the Joni Eats voice agent.
+
+Subsystems come up concurrently instead of one after another:
+
+- the TTS engine initializes lazily on the thread that speaks (the greeting
+  triggers it), so it is never shared across threads
+- the LLM client + ``Dialogue`` and the recognizer + microphone load on a small
+  thread pool while the greeting is being synthesized
+- a one-token LLM request runs during the greeting, so the first real turn
+  reuses an open TLS connection
+
+What is slow to discover (the chosen voice id and microphone device) is cached
+in ``.cache/devices.json`` and reused by later calls; delete the file to pick
+again. The microphone is also rescanned when ``MIC_DEVICE`` names a different
+device than the cached choice was made for. The microphone stream is
+opened once and kept open for the whole call.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pyttsx3
+import speech_recognition as sr
+
+from dialogue import FALLBACK_MODEL, Dialogue, load_text_file, make_llm
+from recognizers import make_backend
+from vad import StreamingListener
+
+TTS_RATE = 170    # Moderate speaking speed
+TTS_VOLUME = 0.9  # 0.0 to 1.0
+PREFERRED_VOICES = ("female", "zira", "susan")
+SAMPLE_RATE = 16000
+CHUNK_SIZE = 1024
+
+
+class DeviceCache:
+    """Small JSON file remembering resolved audio settings between runs."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._data = json.load(f)
+        except (OSError, ValueError):
+            self._data = {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._data.get(key, default)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def update(self, **values):
+        with self._lock:
+            self._data.update(values)
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp = self.path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self._data, f, indent=2)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                print(f"⚠️ Could not save device cache: {e}")
+
+    def forget(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+        self.update()
+
+
+def init_tts(cache: DeviceCache, rate=TTS_RATE, volume=TTS_VOLUME):
+    """pyttsx3 engine with the cached voice, scanning voices only on a cache miss."""
+    engine = pyttsx3.init()
+    engine.setProperty('rate', rate)
+    engine.setProperty('volume', volume)
+
+    voice_id = cache.get("voice_id")
+    if voice_id:
+        try:
+            engine.setProperty('voice', voice_id)
+            print(f"✅ Voice set to: {cache.get('voice_name', voice_id)} (cached)")
+            return engine
+        except Exception:
+            cache.forget("voice_id", "voice_name")
+
+    # Set female voice with fallback
+    voices = engine.getProperty('voices')
+    chosen = next((v for v in voices if v.name and any(p in v.name.lower() for p in PREFERRED_VOICES)), None)
+    fallback = chosen is None
+    if fallback and voices:
+        chosen = voices[0]  # Use first available voice as fallback
+    if chosen is not None:
+        engine.setProperty('voice', chosen.id)
+        cache.update(voice_id=chosen.id, voice_name=chosen.name)
+        print(f"✅ Voice set to: {chosen.name}{' (fallback)' if fallback else ''}")
+    return engine
+
+
+def resolve_microphone(cache: DeviceCache, rescan=False):
+    """Input device index (None = system default).
+
+    The device list is only scanned on a cache miss, or when ``MIC_DEVICE``
+    asks for something other than what the cached choice was made for.
+    """
+    wanted = (os.getenv("MIC_DEVICE") or "").lower()
+    if not rescan and "mic_name" in cache and cache.get("mic_wanted", "") == wanted:
+        return cache.get("mic_index")
+    names = sr.Microphone.list_microphone_names()
+    if not names:
+        raise OSError("No microphone detected. Please connect a microphone.")
+    index = next((i for i, name in enumerate(names) if wanted and wanted in name.lower()), None)
+    cache.update(mic_index=index, mic_name=names[index] if index is not None else "default",
+                 mic_wanted=wanted)
+    return index
+
+
+class MicStream:
+    """One microphone stream kept open across turns instead of reopened per ``listen()``."""
+
+    def __init__(self, cache: DeviceCache, sample_rate=SAMPLE_RATE, chunk_size=CHUNK_SIZE):
+        self.cache = cache
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self._mic = None
+
+    def open(self):
+        if self._mic is not None:
+            return self._mic
+        index = resolve_microphone(self.cache)
+        try:
+            mic = sr.Microphone(device_index=index, sample_rate=self.sample_rate, chunk_size=self.chunk_size)
+            mic.__enter__()
+        except (OSError, AssertionError):
+            # Cached device vanished (unplugged, renumbered): scan once more
+            index = resolve_microphone(self.cache, rescan=True)
+            mic = sr.Microphone(device_index=index, sample_rate=self.sample_rate, chunk_size=self.chunk_size)
+            mic.__enter__()
+        if mic.stream is None:
+            raise OSError("Could not open the microphone stream.")
+        self._mic = mic
+        return mic
+
+    def drain(self):
+        """Drop audio buffered while the agent was speaking, so it is not heard as the caller."""
+        stream = getattr(self._mic, "stream", None)
+        raw = getattr(stream, "pyaudio_stream", None)
+        if raw is None:
+            return
+        try:
+            available = raw.get_read_available()
+            if available:
+                raw.read(available, exception_on_overflow=False)
+        except (OSError, AttributeError):
+            pass
+
+    def reopen(self):
+        self.close()
+        time.sleep(0.5)  # Brief pause before grabbing the device again
+        return self.open()
+
+    def close(self):
+        if self._mic is not None:
+            try:
+                self._mic.__exit__(None, None, None)
+            except Exception:
+                pass
+            self._mic = None
+
+
+def make_recognizer():
+    recognizer = sr.Recognizer()
+    # Configure recognizer settings
+    recognizer.energy_threshold = 300
+    recognizer.dynamic_energy_threshold = True
+    recognizer.pause_threshold = 0.8
+    return recognizer
+
+
+def warm_up(llm):
+    """Open the provider connection with a one-token request; failures only cost the warm-up."""
+    try:
+        llm.invoke("Hi", max_tokens=1)
+    except Exception as e:
+        print(f"⚠️ LLM warm-up failed (first turn will connect instead): {e}")
+
+
+class AgentStartup:
+    """Starts the text and speech-input subsystems in the background; accessors block until ready."""
+
+    def __init__(self, script_dir, api_key, streaming=False, cache=None):
+        self.script_dir = script_dir
+        self.api_key = api_key
+        self.streaming = streaming
+        self.cache = cache or DeviceCache(os.path.join(script_dir, ".cache", "devices.json"))
+        self.started_at = time.perf_counter()
+        self._pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="startup")
+        self._dialogue = self._pool.submit(self._load_dialogue)
+        self._listener = self._pool.submit(self._load_listener)
+        self._warm = None
+        self._streaming = None
+        self._engine = None
+        self.tts_ready_at = None
+        self._engine_lock = threading.Lock()
+
+    def _load_dialogue(self):
+        chat_patterns = load_text_file(os.path.join(self.script_dir, "chat_patterns.txt"))
+        context_flow = load_text_file(os.path.join(self.script_dir, "context_flow.txt"))
+        restaurant_kb = load_text_file(os.path.join(self.script_dir, "restaurant_kb.txt"))
+        print("✅ All configuration files loaded successfully.")
+        llm = make_llm(self.api_key, streaming=self.streaming)
+        fallback = make_llm(self.api_key, streaming=self.streaming, model=FALLBACK_MODEL)
+        print("✅ Groq LLM initialized successfully.")
+        # Prompt, per-turn context selection and bounded memory for this call;
+        # slow or failing turns are hedged / failed over to the fallback model
+        return Dialogue(llm, restaurant_kb, chat_patterns, context_flow, fallbacks=[fallback])
+
+    def _load_listener(self):
+        recognizer = make_recognizer()
+        mic = MicStream(self.cache)
+        mic.open()
+        stt = make_backend(recognizer=recognizer)
+        print(f"✅ Speech recognizer initialized successfully ({stt.name}).")
+        return recognizer, mic, stt
+
+    def warm_up(self):
+        """Pre-warm the LLM connection in the background (call before the greeting)."""
+        if self._warm is None:
+            self._warm = self._pool.submit(lambda: warm_up(self.dialogue().llm))
+        return self._warm
+
+    def dialogue(self) -> Dialogue:
+        return self._dialogue.result()
+
+    def listener(self):
+        """(recognizer, MicStream, STT backend) once the microphone is open."""
+        return self._listener.result()
+
+    def streaming_listener(self) -> StreamingListener:
+        """VAD listener on the open microphone; keeps its noise floor for the whole call."""
+        if self._streaming is None:
+            _recognizer, mic, stt = self.listener()
+            self._streaming = StreamingListener(mic, stt)
+        return self._streaming
+
+    def engine(self):
+        """TTS engine, created on first use by whichever thread speaks."""
+        with self._engine_lock:
+            if self._engine is None:
+                self._engine = init_tts(self.cache)
+                self.tts_ready_at = time.perf_counter()
+            return self._engine
+
+    def close(self):
+        if self._streaming is not None:
+            self._streaming.close()
+        if self._listener.done() and self._listener.exception() is None:
+            self._listener.result()[1].close()
+        self._pool.shutdown(wait=False)
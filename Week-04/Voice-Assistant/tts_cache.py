@@ -0,0 +1,189 @@
+"""On-disk cache of synthesized speech for the Joni Eats voice agent.
+
+Audio is rendered once with pyttsx3 ``save_to_file`` and played back from the
+WAV file afterwards, skipping synthesis. Entries are keyed by the text plus
+voice id, rate and volume, so changing the voice never plays stale audio.
+
+- ``pinned`` phrases (greeting, goodbye, fallbacks) are rendered on first use or
+  ahead of time with ``prerender`` and are never evicted
+- any other text is cached once it has been spoken ``promote_after`` times,
+  e.g. common answers such as opening hours
+- total size is capped at ``max_bytes``; least recently played files go first.
+  Recency is the file mtime, so the order survives restarts
+
+Only use it from the thread that drives the TTS engine.
+"""
+import hashlib
+import os
+import re
+import wave
+from collections import Counter, OrderedDict
+
+from shared import tracer
+
+MAX_BYTES = 64 * 1024 * 1024
+PROMOTE_AFTER = 2
+PLAY_CHUNK = 1024
+MAX_TRACKED = 10000  # distinct uncached texts counted towards promote_after
+WHITESPACE = re.compile(r"\s+")
+
+_pyaudio = None
+
+
+def _audio():
+    global _pyaudio
+    if _pyaudio is None:
+        import pyaudio  # installed for the microphone already
+        _pyaudio = pyaudio.PyAudio()
+    return _pyaudio
+
+
+def play_wav(path, interrupted=None):
+    """Play a WAV file; stops between chunks once ``interrupted`` (an Event) is set."""
+    pa = _audio()
+    with wave.open(path, "rb") as w:
+        stream = pa.open(format=pa.get_format_from_width(w.getsampwidth()), channels=w.getnchannels(),
+                         rate=w.getframerate(), output=True)
+        try:
+            data = w.readframes(PLAY_CHUNK)
+            while data and not (interrupted is not None and interrupted.is_set()):
+                stream.write(data)
+                data = w.readframes(PLAY_CHUNK)
+        finally:
+            stream.stop_stream()
+            stream.close()
+
+
+def normalize_text(text: str) -> str:
+    return WHITESPACE.sub(" ", text).strip()
+
+
+class TTSCache:
+    def __init__(self, cache_dir, max_bytes=MAX_BYTES, promote_after=PROMOTE_AFTER, pinned=()):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.promote_after = promote_after
+        self.pinned_texts = {normalize_text(t) for t in pinned}
+        self.pinned = set()
+        self.hits = 0
+        self.misses = 0
+        self._seen = Counter()
+        self._voices = {}
+        self._entries = OrderedDict()  # key -> size, least recently played first
+        self._size = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        files = []
+        for name in os.listdir(cache_dir):
+            if name.endswith(".tmp.wav"):
+                os.remove(os.path.join(cache_dir, name))  # left over from an interrupted render
+            elif name.endswith(".wav"):
+                st = os.stat(os.path.join(cache_dir, name))
+                files.append((st.st_mtime, name[:-4], st.st_size))
+        for _mtime, key, size in sorted(files):
+            self._entries[key] = size
+            self._size += size
+
+    def _voice(self, engine):
+        voice = self._voices.get(id(engine))
+        if voice is None:
+            voice = self._voices[id(engine)] = (
+                str(engine.getProperty('voice')), engine.getProperty('rate'), round(engine.getProperty('volume'), 3))
+        return voice
+
+    def key(self, engine, text: str) -> str:
+        voice_id, rate, volume = self._voice(engine)
+        raw = f"{voice_id}\x00{rate}\x00{volume}\x00{text}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".wav")
+
+    def get(self, key: str):
+        if key not in self._entries:
+            return None
+        path = self.path(key)
+        self._entries.move_to_end(key)
+        try:
+            os.utime(path)
+        except OSError:
+            self._drop(key)
+            return None
+        return path
+
+    def render(self, engine, text: str, key: str, interrupted=None):
+        """Synthesize ``text`` to the cache; returns the file path, or None if nothing usable was written."""
+        tmp = os.path.join(self.cache_dir, key + ".tmp.wav")
+        engine.save_to_file(text, tmp)
+        engine.runAndWait()
+        try:
+            size = os.path.getsize(tmp)
+        except OSError:
+            return None
+        # A barge-in may have stopped the engine part way through the file
+        if not size or (interrupted is not None and interrupted.is_set()):
+            os.remove(tmp)
+            return None
+        path = self.path(key)
+        os.replace(tmp, path)
+        if key in self._entries:
+            self._size -= self._entries.pop(key)
+        self._entries[key] = size
+        self._size += size
+        if text in self.pinned_texts:
+            self.pinned.add(key)
+        self._evict()
+        return path
+
+    def _drop(self, key: str):
+        self._size -= self._entries.pop(key, 0)
+        self.pinned.discard(key)
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        for key in list(self._entries):
+            if self._size <= self.max_bytes:
+                return
+            if key not in self.pinned:
+                self._drop(key)
+
+    def prerender(self, engine, texts=None):
+        """Render any pinned (or given) phrases that are not cached yet."""
+        for text in map(normalize_text, texts or sorted(self.pinned_texts)):
+            key = self.key(engine, text)
+            if self.get(key) is None:
+                self.render(engine, text, key)
+            else:
+                self.pinned.add(key)
+
+    def speak(self, engine, text: str, interrupted=None):
+        """Play ``text`` from the cache when possible, otherwise synthesize it live."""
+        text = normalize_text(text)
+        key = self.key(engine, text)
+        path = self.get(key)
+        if path is None:
+            self.misses += 1
+            if len(self._seen) >= MAX_TRACKED:
+                self._seen.clear()
+            self._seen[key] += 1
+            if text in self.pinned_texts or self._seen[key] >= self.promote_after:
+                with tracer.span("tts.render"):
+                    path = self.render(engine, text, key, interrupted)
+        else:
+            self.hits += 1
+            if text in self.pinned_texts:
+                self.pinned.add(key)
+        if path is not None:
+            try:
+                with tracer.span("tts.play"):
+                    play_wav(path, interrupted)
+                return
+            except (OSError, EOFError, wave.Error) as e:
+                # Unreadable file (or a driver that does not write WAV): fall back to live synthesis
+                print(f"⚠️ Cached audio unusable, synthesizing instead: {e}")
+                self._drop(key)
+        with tracer.span("tts.say"):
+            engine.say(text)
+            engine.runAndWait()
@@ -0,0 +1,178 @@
+"""Sentence-pipelined text-to-speech for the Joni Eats voice assistant.
+
+LLM tokens are fed in as they stream, cut into speakable sentences (or clauses
+when a sentence runs long) and queued for a dedicated TTS worker thread. The
+first sentence is spoken while the rest of the reply is still being generated.
+All synthesis goes through the one worker thread, so the TTS engine is never
+driven from two threads at once.
+
+``interrupt()`` (caller barge-in) drops every sentence not yet spoken and sets
+``interrupted``; the speak function is expected to cut the current sentence
+short when it sees the flag. A ``SentenceStreamHandler`` given a ``cancel``
+event aborts the LLM stream by raising ``Interrupted``.
+"""
+import queue
+import re
+import threading
+import time
+
+from langchain.callbacks.base import BaseCallbackHandler
+
+# Sentence end: . ! ? followed by whitespace (so prices like $6.5 are not cut)
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+CLAUSE_END = re.compile(r"(?<=[,;:])\s+")
+WHITESPACE = re.compile(r"\s+")
+MIN_CHARS = 12     # don't speak tiny fragments like "Sure."
+MAX_CHARS = 140    # past this, cut at a clause boundary instead of waiting for "."
+
+
+class Interrupted(Exception):
+    """The caller started talking; the reply being generated is no longer wanted."""
+
+
+def split_speakable(buf: str, min_chars: int = MIN_CHARS, max_chars: int = MAX_CHARS):
+    """Cut complete sentences/clauses off the front of ``buf``; returns (chunks, rest)."""
+    chunks = []
+    while buf:
+        cut = None
+        for m in SENTENCE_END.finditer(buf):
+            if m.start() >= min_chars:
+                cut = m
+                break
+        if cut is None and len(buf) > max_chars:
+            clauses = [m for m in CLAUSE_END.finditer(buf, 0, max_chars) if m.start() >= min_chars]
+            if clauses:
+                cut = clauses[-1]
+            else:
+                space = buf.rfind(" ", min_chars, max_chars)
+                if space > 0:
+                    cut = WHITESPACE.match(buf, space)
+        if cut is None:
+            break
+        text = buf[:cut.start()].strip()
+        if text:
+            chunks.append(text)
+        buf = buf[cut.end():]
+    return chunks, buf
+
+
+class SpeechPipeline:
+    def __init__(self, speak_fn, clean_fn=None):
+        self.speak_fn = speak_fn
+        self.clean_fn = clean_fn or (lambda s: s)
+        self._queue = queue.Queue()
+        self._buf = ""
+        self.queued = 0
+        self.started_at = None
+        self.first_audio_at = None
+        self.interrupted = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="tts-worker", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            text = self._queue.get()
+            try:
+                if text is None:
+                    return
+                if callable(text):
+                    text()
+                    continue
+                if self.interrupted.is_set():
+                    continue
+                if self.first_audio_at is None:
+                    self.first_audio_at = time.perf_counter()
+                self.speak_fn(text)
+            except Exception as e:
+                print(f"❌ Error in TTS worker: {e}")
+            finally:
+                self._queue.task_done()
+
+    def begin(self):
+        """Start a new reply; resets the buffer and time-to-first-audio clock."""
+        self._buf = ""
+        self.queued = 0
+        self.started_at = time.perf_counter()
+        self.first_audio_at = None
+        self.interrupted.clear()
+
+    def say(self, text: str):
+        text = self.clean_fn(text).strip()
+        if text:
+            self.queued += 1
+            self._queue.put(text)
+
+    def run(self, fn):
+        """Run ``fn`` on the TTS worker thread (e.g. engine housekeeping between replies)."""
+        self._queue.put(fn)
+
+    def feed(self, token: str):
+        self._buf += token
+        ready, self._buf = split_speakable(self._buf)
+        for text in ready:
+            self.say(text)
+
+    def flush(self):
+        rest, self._buf = self._buf, ""
+        self.say(rest)
+
+    def wait(self):
+        """Block until everything queued so far has been spoken."""
+        self._queue.join()
+
+    def end(self):
+        """Finish the reply: wait out the queue (dropped if interrupted), then allow speech again."""
+        self._queue.join()
+        self.interrupted.clear()
+
+    def interrupt(self):
+        """Stop speaking: drop queued sentences; nothing more is spoken until ``end()`` or ``begin()``.
+
+        Jobs queued with ``run()`` (such as prerendering fixed phrases) and a
+        pending ``close()`` are kept, in order.
+        """
+        self.interrupted.set()
+        self._buf = ""
+        keep = []
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+            if job is None or callable(job):
+                keep.append(job)
+        for job in keep:
+            self._queue.put(job)
+
+    def time_to_first_audio(self):
+        if self.started_at is None or self.first_audio_at is None:
+            return None
+        return self.first_audio_at - self.started_at
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+class SentenceStreamHandler(BaseCallbackHandler):
+    """LangChain callback that forwards streamed LLM tokens into a SpeechPipeline."""
+
+    raise_error = True  # let Interrupted propagate and end the LLM stream
+
+    def __init__(self, pipeline: SpeechPipeline, cancel=None):
+        self.pipeline = pipeline
+        self.cancel = cancel
+        self.tokens = 0
+        self.parts = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        if self.cancel is not None and self.cancel.is_set():
+            raise Interrupted()
+        self.tokens += 1
+        self.parts.append(token)
+        self.pipeline.feed(token)
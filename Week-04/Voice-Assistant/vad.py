@@ -0,0 +1,200 @@
+"""Streaming capture with voice-activity detection for the Joni Eats voice agent.
+
+Replaces ``adjust_for_ambient_noise`` + ``recognizer.listen`` on every turn:
+
+- ``NoiseFloor`` tracks background energy for the whole call and is updated
+  from every frame heard while nobody is talking, so no turn starts with a
+  calibration pause (only the first listen of a call seeds it)
+- ``FrameVAD`` classifies each microphone frame against that floor and ends an
+  utterance after a trailing silence that adapts to the caller's own pauses:
+  hesitant speakers get a longer hangover, crisp ones a shorter one
+- ``StreamingListener`` reads the open microphone stream frame by frame. As
+  soon as the caller pauses it starts recognizing the audio so far on a worker
+  thread; if the pause turns out to be the end of the utterance, the
+  transcript is usually ready when the hangover elapses, and if the caller
+  keeps talking the speculative result is dropped. With ``barge_in=True`` it
+  runs alongside playback and reports speech onset through ``on_start``
+"""
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import speech_recognition as sr
+
+from shared import tracer
+
+CALIBRATION_SECONDS = 0.2
+PRE_ROLL_SECONDS = 0.3      # audio kept from before speech onset so the first word is not clipped
+START_SECONDS = 0.1         # voiced audio needed to call it speech
+PAUSE_SECONDS = 0.15        # silence after which recognition starts speculatively
+MIN_END_SILENCE = 0.35
+MAX_END_SILENCE = 0.9
+# While the agent is talking its own voice leaks into the mic, so barge-in needs
+# louder and longer speech than a normal turn before it counts
+BARGE_IN_GAIN = 3.0
+BARGE_IN_START_SECONDS = 0.3
+
+
+def frame_energy(frame: bytes) -> float:
+    """RMS of a 16-bit mono PCM frame."""
+    samples = np.frombuffer(frame, dtype=np.int16)
+    if not samples.size:
+        return 0.0
+    return float(np.sqrt(np.mean(samples.astype(np.float32) ** 2)))
+
+
+class NoiseFloor:
+    """Running estimate of background energy; speech is anything well above it."""
+
+    def __init__(self, alpha=0.05, ratio=2.5, margin=60.0):
+        self.alpha = alpha
+        self.ratio = ratio
+        self.margin = margin
+        self.level = None
+
+    def seed(self, energies):
+        self.level = float(np.median(energies)) if len(energies) else 0.0
+
+    def update(self, energy: float):
+        if self.level is None:
+            self.level = energy
+        else:
+            self.level += self.alpha * (energy - self.level)
+
+    @property
+    def threshold(self) -> float:
+        return (self.level or 0.0) * self.ratio + self.margin
+
+
+class FrameVAD:
+    """Frame-level speech state machine; ``push`` returns "start", "pause", "resume", "end" or None."""
+
+    def __init__(self, floor: NoiseFloor, frame_seconds: float, start_seconds=START_SECONDS,
+                 pause_seconds=PAUSE_SECONDS, min_end_silence=MIN_END_SILENCE, max_end_silence=MAX_END_SILENCE):
+        self.floor = floor
+        self.frame_seconds = frame_seconds
+        self.start_seconds = start_seconds
+        self.pause_seconds = pause_seconds
+        self.min_end_silence = min_end_silence
+        self.max_end_silence = max_end_silence
+        # Mid-utterance pause length, learned across the call
+        self.typical_pause = min_end_silence / 2
+        self.reset()
+
+    def reset(self):
+        self.in_speech = False
+        self.voiced = 0.0
+        self.silence = 0.0
+        self.speech_seconds = 0.0
+
+    def end_silence(self) -> float:
+        return min(self.max_end_silence, max(self.min_end_silence, 2.0 * self.typical_pause))
+
+    def push(self, frame: bytes, gain=1.0, learn=True, start_seconds=None):
+        """``gain`` scales the onset threshold; ``learn=False`` keeps the frame out of the noise floor."""
+        energy = frame_energy(frame)
+        step = self.frame_seconds
+        if not self.in_speech:
+            if energy > self.floor.threshold * gain:
+                self.voiced += step
+                if self.voiced >= (start_seconds or self.start_seconds):
+                    self.in_speech = True
+                    self.speech_seconds = self.voiced
+                    return "start"
+            else:
+                self.voiced = 0.0
+                if learn:
+                    self.floor.update(energy)
+            return None
+
+        if energy > self.floor.threshold:
+            paused = self.silence >= self.pause_seconds
+            if self.silence:
+                self.typical_pause += 0.3 * (self.silence - self.typical_pause)
+            self.silence = 0.0
+            self.speech_seconds += step
+            return "resume" if paused else None
+        self.silence += step
+        if self.silence >= self.end_silence():
+            self.in_speech = False
+            return "end"
+        if self.silence - step < self.pause_seconds <= self.silence:
+            return "pause"
+        return None
+
+
+class StreamingListener:
+    """Utterance capture on an always-open ``MicStream`` with speculative recognition at pauses."""
+
+    def __init__(self, mic, stt, floor=None, pre_roll=PRE_ROLL_SECONDS):
+        self.mic = mic
+        self.stt = stt
+        self.floor = floor or NoiseFloor()
+        self.pre_roll = pre_roll
+        self.vad = None
+        self.last_timing = {}
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="stt-partial")
+
+    def _transcribe(self, frames, source, trace=None, speculative=False):
+        audio = sr.AudioData(b"".join(frames), source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+        with tracer.span("stt", trace=trace, speculative=speculative):
+            return self.stt.transcribe(audio)
+
+    def listen(self, timeout=10, phrase_time_limit=8, barge_in=False, on_start=None, cancel=None):
+        """Transcript of the next utterance.
+
+        ``on_start`` is called once speech begins. Returns None if ``cancel`` (a
+        ``threading.Event``) is set before the caller starts speaking.
+        """
+        source = self.mic.open()
+        trace = tracer.current()   # speculative recognition runs on a pool thread
+        frame_seconds = source.CHUNK / source.SAMPLE_RATE
+        if self.vad is None:
+            self.vad = FrameVAD(self.floor, frame_seconds)
+        if self.floor.level is None:
+            n = max(1, int(CALIBRATION_SECONDS / frame_seconds))
+            self.floor.seed([frame_energy(source.stream.read(source.CHUNK)) for _ in range(n)])
+        vad = self.vad
+        vad.reset()
+        gain, start = (BARGE_IN_GAIN, BARGE_IN_START_SECONDS) if barge_in else (1.0, None)
+
+        pre = deque(maxlen=max(1, int(self.pre_roll / frame_seconds)) + 1)
+        frames = []
+        speculative = None   # (future, frame count it covers)
+        deadline = time.perf_counter() + timeout
+        while True:
+            frame = source.stream.read(source.CHUNK)
+            event = vad.push(frame, gain=gain, learn=not barge_in, start_seconds=start)
+            if event is None and not vad.in_speech:
+                pre.append(frame)
+                if cancel is not None and cancel.is_set():
+                    return None
+                if time.perf_counter() > deadline:
+                    raise sr.WaitTimeoutError("listening timed out while waiting for phrase to start")
+                continue
+            if event == "start":
+                pre.append(frame)
+                frames = list(pre)
+                if on_start is not None:
+                    on_start()
+                continue
+            frames.append(frame)
+            if event == "pause":
+                speculative = (self._pool.submit(self._transcribe, list(frames), source, trace, True), len(frames))
+            elif event == "resume":
+                speculative = None
+            elif event == "end" or vad.speech_seconds >= phrase_time_limit:
+                break
+
+        # End of speech is the last voiced frame, not the end of the hangover
+        speech_end = time.perf_counter() - vad.silence
+        hit = speculative is not None
+        text = speculative[0].result() if hit else self._transcribe(frames, source, trace)
+        self.last_timing = {"end_silence": vad.end_silence(), "speculative": hit,
+                            "eos_to_text": time.perf_counter() - speech_end}
+        tracer.observe("eos_to_text", self.last_timing["eos_to_text"])
+        return text
+
+    def close(self):
+        self._pool.shutdown(wait=False)
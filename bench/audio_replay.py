@@ -0,0 +1,153 @@
+"""Replay recorded calls (WAV files) through the voice agent: STT -> Dialogue.predict -> reply.
+
+    python bench/audio_replay.py --make-fixtures calls/ --repeat 50     # synthetic calls + transcripts
+    python bench/audio_replay.py calls/ --stt transcript --concurrency 16
+    python bench/audio_replay.py recordings/ --stt sphinx --concurrency 4 --json report.json
+
+Layout of the calls directory:
+
+- ``<dir>/*.wav``: each file is a one-turn call
+- ``<dir>/<call>/*.wav``: a multi-turn call; turns run in file-name order on
+  one ``Dialogue``, so memory carries across them as in a live call
+
+Calls run concurrently on a worker pool (``--concurrency``). The LLM is the
+in-process mock unless ``--base-url`` is given, and with ``--stt transcript``
+(the ``.txt`` next to each WAV, optionally after ``--stt-latency-ms``) nothing
+needs a microphone or network. Per-stage latency: ``load`` (read WAV),
+``stt``, ``context`` and ``llm`` (as in ``replay.py``), ``dialogue`` (both)
+and ``total`` for the turn.
+"""
+import argparse
+import json
+import random
+import struct
+import sys
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from mock_llm import add_mock_args, config_from_args, start_in_thread
+from replay import CONVERSATIONS, VOICE, load_conversations, print_report, summarize
+
+FIXTURE_RATE = 16000
+SECONDS_PER_WORD = 0.3
+
+
+def find_calls(root: Path):
+    """List of calls, each a list of WAV paths in turn order."""
+    calls = [[p] for p in sorted(root.glob("*.wav"))]
+    for sub in sorted(p for p in root.iterdir() if p.is_dir()):
+        turns = sorted(sub.glob("*.wav"))
+        if turns:
+            calls.append(turns)
+    return calls
+
+
+def write_fixture(path: Path, text: str, rng: random.Random):
+    """Low-level noise lasting about as long as ``text`` takes to say, plus its transcript."""
+    frames = int(FIXTURE_RATE * max(0.5, SECONDS_PER_WORD * len(text.split())))
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(FIXTURE_RATE)
+        w.writeframes(struct.pack(f"<{frames}h", *(rng.randint(-300, 300) for _ in range(frames))))
+    path.with_suffix(".txt").write_text(text, encoding="utf-8")
+
+
+def make_fixtures(out: Path, convs, seed: int = 0):
+    rng = random.Random(seed)
+    out.mkdir(parents=True, exist_ok=True)
+    for i, conv in enumerate(convs):
+        call_dir = out / f"call-{i:05d}"
+        call_dir.mkdir(exist_ok=True)
+        for j, turn in enumerate(conv["turns"]):
+            write_fixture(call_dir / f"turn-{j:02d}.wav", turn, rng)
+    print(f"Wrote {len(convs)} calls to {out}")
+
+
+def run_calls(calls, args, base_url):
+    sys.path.insert(0, str(VOICE))
+    from dialogue import Dialogue, load_text_file, make_llm
+    from recognizers import load_audio, make_backend
+
+    kb = load_text_file(VOICE / "restaurant_kb.txt")
+    patterns = load_text_file(VOICE / "chat_patterns.txt")
+    flow = load_text_file(VOICE / "context_flow.txt")
+    options = {"latency_ms": args.stt_latency_ms} if args.stt == "transcript" else {}
+    samples, errors = [], 0
+
+    def replay(call):
+        nonlocal errors
+        stt = make_backend(args.stt, **options)
+        dialogue = Dialogue(make_llm("mock", base_url=base_url), kb, patterns, flow)
+        for path in call:
+            try:
+                t0 = time.perf_counter()
+                audio = load_audio(path, stt.recognizer)
+                t1 = time.perf_counter()
+                text = stt.transcribe(audio, source=path)
+                t2 = time.perf_counter()
+                reply = dialogue.predict(text)
+                done = time.perf_counter()
+            except Exception as e:
+                errors += 1
+                if args.verbose:
+                    print(f"{path}: {type(e).__name__}: {e}")
+                continue
+            stages = dialogue.last_timing
+            samples.append({"load": t1 - t0, "stt": t2 - t1, "context": stages["context"], "llm": stages["llm"],
+                            "dialogue": stages["total"], "total": done - t0})
+            if args.verbose:
+                print(f"{path.name}: {text!r} -> {reply[:60]!r}")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(replay, calls))
+    return summarize(samples, errors, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch STT -> dialogue replay over recorded calls")
+    parser.add_argument("calls", type=Path, nargs="?", help="directory of WAV recordings")
+    parser.add_argument("--make-fixtures", type=Path, metavar="DIR",
+                        help="write synthetic calls (WAV + .txt transcript) from --conversations and exit")
+    parser.add_argument("--conversations", type=Path, default=CONVERSATIONS)
+    parser.add_argument("--repeat", type=int, default=1, help="fixtures: copies of the conversation set")
+    parser.add_argument("--stt", default="transcript", help="google, sphinx or transcript")
+    parser.add_argument("--stt-latency-ms", type=float, default=0.0, help="transcript backend: simulated STT time")
+    parser.add_argument("--concurrency", type=int, default=8, help="calls in flight")
+    parser.add_argument("--base-url", help="use an already running mock/LLM instead of starting one")
+    parser.add_argument("--json", type=Path, help="write the report here")
+    parser.add_argument("--verbose", action="store_true")
+    add_mock_args(parser)
+    args = parser.parse_args()
+
+    if args.make_fixtures:
+        make_fixtures(args.make_fixtures, load_conversations(args.conversations) * args.repeat, seed=args.seed or 0)
+        return
+    if args.calls is None:
+        parser.error("a calls directory (or --make-fixtures) is required")
+    calls = find_calls(args.calls)
+    if not calls:
+        parser.error(f"no .wav files found in {args.calls}")
+
+    stop = None
+    base_url = args.base_url
+    if base_url is None:
+        base_url, stop = start_in_thread(config_from_args(args))
+    try:
+        report = run_calls(calls, args, base_url)
+    finally:
+        if stop is not None:
+            stop()
+    report.update(target="audio", stt=args.stt, calls=len(calls), concurrency=args.concurrency,
+                  throughput_calls_per_s=len(calls) / report["elapsed_s"] if report["elapsed_s"] else 0.0)
+    print_report(report)
+    print(f"calls={len(calls)} throughput={report['throughput_calls_per_s']:.2f} calls/s")
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Local OpenAI/Groq-compatible chat completions server for offline benchmarks.
+
+    python bench/mock_llm.py --port 8765 --latency-ms 300 --latency-sigma 0.5 --tokens-per-sec 250 --error-rate 0.01
+
+Serves ``POST /openai/v1/chat/completions`` (the Groq SDK path) and
+``POST /v1/chat/completions`` (OpenAI path), streaming (SSE) or not. Each
+request waits a time-to-first-token drawn from a log-normal distribution
+(median ``latency_ms``, shape ``latency_sigma``), then emits reply words at
+``tokens_per_sec``. ``error_rate`` / ``rate_limit_rate`` inject 500 and 429
+responses. Point a client at it with ``base_url="http://127.0.0.1:8765"``
+(Groq) or ``GROQ_BASE_URL``.
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+
+from aiohttp import web
+
+WORDS = ("Sure! Our Zinger Burger is $6 and the Chicken Tikka pizza starts at $7. "
+         "We deliver within 5km of I8 Markaz in about 30 minutes. Would you like fries "
+         "and a drink with that, or is there anything else I can help you with today?").split()
+
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 300.0      # median time to first token
+    latency_sigma: float = 0.5     # log-normal shape; 0 means fixed latency
+    tokens_per_sec: float = 250.0  # 0 means the whole reply at once
+    reply_tokens: int = 60
+    error_rate: float = 0.0        # fraction of requests answered with HTTP 500
+    rate_limit_rate: float = 0.0   # fraction answered with HTTP 429
+    seed: int | None = None
+
+
+class MockLLM:
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.requests = 0
+        self.errors = 0
+
+    def _ttft(self) -> float:
+        c = self.config
+        if c.latency_sigma <= 0:
+            return c.latency_ms / 1000
+        return self.rng.lognormvariate(0, c.latency_sigma) * c.latency_ms / 1000
+
+    def _reply(self, n: int):
+        return [WORDS[i % len(WORDS)] + " " for i in range(n)]
+
+    async def handle(self, request):
+        self.requests += 1
+        c = self.config
+        body = await request.json()
+        model = body.get("model", "mock")
+        roll = self.rng.random()
+        if roll < c.rate_limit_rate:
+            self.errors += 1
+            return web.json_response({"error": {"message": "rate limited", "type": "rate_limit"}},
+                                     status=429, headers={"retry-after": "0"})
+        if roll < c.rate_limit_rate + c.error_rate:
+            self.errors += 1
+            return web.json_response({"error": {"message": "injected failure", "type": "server_error"}}, status=500)
+
+        await asyncio.sleep(self._ttft())
+        n = min(int(body.get("max_tokens") or c.reply_tokens), c.reply_tokens)
+        tokens = self._reply(n)
+        delay = 1.0 / c.tokens_per_sec if c.tokens_per_sec > 0 else 0.0
+        rid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        usage = {"prompt_tokens": sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4,
+                 "completion_tokens": n, "total_tokens": 0}
+        usage["total_tokens"] = usage["prompt_tokens"] + n
+
+        if not body.get("stream"):
+            await asyncio.sleep(delay * n)
+            return web.json_response({
+                "id": rid, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(tokens).strip()}}],
+                "usage": usage,
+            })
+
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await resp.prepare(request)
+
+        async def send(delta, finish=None):
+            chunk = {"id": rid, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            await resp.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        await send({"role": "assistant", "content": ""})
+        for tok in tokens:
+            await send({"content": tok})
+            if delay:
+                await asyncio.sleep(delay)
+        await send({}, finish="stop")
+        await resp.write(b"data: [DONE]\n\n")
+        await resp.write_eof()
+        return resp
+
+    async def handle_stats(self, request):
+        return web.json_response({"requests": self.requests, "errors": self.errors})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/openai/v1/chat/completions", self.handle)
+        app.router.add_post("/v1/chat/completions", self.handle)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+
+def start_in_thread(config: MockConfig, host: str = "127.0.0.1", port: int = 0):
+    """Run the mock on its own event loop thread; returns (base_url, stop function)."""
+    started = threading.Event()
+    state = {}
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        runner = web.AppRunner(MockLLM(config).app(), access_log=None)
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, host, port)
+        loop.run_until_complete(site.start())
+        state["port"] = runner.addresses[0][1]
+        state["loop"] = loop
+        started.set()
+        loop.run_forever()
+        loop.run_until_complete(runner.cleanup())
+        loop.close()
+
+    thread = threading.Thread(target=run, name="mock-llm", daemon=True)
+    thread.start()
+    started.wait()
+
+    def stop():
+        state["loop"].call_soon_threadsafe(state["loop"].stop)
+        thread.join(timeout=5)
+
+    return f"http://{host}:{state['port']}", stop
+
+
+def add_mock_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-ms", type=float, default=MockConfig.latency_ms)
+    parser.add_argument("--latency-sigma", type=float, default=MockConfig.latency_sigma)
+    parser.add_argument("--tokens-per-sec", type=float, default=MockConfig.tokens_per_sec)
+    parser.add_argument("--reply-tokens", type=int, default=MockConfig.reply_tokens)
+    parser.add_argument("--error-rate", type=float, default=MockConfig.error_rate)
+    parser.add_argument("--rate-limit-rate", type=float, default=MockConfig.rate_limit_rate)
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_args(args) -> MockConfig:
+    return MockConfig(args.latency_ms, args.latency_sigma, args.tokens_per_sec, args.reply_tokens,
+                      args.error_rate, args.rate_limit_rate, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Groq/OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_mock_args(parser)
+    args = parser.parse_args()
+    web.run_app(MockLLM(config_from_args(args)).app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
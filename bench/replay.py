@@ -0,0 +1,195 @@
+"""Replay recorded multi-turn conversations against the chatbot or the voice agent's text pipeline.
+
+    python bench/replay.py --target chat --concurrency 50 --repeat 20
+    python bench/replay.py --target agent --concurrency 8 --latency-ms 400
+    python bench/replay.py --target chat --base-url http://127.0.0.1:8765   # external mock
+
+Targets:
+
+- ``chat``: Week-03 ``ChatServer.answer`` (retrieval, prompt render, LLM call) on
+  one event loop, with ``--concurrency`` conversations in flight
+- ``agent``: Week-04 ``Dialogue.predict`` (context selection, chain + LLM) on a
+  thread pool, one ``Dialogue`` per conversation as in a real call
+
+Unless ``--base-url`` is given, a mock LLM (``mock_llm.py``) is started in-process,
+so the whole run is offline. Turns within a conversation run in order; the report
+gives p50/p95/p99 per stage plus turn throughput, and ``--json`` saves it.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from mock_llm import add_mock_args, config_from_args, start_in_thread
+from stats import percentile
+
+WORKSPACE = Path(__file__).resolve().parent.parent
+WEEK03 = WORKSPACE / "Week-03"
+VOICE = WORKSPACE / "Week-04" / "Voice-Assistant"
+CONVERSATIONS = Path(__file__).resolve().parent / "conversations.jsonl"
+
+
+def load_conversations(path: Path):
+    convs = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            convs.append(json.loads(line))
+    return convs
+
+
+def summarize(samples, errors: int, elapsed: float):
+    stages = {}
+    for timing in samples:
+        for stage, secs in timing.items():
+            if isinstance(secs, (int, float)) and not isinstance(secs, bool):
+                stages.setdefault(stage, []).append(secs)
+    report = {"turns": len(samples), "errors": errors, "elapsed_s": elapsed,
+              "throughput_turns_per_s": len(samples) / elapsed if elapsed else 0.0, "stages": {}}
+    for stage, vals in stages.items():
+        vals.sort()
+        report["stages"][stage] = {
+            "count": len(vals),
+            "mean_ms": 1000 * sum(vals) / len(vals),
+            "p50_ms": 1000 * percentile(vals, 50),
+            "p95_ms": 1000 * percentile(vals, 95),
+            "p99_ms": 1000 * percentile(vals, 99),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"\nturns={report['turns']} errors={report['errors']} "
+          f"elapsed={report['elapsed_s']:.2f}s throughput={report['throughput_turns_per_s']:.1f} turns/s")
+    print(f"{'stage':<12}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)")
+    for stage, s in report["stages"].items():
+        print(f"{stage:<12}{s['count']:>8}{s['mean_ms']:>10.2f}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}")
+    llm = report.get("llm")
+    if llm:
+        print(f"llm calls={llm.get('calls', 0)} hedged={llm.get('hedged', 0)} fallback={llm.get('fallback', 0)} "
+              f"retries={llm.get('retries', 0)} budget_denied={llm['budget_denied']}")
+    cache = report.get("cache")
+    if cache:
+        print(f"cache hits={cache['hits']} near_hits={cache['near_hits']} misses={cache['misses']} "
+              f"hit_rate={cache['hit_rate']:.1%}")
+
+
+async def run_chat(convs, args, base_url):
+    sys.path.insert(0, str(WEEK03))
+    import httpx
+    from groq import AsyncGroq
+    from llm_dispatch import Dispatcher
+    from response_cache import ResponseCache
+    from server import DEFAULT_TENANT, INDEX_CACHE, CORPUS, ChatServer, UpstreamGate
+    from tenants import TenantRegistry
+
+    http = httpx.AsyncClient(limits=httpx.Limits(max_connections=args.max_upstream,
+                                                 max_keepalive_connections=args.max_upstream))
+    client = AsyncGroq(api_key="mock", base_url=base_url, http_client=http, max_retries=0)
+    # max_entries=0 evicts every answer immediately, i.e. the cache is off
+    make_cache = ResponseCache if args.with_cache else (lambda: ResponseCache(max_entries=0))
+    tenants = TenantRegistry(INDEX_CACHE, corpora={DEFAULT_TENANT: CORPUS}, make_cache=make_cache)
+    tenants.preload([DEFAULT_TENANT])
+    gate = UpstreamGate(args.max_upstream, max_waiting=10 ** 6, timeout=3600)
+    dispatch = Dispatcher(fallbacks=[args.fallback_model], hedge=not args.no_hedge)
+    server = ChatServer(client, tenants, gate, dispatch=dispatch)
+
+    samples, errors = [], 0
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def replay(conv):
+        nonlocal errors
+        async with sem:
+            sid = uuid.uuid4().hex
+            for turn in conv["turns"]:
+                timing = {}
+                try:
+                    await server.answer(sid, turn, timing=timing)
+                    samples.append(timing)
+                except Exception as e:
+                    errors += 1
+                    if args.verbose:
+                        print(f"turn failed: {e}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(replay(c) for c in convs))
+    elapsed = time.perf_counter() - start
+    await http.aclose()
+    report = summarize(samples, errors, elapsed)
+    report["llm"] = dispatch.stats()
+    if args.with_cache:
+        report["cache"] = tenants.stats()["tenants"][DEFAULT_TENANT]["cache"]
+    return report
+
+
+def run_agent(convs, args, base_url):
+    sys.path.insert(0, str(VOICE))
+    from dialogue import Dialogue, load_text_file, make_llm
+
+    kb = load_text_file(VOICE / "restaurant_kb.txt")
+    patterns = load_text_file(VOICE / "chat_patterns.txt")
+    flow = load_text_file(VOICE / "context_flow.txt")
+    samples, errors = [], 0
+
+    def replay(conv):
+        nonlocal errors
+        fallbacks = [make_llm("mock", base_url=base_url, model=args.fallback_model)] if args.fallback_model else []
+        dialogue = Dialogue(make_llm("mock", base_url=base_url), kb, patterns, flow,
+                            fallbacks=fallbacks, hedge=not args.no_hedge)
+        for turn in conv["turns"]:
+            try:
+                dialogue.predict(turn)
+                samples.append(dict(dialogue.last_timing))
+            except Exception as e:
+                errors += 1
+                if args.verbose:
+                    print(f"turn failed: {e}")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(replay, convs))
+    return summarize(samples, errors, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline replay benchmark")
+    parser.add_argument("--target", choices=("chat", "agent"), default="chat")
+    parser.add_argument("--conversations", type=Path, default=CONVERSATIONS)
+    parser.add_argument("--repeat", type=int, default=10, help="replay the conversation set this many times")
+    parser.add_argument("--concurrency", type=int, default=16, help="conversations in flight")
+    parser.add_argument("--max-upstream", type=int, default=64, help="chat target: concurrent LLM calls")
+    parser.add_argument("--with-cache", action="store_true", help="chat target: keep the response cache on")
+    parser.add_argument("--fallback-model", default="llama-3.3-70b-versatile",
+                        help="hedge/fail over to this model ('' for none)")
+    parser.add_argument("--no-hedge", action="store_true", help="fail over on errors only")
+    parser.add_argument("--base-url", help="use an already running mock/LLM instead of starting one")
+    parser.add_argument("--json", type=Path, help="write the report here")
+    parser.add_argument("--verbose", action="store_true")
+    add_mock_args(parser)
+    args = parser.parse_args()
+
+    convs = load_conversations(args.conversations) * args.repeat
+    stop = None
+    base_url = args.base_url
+    if base_url is None:
+        base_url, stop = start_in_thread(config_from_args(args))
+    try:
+        if args.target == "chat":
+            report = asyncio.run(run_chat(convs, args, base_url))
+        else:
+            report = run_agent(convs, args, base_url)
+    finally:
+        if stop is not None:
+            stop()
+    report["target"] = args.target
+    report["concurrency"] = args.concurrency
+    print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Retrieval benchmark on synthetic corpora: current TF-IDF vs BM25 (MaxScore) vs hybrid.
+
+    python bench/retrieval_bench.py --sizes 10000,100000 --queries 500
+    python bench/retrieval_bench.py --sizes 1000000 --queries 200 --json retrieval.json
+
+Chunks are made from a Zipf-distributed vocabulary of pseudo-words, mixing short
+menu-like lines with longer paragraphs. Each query is 2-4 words drawn from one
+chunk (its "source"). Reported per retriever and corpus size:
+
+- ``build_s`` and ``index_mb`` (array bytes of the matrix / postings)
+- query latency p50/p95/mean in ms (top-k, single query, as ``retrieve()`` is called)
+- ``recall_vs_tfidf``: overlap of its top-k with the current TF-IDF top-k
+- ``source_hit``: fraction of queries whose source chunk is in the top-k
+
+``bm25_exhaustive`` scores every posting without pruning; its latency is the
+baseline for MaxScore. Its top-k scores match ``bm25``; chunks tied on score may
+be picked in a different order, which shows up as small ``source_hit`` differences.
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from stats import percentile
+
+WEEK03 = Path(__file__).resolve().parent.parent / "Week-03"
+SYLLABLES = ["ka", "zi", "mo", "ra", "ne", "tu", "li", "pa", "so", "ve", "chi", "ber", "gar", "lo", "mi", "un"]
+
+
+def make_vocab(size: int, rng):
+    vocab = set()
+    while len(vocab) < size:
+        n = int(rng.integers(2, 5))
+        vocab.add("".join(SYLLABLES[int(i)] for i in rng.integers(0, len(SYLLABLES), n)))
+    return sorted(vocab)
+
+
+def make_corpus(n_chunks: int, n_queries: int, vocab_size: int, seed: int):
+    rng = np.random.default_rng(seed)
+    vocab = np.array(make_vocab(vocab_size, rng))
+    p = 1.0 / np.arange(1, vocab_size + 1) ** 1.05
+    p /= p.sum()
+    # A third short (menu item lines), the rest paragraph-sized
+    lengths = np.where(rng.random(n_chunks) < 0.33, rng.integers(4, 12, n_chunks), rng.integers(25, 90, n_chunks))
+    words = rng.choice(len(vocab), size=int(lengths.sum()), p=p)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    chunks = [" ".join(vocab[words[offsets[i]:offsets[i + 1]]]) for i in range(n_chunks)]
+    sources = rng.integers(0, n_chunks, n_queries)
+    queries = []
+    for s in sources:
+        toks = chunks[s].split()
+        k = min(len(toks), int(rng.integers(2, 5)))
+        queries.append(" ".join(rng.choice(toks, size=k, replace=False)))
+    return chunks, queries, sources
+
+
+def timed(fn, queries):
+    results, lat = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        results.append(fn(q))
+        lat.append(time.perf_counter() - t0)
+    return results, sorted(lat)
+
+
+def bench_size(n_chunks: int, args):
+    from bm25 import BM25Index
+    from retrieval import fit_retriever, hybrid_hits, retrieve
+
+    chunks, queries, sources = make_corpus(n_chunks, args.queries, args.vocab, args.seed)
+    k = args.top_k
+    report = {"chunks": n_chunks, "queries": len(queries), "top_k": k, "retrievers": {}}
+
+    gc.collect()
+    t0 = time.perf_counter()
+    vec, mat = fit_retriever(chunks)
+    tfidf_build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    bm = BM25Index(chunks)
+    bm25_build = time.perf_counter() - t0
+    tfidf_mb = (mat.data.nbytes + mat.indices.nbytes + mat.indptr.nbytes) / 2 ** 20
+    bm25_mb = bm.nbytes / 2 ** 20
+
+    retrievers = {
+        "tfidf": (lambda q: [i for i, _s, _c in retrieve(vec, mat, chunks, q, top_k=k)], tfidf_build, tfidf_mb),
+        "bm25": (lambda q: [i for i, _s in bm.search(q, k)], bm25_build, bm25_mb),
+        "bm25_exhaustive": (lambda q: [i for i, _s in bm.search_exhaustive(q, k)], bm25_build, bm25_mb),
+        "hybrid": (lambda q: [i for i, _s in hybrid_hits(vec, mat, bm, q, top_k=k)],
+                   tfidf_build + bm25_build, tfidf_mb + bm25_mb),
+    }
+    baseline = None
+    for name, (fn, build, mb) in retrievers.items():
+        results, lat = timed(fn, queries)
+        if name == "tfidf":
+            baseline = results
+        overlap = [len(set(r) & set(b)) / max(1, min(k, len(b))) for r, b in zip(results, baseline)]
+        report["retrievers"][name] = {
+            "build_s": build,
+            "index_mb": mb,
+            "p50_ms": 1000 * percentile(lat, 50),
+            "p95_ms": 1000 * percentile(lat, 95),
+            "mean_ms": 1000 * sum(lat) / len(lat),
+            "recall_vs_tfidf": float(np.mean(overlap)),
+            "source_hit": float(np.mean([s in r for r, s in zip(results, sources)])),
+        }
+    del vec, mat, bm
+    return report
+
+
+def print_size(report):
+    print(f"\n{report['chunks']:,} chunks, {report['queries']} queries, top_k={report['top_k']}")
+    print(f"{'retriever':<17}{'build s':>9}{'index MB':>10}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}"
+          f"{'recall@k':>10}{'source@k':>10}")
+    for name, r in report["retrievers"].items():
+        print(f"{name:<17}{r['build_s']:>9.2f}{r['index_mb']:>10.1f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}"
+              f"{r['mean_ms']:>9.2f}{r['recall_vs_tfidf']:>10.3f}{r['source_hit']:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TF-IDF vs BM25 vs hybrid retrieval benchmark")
+    parser.add_argument("--sizes", default="10000,100000", help="comma-separated corpus sizes (chunks)")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--vocab", type=int, default=50000, help="distinct words in the synthetic corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="write the report here")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(WEEK03))
+    reports = []
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        report = bench_size(size, args)
+        print_size(report)
+        reports.append(report)
+    if args.json:
+        args.json.write_text(json.dumps(reports, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
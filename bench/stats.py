@@ -0,0 +1,10 @@
+"""Summary statistics shared by the benchmarks; standard library only."""
+import math
+
+
+def percentile(sorted_vals, p: float):
+    # Nearest-rank percentile
+    if not sorted_vals:
+        return None
+    k = max(0, math.ceil(p / 100 * len(sorted_vals)) - 1)
+    return sorted_vals[k]
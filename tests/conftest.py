@@ -0,0 +1,10 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+WEEK03 = ROOT / "Week-03"
+VOICE = ROOT / "Week-04" / "Voice-Assistant"
+
+for path in (WEEK03, VOICE):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
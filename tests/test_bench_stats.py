@@ -0,0 +1,19 @@
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+sys.path.insert(0, str(ROOT / "bench"))
+from stats import percentile  # noqa: E402
+
+
+@pytest.mark.parametrize("n, p, expected", [
+    (100, 95, 95), (100, 99, 99), (100, 50, 50), (10, 90, 9), (10, 95, 10), (1, 50, 1), (3, 0, 1),
+])
+def test_percentile_is_nearest_rank(n, p, expected):
+    assert percentile(list(range(1, n + 1)), p) == expected
+
+
+def test_percentile_of_nothing():
+    assert percentile([], 95) is None
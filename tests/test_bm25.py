@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from bm25 import BM25Index
+
+
+@pytest.fixture(scope="module")
+def index():
+    rng = np.random.default_rng(7)
+    words = [f"w{i}" for i in range(500)]
+    chunks = [" ".join(rng.choice(words, size=int(rng.integers(4, 30)))) for _ in range(2000)]
+    return BM25Index(chunks), words
+
+
+def test_maxscore_matches_exhaustive(index):
+    bm, words = index
+    rng = np.random.default_rng(11)
+    for _ in range(100):
+        query = " ".join(rng.choice(words, size=int(rng.integers(1, 5))))
+        pruned = sorted(s for _i, s in bm.search(query, 5))
+        full = sorted(s for _i, s in bm.search_exhaustive(query, 5))
+        assert np.allclose(pruned, full, atol=1e-5)
+
+
+def test_score_buffers_are_reset_between_queries(index):
+    bm, _words = index
+    first = bm.search("w1 w2 w3", 5)
+    bm.search("w4 w5", 5)
+    acc, seen = bm._buffers()
+    assert not acc.any() and not seen.any()
+    assert bm.search("w1 w2 w3", 5) == first
+
+
+def test_no_match():
+    assert BM25Index(["zinger burger", "fries"]).search("pizza", 3) == []
@@ -0,0 +1,58 @@
+import pytest
+
+pytest.importorskip("langchain")
+
+from call_memory import CallMemory, menu_items_from_kb  # noqa: E402
+from conftest import VOICE  # noqa: E402
+
+KB = (VOICE / "restaurant_kb.txt").read_text(encoding="utf-8")
+
+
+@pytest.fixture
+def memory():
+    return CallMemory(llm=None, menu_items=menu_items_from_kb(KB))
+
+
+def say(memory, *lines):
+    for line in lines:
+        memory.save_context({"input": line}, {"response": "Sure."})
+    return memory.slots
+
+
+def test_inquiry_is_not_an_order(memory):
+    slots = say(memory, "Is the Chicken Tikka spicy?", "What comes with the Zinger Burger")
+    assert slots["items"] == {}
+    assert "Order so far" not in memory.buffer
+
+
+def test_order(memory):
+    slots = say(memory, "I'll take two Zinger Burgers and a Coke")
+    assert slots["items"] == {"Zinger Burger": 2, "Coke": 1}
+
+
+def test_correction(memory):
+    slots = say(memory, "Can I get a Chicken Burger?", "Actually make that three Chicken Burgers")
+    assert slots["items"] == {"Chicken Burger": 3}
+
+
+def test_removal(memory):
+    slots = say(memory, "I want a Beef Burger and Fries", "Please remove the Fries but add Garlic Bread")
+    assert slots["items"] == {"Beef Burger": 1, "Garlic Bread": 1}
+
+
+def test_question_after_order_keeps_it(memory):
+    slots = say(memory, "I want a Grilled Chicken Burger. Is the Chicken Burger bigger?")
+    assert slots["items"] == {"Grilled Chicken Burger": 1}
+
+
+@pytest.mark.parametrize("line, slot, value", [
+    ("Delivery please", "fulfilment", "delivery"),
+    ("I'll pick up", "fulfilment", "pickup"),
+    ("I'll pay by card", "payment", "card"),
+    ("Cash", "payment", "cash"),
+    ("Do you have cashew sauce?", "payment", None),
+    ("Is the voucher deliverable?", "fulfilment", None),
+    ("Any discards?", "payment", None),
+])
+def test_fulfilment_and_payment_words(memory, line, slot, value):
+    assert say(memory, line).get(slot) == value
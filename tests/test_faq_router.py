@@ -0,0 +1,52 @@
+import pytest
+
+from conftest import VOICE, WEEK03
+from faq_router import FaqRouter
+
+KBS = {
+    "chat": WEEK03 / "joni_eats_corpus.txt",
+    "voice": VOICE / "restaurant_kb.txt",
+}
+
+# utterance -> intent the router answers, or None when it must go to the LLM
+CASES = [
+    ("What are your opening hours?", "hours"),
+    ("What time do you open", "hours"),
+    ("When do you close?", "hours"),
+    ("opening hours?", "hours"),
+    ("Where are you located?", "location"),
+    ("What's your address?", "location"),
+    ("Do you deliver?", "delivery"),
+    ("Can I pay by card?", "payment"),
+    ("Do you accept credit cards?", "payment"),
+    # Replies to the agent in the middle of an order
+    ("Delivery please", None),
+    ("card", None),
+    ("I'll pay with card", None),
+    ("Cash on delivery", None),
+    # Questions the facts do not answer
+    ("How long does delivery take?", None),
+    ("Do you deliver after midnight?", None),
+    ("Do you close early on Eid?", None),
+    ("Are you open on Christmas?", None),
+    # Orders, complaints, prices, menu items, two intents
+    ("Can I order two Zinger Burgers?", None),
+    ("Where is my order?", None),
+    ("How much is delivery?", None),
+    ("Do you deliver and take cards?", None),
+]
+
+
+@pytest.fixture(scope="module", params=sorted(KBS))
+def router(request):
+    return FaqRouter(KBS[request.param].read_text(encoding="utf-8"))
+
+
+@pytest.mark.parametrize("utterance, intent", CASES)
+def test_route(router, utterance, intent):
+    routed = router.route(utterance)
+    assert (routed.intent if routed else None) == intent
+
+
+def test_answers_come_from_kb(router):
+    assert router.route("Do you deliver?").answer == router.facts["delivery"]
@@ -0,0 +1,63 @@
+import numpy as np
+
+import live_index
+from live_index import LiveIndex
+from retrieval import fit_retriever
+
+WORDS = ["pepperoni", "margherita", "falafel", "shawarma", "biryani", "tikka", "lasagna", "risotto",
+         "tacos", "burrito", "ramen", "sushi", "gyoza", "paneer", "kebab", "calzone"]
+
+
+def kb(seed: int, n: int = 6):
+    rng = np.random.default_rng(seed)
+    paras = []
+    for i in range(n):
+        words = rng.choice(WORDS, size=30)
+        paras.append(f"Item {seed}-{i}: " + " ".join(f"{w}{seed}" for w in words) + ".")
+    return "\n\n".join(paras)
+
+
+def write_corpus(path, kb_text):
+    path.write_text(f"### SECTION: RESTAURANT_KB\n{kb_text}\n### SECTION: CHAT_PATTERNS\nCustomer: hi\n",
+                    encoding="utf-8")
+
+
+def test_failed_reload_is_retried(tmp_path, monkeypatch):
+    corpus = tmp_path / "corpus.txt"
+    write_corpus(corpus, kb(0))
+    live = LiveIndex(corpus)
+    write_corpus(corpus, kb(1))
+    real = live_index.split_chunks
+    calls = []
+
+    def flaky(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise OSError("file mid-write")
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(live_index, "split_chunks", flaky)
+    try:
+        live.reload()
+    except OSError:
+        pass
+    assert live.snapshot().version == 0
+    assert live.reload() is True
+    assert live.snapshot().kb_text == kb(1)
+
+
+def test_vocabulary_is_compacted_after_edits(tmp_path):
+    corpus = tmp_path / "corpus.txt"
+    write_corpus(corpus, kb(0))
+    live = LiveIndex(corpus)
+    for seed in range(1, 6):
+        write_corpus(corpus, kb(seed))
+        live.reload(force=True)
+    snap = live.snapshot()
+    fresh_vec, fresh_mat = fit_retriever(snap.chunks)
+    assert snap.mat.shape[1] <= len(fresh_vec.vocabulary_) / (1 - live_index.VOCAB_COMPACT_RATIO)
+    # Rankings match an index built from scratch
+    query = f"{WORDS[3]}5 {WORDS[7]}5"
+    live_scores = (snap.mat @ snap.vec.transform([query]).T).toarray().ravel()
+    fresh_scores = (fresh_mat @ fresh_vec.transform([query]).T).toarray().ravel()
+    assert np.allclose(live_scores, fresh_scores)
@@ -0,0 +1,237 @@
+import asyncio
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+
+def _stub_groq():
+    # Just the exception types llm_dispatch looks at, so the tests need no SDK
+    groq = types.ModuleType("groq")
+
+    class APIStatusError(Exception):
+        def __init__(self, message, status_code=500, response=None):
+            super().__init__(message)
+            self.status_code = status_code
+            self.response = response
+
+    class APIConnectionError(Exception):
+        pass
+
+    groq.APIStatusError = APIStatusError
+    groq.APIConnectionError = APIConnectionError
+    return groq
+
+
+try:
+    import groq  # noqa: F401
+except ImportError:
+    sys.modules["groq"] = _stub_groq()
+
+import llm_dispatch  # noqa: E402
+from llm_dispatch import CircuitBreaker, CircuitOpen, Dispatcher, LatencyWindow, RetryBudget  # noqa: E402
+
+PRIMARY, FALLBACK = "small", "large"
+
+
+def status_error(code):
+    # Built without __init__, whose signature differs between the stub and the SDK
+    err = llm_dispatch.groq.APIStatusError.__new__(llm_dispatch.groq.APIStatusError)
+    Exception.__init__(err, f"HTTP {code}")
+    err.status_code = code
+    err.response = None
+    return err
+
+
+def fast_primary(dispatch, secs=0.01):
+    # Enough samples that the hedge delay is the primary's p95 (floored at HEDGE_FLOOR)
+    for _ in range(llm_dispatch.MIN_SAMPLES):
+        dispatch.observe(PRIMARY, "complete", secs)
+
+
+def test_latency_window_p95_is_nearest_rank():
+    window = LatencyWindow()
+    for secs in range(1, 21):
+        window.add(float(secs))
+    # 95% of 20 samples is the 19th; the slowest sample is not the p95
+    assert window.p95() == 19.0
+
+
+def test_primary_answers():
+    dispatch = Dispatcher(fallbacks=[FALLBACK])
+    assert dispatch.complete(lambda m: f"reply from {m}", PRIMARY) == (f"reply from {PRIMARY}", PRIMARY)
+    assert dispatch.counts["primary"] == 1
+
+
+def test_slow_primary_is_hedged():
+    dispatch = Dispatcher(fallbacks=[FALLBACK])
+    fast_primary(dispatch)
+
+    def call(model):
+        time.sleep(1.0 if model == PRIMARY else 0.0)
+        return model
+
+    start = time.monotonic()
+    assert dispatch.complete(call, PRIMARY) == (FALLBACK, FALLBACK)
+    assert time.monotonic() - start < 0.8
+    assert dispatch.counts["hedged"] == 1 and dispatch.counts["fallback"] == 1
+
+
+def test_no_hedge_waits_for_primary():
+    dispatch = Dispatcher(fallbacks=[FALLBACK], hedge=False)
+    fast_primary(dispatch)
+    assert dispatch.complete(lambda m: time.sleep(0.4) or m, PRIMARY) == (PRIMARY, PRIMARY)
+
+
+def test_retry_then_success():
+    dispatch = Dispatcher(fallbacks=[FALLBACK])
+    attempts = []
+
+    def call(model):
+        attempts.append(model)
+        if len(attempts) == 1:
+            raise ConnectionError("reset")
+        return model
+
+    assert dispatch.complete(call, PRIMARY) == (PRIMARY, PRIMARY)
+    assert attempts == [PRIMARY, PRIMARY]
+    assert dispatch.counts["retries"] == 1
+
+
+def test_failover_after_retries():
+    dispatch = Dispatcher(fallbacks=[FALLBACK], retries=0)
+
+    def call(model):
+        if model == PRIMARY:
+            raise status_error(503)
+        return model
+
+    assert dispatch.complete(call, PRIMARY) == (FALLBACK, FALLBACK)
+
+
+def test_client_error_is_not_retried_or_failed_over():
+    dispatch = Dispatcher(fallbacks=[FALLBACK])
+    attempts = []
+
+    def call(model):
+        attempts.append(model)
+        raise status_error(400)
+
+    with pytest.raises(llm_dispatch.groq.APIStatusError):
+        dispatch.complete(call, PRIMARY)
+    assert attempts == [PRIMARY]
+    assert dispatch.breaker(PRIMARY).state == "closed"
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker(failures=2, cooldown=0.05)
+    breaker.failure()
+    assert breaker.state == "closed"
+    breaker.failure()
+    assert breaker.state == "open" and not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    assert breaker.allow()          # the probe
+    assert not breaker.allow()      # only one at a time
+    breaker.failure()               # failed probe: open again
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == "closed" and breaker.allow()
+    assert breaker.opens == 2
+
+
+def test_open_breaker_skips_model():
+    dispatch = Dispatcher(fallbacks=[FALLBACK])
+    for _ in range(llm_dispatch.BREAKER_FAILURES):
+        dispatch.breaker(PRIMARY).failure()
+    calls = []
+    assert dispatch.complete(lambda m: calls.append(m) or m, PRIMARY) == (FALLBACK, FALLBACK)
+    assert calls == [FALLBACK]
+    for _ in range(llm_dispatch.BREAKER_FAILURES):
+        dispatch.breaker(FALLBACK).failure()
+    with pytest.raises(CircuitOpen):
+        dispatch.complete(lambda m: m, PRIMARY)
+
+
+def test_retry_budget():
+    budget = RetryBudget(ratio=0.5, per_second=0.0, cap=2.0)
+    assert budget.withdraw() and budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw()
+    assert budget.denied == 1
+
+
+def test_stream_closes_the_losing_stream():
+    dispatch = Dispatcher(fallbacks=[FALLBACK])
+    fast_primary(dispatch)
+    for _ in range(llm_dispatch.MIN_SAMPLES):
+        dispatch.observe(PRIMARY, "stream", 0.01)
+    closed = threading.Event()
+
+    def call(model):
+        def gen():
+            try:
+                if model == PRIMARY:
+                    time.sleep(0.6)
+                yield from (f"{model}-1", f"{model}-2")
+            finally:
+                if model == PRIMARY:
+                    closed.set()
+        return gen()
+
+    deltas, answered = dispatch.stream(call, PRIMARY)
+    assert answered == FALLBACK
+    assert list(deltas) == [f"{FALLBACK}-1", f"{FALLBACK}-2"]
+    assert closed.wait(2)
+
+
+def test_async_hedge_cancels_loser():
+    cancelled = False
+
+    async def main():
+        nonlocal cancelled
+        dispatch = Dispatcher(fallbacks=[FALLBACK])
+        fast_primary(dispatch)
+
+        async def call(model):
+            nonlocal cancelled
+            if model == PRIMARY:
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    cancelled = True
+                    raise
+            return model
+
+        result = await dispatch.acomplete(call, PRIMARY)
+        await asyncio.sleep(0)
+        return dispatch, result
+
+    dispatch, result = asyncio.run(main())
+    assert result == (FALLBACK, FALLBACK)
+    assert cancelled
+    assert dispatch.counts["hedged"] == 1
+
+
+def test_async_failover_and_timeout():
+    async def main():
+        dispatch = Dispatcher(fallbacks=[FALLBACK], retries=0)
+
+        async def failing_primary(model):
+            if model == PRIMARY:
+                raise ConnectionError("reset")
+            return model
+
+        assert await dispatch.acomplete(failing_primary, PRIMARY) == (FALLBACK, FALLBACK)
+
+        slow = Dispatcher(hedge=False, timeout=0.05)
+        with pytest.raises(TimeoutError):
+            await slow.acomplete(lambda m: asyncio.sleep(1), PRIMARY)
+
+    asyncio.run(main())
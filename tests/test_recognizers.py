@@ -0,0 +1,29 @@
+import pytest
+
+sr = pytest.importorskip("speech_recognition")
+
+from recognizers import BACKENDS, RecognizerBackend, TranscriptBackend, make_backend  # noqa: E402
+
+
+def test_backend_without_transcribe_fails_at_construction():
+    class Incomplete(RecognizerBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_make_backend():
+    assert isinstance(make_backend("transcript"), TranscriptBackend)
+    assert set(BACKENDS) == {"google", "sphinx", "transcript"}
+    with pytest.raises(ValueError):
+        make_backend("whisper")
+
+
+def test_transcript_backend_reads_sidecar(tmp_path):
+    wav = tmp_path / "turn1.wav"
+    (tmp_path / "turn1.txt").write_text("Do you deliver?\n", encoding="utf-8")
+    backend = TranscriptBackend()
+    assert backend.transcribe(None, source=wav) == "Do you deliver?"
+    with pytest.raises(sr.UnknownValueError):
+        backend.transcribe(None, source=tmp_path / "missing.wav")
@@ -0,0 +1,48 @@
+import pytest
+
+from response_cache import ResponseCache
+from retrieval import fit_retriever
+
+MODEL, TEMP = "llama-3.1-8b-instant", 0.2
+
+
+@pytest.fixture(scope="module")
+def vec():
+    chunks = ["zinger burger spicy chicken fillet", "large pepperoni pizza", "fries garlic bread nuggets",
+              "deals and combos", "opening hours and delivery"]
+    return fit_retriever(chunks)[0]
+
+
+def test_exact_hit(vec):
+    cache = ResponseCache()
+    cache.put("How much is the Zinger Burger?", vec, [0, 3], MODEL, TEMP, "$6")
+    assert cache.get("how much is the zinger burger", vec, [0, 3], MODEL, TEMP) == "$6"
+    assert cache.stats()["hits"] == 1
+
+
+def test_near_hit_tolerates_different_tail_chunks(vec):
+    cache = ResponseCache()
+    cache.put("how much is the zinger burger", vec, [0, 3, 1, 2], MODEL, TEMP, "$6")
+    assert cache.get("how much is a zinger burger?", vec, [3, 0, 4], MODEL, TEMP) == "$6"
+    assert cache.stats()["near_hits"] == 1
+
+
+@pytest.mark.parametrize("chunk_ids, context", [([1, 0], ""), ([0, 3], "other history")])
+def test_near_miss_on_other_top_chunks_or_history(vec, chunk_ids, context):
+    cache = ResponseCache()
+    cache.put("how much is the zinger burger", vec, [0, 3], MODEL, TEMP, "$6")
+    assert cache.get("how much is a zinger burger?", vec, chunk_ids, MODEL, TEMP, context=context) is None
+
+
+def test_dissimilar_query_misses(vec):
+    cache = ResponseCache()
+    cache.put("how much is the zinger burger", vec, [0, 3], MODEL, TEMP, "$6")
+    assert cache.get("is the zinger spicy", vec, [0, 3], MODEL, TEMP) is None
+
+
+def test_version_change_clears(vec):
+    cache = ResponseCache()
+    cache.sync_version(1)
+    cache.put("how much is the zinger burger", vec, [0, 3], MODEL, TEMP, "$6")
+    cache.sync_version(2)
+    assert cache.get("how much is the zinger burger", vec, [0, 3], MODEL, TEMP) is None
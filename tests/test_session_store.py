@@ -0,0 +1,119 @@
+import sqlite3
+import time
+
+import pytest
+
+from session_store import History, Session, SessionStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SessionStore(tmp_path / "sessions.db", capacity=4, max_sessions=2, flush_seconds=0.01)
+    yield store
+    store.close()
+
+
+def test_history_is_a_bounded_ring():
+    history = History(capacity=3, messages=[("user", f"q{i}") for i in range(5)])
+    assert [c for _r, c in history] == ["q2", "q3", "q4"]
+    assert [m["content"] for m in history.messages()] == ["q2", "q3", "q4"]
+    digest = history.digest()
+    history.append("assistant", "a4")
+    assert history.digest() != digest
+
+
+def test_lru_eviction(store):
+    for sid in ("a", "b", "c"):
+        store.get(sid)
+    assert len(store) == 2
+    assert store.stats()["evictions"] == 1
+
+
+def test_evicted_session_reloads_from_log(store):
+    session = store.get("a")
+    store.add(session, ("user", "hi"), ("assistant", "hello"))
+    store.get("b")
+    store.get("c")   # evicts "a", possibly before its rows are written
+    reloaded = store.get("a")
+    assert reloaded is not session
+    assert list(reloaded.history) == [("user", "hi"), ("assistant", "hello")]
+
+
+def test_reload_keeps_last_capacity_messages(tmp_path):
+    path = tmp_path / "sessions.db"
+    store = SessionStore(path, capacity=4)
+    session = store.get("a")
+    store.add(session, *[("user", f"m{i}") for i in range(10)])
+    store.close()
+    store = SessionStore(path, capacity=4)
+    assert [c for _r, c in store.get("a").history] == ["m6", "m7", "m8", "m9"]
+    store.close()
+
+
+def test_clear_survives_reload(tmp_path):
+    path = tmp_path / "sessions.db"
+    store = SessionStore(path)
+    session = store.get("a")
+    store.add(session, ("user", "old"))
+    store.clear(session)
+    store.add(session, ("user", "new"))
+    store.close()
+    store = SessionStore(path)
+    assert list(store.get("a").history) == [("user", "new")]
+    store.close()
+
+
+def test_idle_sessions_leave_ram(tmp_path):
+    store = SessionStore(tmp_path / "sessions.db", idle_seconds=0.01, flush_seconds=0.01)
+    store.get("a")
+    time.sleep(0.1)
+    assert len(store) == 0
+    store.close()
+
+
+def test_without_path_nothing_is_persisted():
+    store = SessionStore(max_sessions=1)
+    session = store.get("a")
+    store.add(session, ("user", "hi"))
+    store.get("b")
+    assert len(store.get("a").history) == 0
+    store.close()
+
+
+class BusySession(Session):
+    busy_ids = set()
+
+    def busy(self):
+        return self.id in self.busy_ids
+
+
+def test_busy_session_does_not_block_eviction(tmp_path):
+    store = SessionStore(tmp_path / "sessions.db", max_sessions=2, session_cls=BusySession)
+    BusySession.busy_ids = {"a"}
+    for sid in ("a", "b", "c", "d"):
+        store.get(sid)
+    assert len(store) == 2
+    assert set(store._sessions) == {"a", "d"}
+    BusySession.busy_ids = set()
+    store.get("e")
+    assert len(store) == 2
+    store.close()
+
+
+def test_flush_prunes_the_log(tmp_path):
+    path = tmp_path / "sessions.db"
+    store = SessionStore(path, capacity=3)
+    a, b = store.get("a"), store.get("b")
+    store.add(a, *[("user", f"a{i}") for i in range(10)])
+    store.add(b, ("user", "old"), ("assistant", "old reply"))
+    store.clear(b)
+    store.add(b, ("user", "new"))
+    store.flush()
+    rows = sqlite3.connect(path).execute("SELECT session, content FROM messages ORDER BY id").fetchall()
+    assert rows == [("a", "a7"), ("a", "a8"), ("a", "a9"), ("b", "new")]
+    assert store.stats()["pruned"] == 10
+    store.close()
+    store = SessionStore(path, capacity=3)
+    assert [c for _r, c in store.get("a").history] == ["a7", "a8", "a9"]
+    assert list(store.get("b").history) == [("user", "new")]
+    store.close()
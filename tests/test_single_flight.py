@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from single_flight import AsyncSingleFlight, SingleFlight
+
+
+def test_async_run_coalesces_identical_calls():
+    calls = 0
+
+    async def main():
+        flights = AsyncSingleFlight()
+
+        async def fn():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return "reply"
+
+        results = await asyncio.gather(*(flights.run("k", fn) for _ in range(5)))
+        return flights, results
+
+    flights, results = asyncio.run(main())
+    assert calls == 1
+    assert sorted(joined for joined, _r in results) == [False, True, True, True, True]
+    assert {r for _j, r in results} == {"reply"}
+    assert flights.stats() == {"in_flight": 0, "calls": 1, "coalesced": 4}
+
+
+def test_async_run_fans_out_errors():
+    async def main():
+        flights = AsyncSingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.02)
+            raise ValueError("upstream down")
+
+        return await asyncio.gather(flights.run("k", fn), flights.run("k", fn), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_async_waiter_timeout_does_not_cancel_others():
+    async def main():
+        flights = AsyncSingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.1)
+            return "reply"
+
+        return await asyncio.gather(flights.run("k", fn), flights.run("k", fn, timeout=0.01),
+                                    return_exceptions=True)
+
+    patient, impatient = asyncio.run(main())
+    assert patient == (False, "reply")
+    assert isinstance(impatient, TimeoutError)
+
+
+def test_async_call_is_cancelled_when_last_caller_leaves():
+    cancelled = False
+
+    async def main():
+        nonlocal cancelled
+        flights = AsyncSingleFlight()
+
+        async def fn():
+            nonlocal cancelled
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+
+        results = await asyncio.gather(flights.run("k", fn, timeout=0.01), flights.run("k", fn, timeout=0.02),
+                                       return_exceptions=True)
+        await asyncio.sleep(0)
+        return flights, results
+
+    flights, results = asyncio.run(main())
+    assert all(isinstance(r, TimeoutError) for r in results)
+    assert cancelled
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_async_stream_late_joiner_gets_earlier_deltas():
+    async def main():
+        flights = AsyncSingleFlight()
+        upstream = 0
+
+        async def factory():
+            nonlocal upstream
+            upstream += 1
+            for delta in ("a", "b", "c"):
+                await asyncio.sleep(0.02)
+                yield delta
+
+        async def consume(delay):
+            await asyncio.sleep(delay)
+            joined, deltas = flights.stream("k", factory)
+            return joined, [d async for d in deltas]
+
+        results = await asyncio.gather(consume(0), consume(0.03))
+        return upstream, results
+
+    upstream, results = asyncio.run(main())
+    assert upstream == 1
+    assert results == [(False, ["a", "b", "c"]), (True, ["a", "b", "c"])]
+
+
+def test_thread_run_coalesces_and_fans_out_errors():
+    flights = SingleFlight()
+    calls = 0
+    gate = threading.Event()
+
+    def fn():
+        nonlocal calls
+        calls += 1
+        gate.wait(1)
+        raise ValueError("upstream down")
+
+    errors = []
+
+    def caller():
+        try:
+            flights.run("k", fn)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=caller) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert calls == 1
+    assert len(errors) == 4
+    assert flights.stats()["coalesced"] == 3
+
+
+def test_thread_waiter_timeout():
+    flights = SingleFlight()
+    with pytest.raises(TimeoutError):
+        flights.run("k", lambda: time.sleep(0.2), timeout=0.01)
+
+
+def test_thread_stream_stops_when_abandoned():
+    flights = SingleFlight()
+    produced = []
+
+    def factory():
+        for i in range(100):
+            produced.append(i)
+            time.sleep(0.005)
+            yield str(i)
+
+    _joined, deltas = flights.stream("k", factory)
+    assert next(deltas) == "0"
+    deltas.close()
+    time.sleep(0.05)
+    assert len(produced) < 100
+    assert flights.stats()["in_flight"] == 0
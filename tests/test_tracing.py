@@ -0,0 +1,56 @@
+import json
+import threading
+
+from tracing import Histogram, Tracer, nearest_rank
+
+
+def test_concurrent_traces_share_one_metrics_file(tmp_path):
+    path = tmp_path / "metrics.json"
+    tracer = Tracer().configure(metrics_file=path, metrics_interval=0)
+    errors = []
+
+    def run():
+        for _ in range(200):
+            try:
+                with tracer.trace("chat"):
+                    with tracer.span("llm"):
+                        pass
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    tracer.dump(path)
+    assert errors == []
+    assert json.loads(path.read_text())["chat"]["count"] == 1600
+    assert [p.name for p in tmp_path.iterdir()] == ["metrics.json"]
+
+
+def test_metrics_file_is_throttled(tmp_path):
+    path = tmp_path / "metrics.json"
+    tracer = Tracer().configure(metrics_file=path, metrics_interval=3600)
+    for _ in range(3):
+        with tracer.trace("chat"):
+            pass
+    assert json.loads(path.read_text())["chat"]["count"] == 1
+
+
+def test_write_failure_does_not_raise(tmp_path):
+    tracer = Tracer().configure(metrics_file=tmp_path / "missing" / "metrics.json", metrics_interval=0)
+    with tracer.trace("chat"):
+        pass
+    assert tracer.metrics()["chat"]["count"] == 1
+    tracer.configure(enabled=False)   # no exit-time dump into the missing directory
+
+
+def test_histogram_percentile_uses_nearest_rank():
+    assert [nearest_rank(50, 5), nearest_rank(95, 100), nearest_rank(95, 10), nearest_rank(0, 3)] == [3, 95, 10, 1]
+    hist = Histogram()
+    for ms in (1, 2, 3, 4, 5):
+        hist.add(ms / 1000)
+    # Median of five is the third value; round(2.5) would have picked the second
+    assert 0.003 <= hist.percentile(50) < 0.004
+    assert hist.percentile(100) == 0.005
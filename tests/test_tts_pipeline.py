@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+
+pytest.importorskip("langchain")
+
+from tts_pipeline import SpeechPipeline, split_speakable  # noqa: E402
+
+
+def test_split_speakable_keeps_prices_together():
+    chunks, rest = split_speakable("The Zinger Burger is $6.5 today. Anything else? And")
+    assert chunks == ["The Zinger Burger is $6.5 today.", "Anything else?"]
+    assert rest == "And"
+
+
+def test_interrupt_drops_sentences_but_keeps_jobs():
+    spoken, jobs = [], []
+    gate = threading.Event()
+    pipeline = SpeechPipeline(lambda text: (gate.wait(2), spoken.append(text)))
+    pipeline.begin()
+    pipeline.say("First sentence is being spoken.")
+    pipeline.say("Second sentence is queued.")
+    pipeline.run(lambda: jobs.append("prerender"))
+    pipeline.say("Third sentence is queued.")
+    pipeline.interrupt()
+    gate.set()
+    pipeline.wait()
+    assert jobs == ["prerender"]
+    assert "Second sentence is queued." not in spoken and "Third sentence is queued." not in spoken
+    pipeline.close()
+
+
+def test_speech_after_an_interrupt_is_played():
+    spoken = []
+    pipeline = SpeechPipeline(spoken.append)
+    pipeline.begin()
+    pipeline.interrupt()
+    pipeline.say("Cut off before it was spoken.")
+    pipeline.end()
+    # The next fixed phrase (e.g. a goodbye) goes through begin()/say()/end() as speak() does
+    pipeline.say("Goodbye!")
+    pipeline.end()
+    pipeline.begin()
+    pipeline.interrupt()
+    pipeline.begin()
+    pipeline.say("Thank you for calling.")
+    pipeline.end()
+    assert spoken == ["Goodbye!", "Thank you for calling."]
+    pipeline.close()